@@ -0,0 +1,42 @@
+"""Compares reading a source from JSON with loading it from the history cache.
+
+Run from the repository root with `python -m benchmarks.bench_cache`.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import write_history_file
+from spotify_history_reader import SpotifyHistoryReader
+
+
+def timed_read(path: str, cache_directory: str = None) -> float:
+    start = time.perf_counter()
+    with SpotifyHistoryReader(cache_directory=cache_directory) as reader:
+        reader.add_source(path)
+        for _ in reader.read():
+            pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--plays", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_history_file(
+            os.path.join(directory, "Streaming_History_Audio_2015-2020_0.json"),
+            args.plays,
+        )
+        cache_directory = os.path.join(directory, "cache")
+        print(f"{args.plays} plays")
+        print(f"uncached    {timed_read(path):0.2f} s")
+        print(f"cache miss  {timed_read(path, cache_directory):0.2f} s")
+        print(f"cache hit   {timed_read(path, cache_directory):0.2f} s")
+
+
+if __name__ == "__main__":
+    main()
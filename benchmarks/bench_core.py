@@ -0,0 +1,61 @@
+"""Compares memory use and throughput of the Play classes with their previous version.
+
+Run from the repository root with `python -m benchmarks.bench_core`.
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks import legacy_core
+from benchmarks.synthetic import generate_entries
+from spotify_history_reader import core
+
+
+def build_legacy(entries):
+    return [legacy_core.Play(**entry) for entry in entries]
+
+
+def build_current(entries):
+    return [core.Play.from_entry(entry) for entry in entries]
+
+
+def measure(build, entries):
+    tracemalloc.start()
+    start = time.perf_counter()
+    plays = build(entries)
+    built = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    minutes = {}
+    for play in plays:
+        minutes[play.artist] = minutes.get(play.artist, 0) + play.playback.ms_played
+    aggregated = time.perf_counter() - start
+
+    start = time.perf_counter()
+    years = {play.timestamp.year for play in plays}
+    timestamps = time.perf_counter() - start
+    return built, aggregated, timestamps, memory
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--plays", type=int, default=200000)
+    args = parser.parse_args()
+
+    entries = generate_entries(args.plays)
+    print(f"{args.plays} plays")
+    for name, build in (("legacy", build_legacy), ("current", build_current)):
+        built, aggregated, timestamps, memory = measure(build, entries)
+        print(
+            f"{name.ljust(8)} build={built:0.2f} s "
+            f"({args.plays / built / 1000:0.0f}k plays/s) "
+            f"artist minutes={aggregated:0.2f} s years={timestamps:0.2f} s "
+            f"memory={memory / args.plays:0.0f} B/play"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""Compares the memory taken by a fully materialized history with and without sharing
+repeated values through a SymbolTable.
+
+Run from the repository root with `python -m benchmarks.bench_memory`.
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import write_history_file
+from spotify_history_reader import SpotifyHistoryReader
+
+
+def read_unshared(path: str):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(path)
+        return list(reader.read())
+
+
+def read_shared(path: str):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(path)
+        return list(reader.read(share_values=True))
+
+
+def measure(read, path: str):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    plays = read(path)
+    read_time = time.perf_counter() - start
+    items = [play.track or play.episode for play in plays]
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    minutes = {}
+    for play in plays:
+        minutes[play.song] = minutes.get(play.song, 0) + play.playback.ms_played
+    aggregated = time.perf_counter() - start
+    return read_time, aggregated, memory, len(set(map(id, items)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--plays", type=int, default=500000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_history_file(
+            os.path.join(directory, "Streaming_History_Audio_2015-2020_0.json"),
+            args.plays,
+        )
+        print(f"{args.plays} plays (timings include tracemalloc overhead)")
+        for name, read in (("unshared", read_unshared), ("shared", read_shared)):
+            read_time, aggregated, memory, items = measure(read, path)
+            print(
+                f"{name.ljust(8)} read={read_time:0.2f} s "
+                f"song minutes={aggregated:0.2f} s "
+                f"memory={memory / 2**20:0.0f} MiB ({memory / args.plays:0.0f} B/play) "
+                f"track/episode objects={items}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Measures how SpotifyHistoryReader.read_parallel() scales with the number of workers.
+
+Run from the repository root with `python -m benchmarks.bench_parallel`.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+from benchmarks.synthetic import write_history_file
+from spotify_history_reader import SpotifyHistoryReader
+
+
+def timed(plays) -> float:
+    start = time.perf_counter()
+    for _ in plays:
+        pass
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--files", type=int, default=8)
+    parser.add_argument("--plays", type=int, default=20000, help="plays per file")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        with SpotifyHistoryReader() as reader:
+            for i in range(args.files):
+                reader.add_source(
+                    write_history_file(
+                        os.path.join(directory, f"Streaming_History_Audio_{i}.json"),
+                        args.plays,
+                        seed=i,
+                    )
+                )
+
+            print(f"{args.files} files x {args.plays} plays, {os.cpu_count()} CPUs")
+            baseline = timed(reader.read())
+            print(f"{'read()'.ljust(28)}{baseline:0.2f} s")
+            for workers in args.workers:
+                for ordered in (True, False):
+                    elapsed = timed(reader.read_parallel(workers, ordered=ordered))
+                    mode = "ordered" if ordered else "unordered"
+                    label = f"read_parallel({workers}, {mode})"
+                    print(
+                        f"{label.ljust(28)}{elapsed:0.2f} s ({baseline / elapsed:0.2f}x)"
+                    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""Compares json.load and streaming parsing in SpotifyHistoryReader.read().
+
+Run from the repository root with `python -m benchmarks.bench_streaming`.
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import write_history_file
+from spotify_history_reader import SpotifyHistoryReader
+
+
+def measure(path: str, streaming: bool):
+    tracemalloc.start()
+    start = time.perf_counter()
+    first_play = None
+    count = 0
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(path)
+        for _ in reader.read(streaming=streaming):
+            if first_play is None:
+                first_play = time.perf_counter() - start
+            count += 1
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return count, first_play, total, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--plays", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = write_history_file(
+            os.path.join(directory, "Streaming_History_Audio_2015-2020_0.json"),
+            args.plays,
+        )
+        print(f"{args.plays} plays, {os.path.getsize(path) / 2**20:0.1f} MiB")
+        for streaming in (False, True):
+            count, first_play, total, peak = measure(path, streaming)
+            mode = "streaming" if streaming else "json.load"
+            print(
+                f"{mode.ljust(10)} plays={count} first play={first_play * 1000:0.1f} ms "
+                f"total={total:0.2f} s peak={peak / 2**20:0.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
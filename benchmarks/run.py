@@ -0,0 +1,237 @@
+"""Runs the benchmark suite of the reader hot paths and checks it for regressions.
+
+Run from the repository root with `python -m benchmarks.run`. To measure a change, save
+a baseline first and compare against it afterwards:
+
+    python -m benchmarks.run --save baseline.json
+    python -m benchmarks.run --compare baseline.json
+
+Every case runs in a fresh process, so that the peak RSS reported is its own. The peak
+RSS is read with the resource module, which is only available on Unix.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict
+
+from benchmarks.synthetic import write_history_export
+from spotify_history_reader import Play, SpotifyHistoryReader
+from spotify_history_reader.aggregate import Aggregate, aggregate
+
+# each case sets up its input, untimed, and gets a function that processes it and gets
+# the number of plays processed
+CASES: Dict[str, Callable[[str], Callable[[], int]]] = {}
+
+
+def case(setup: Callable[[str], Callable[[], int]]):
+    CASES[setup.__name__] = setup
+    return setup
+
+
+def _reader(directory: str, as_zip=False) -> SpotifyHistoryReader:
+    reader = SpotifyHistoryReader()
+    if as_zip:
+        reader.add_source_zip(os.path.join(directory, "my_spotify_data.zip"))
+    else:
+        reader.add_source_directory(
+            os.path.join(directory, "Spotify Extended Streaming History")
+        )
+    return reader
+
+
+@case
+def read_directory(directory: str):
+    reader = _reader(directory)
+    return lambda: sum(1 for _ in reader.read())
+
+
+@case
+def read_zip(directory: str):
+    reader = _reader(directory, as_zip=True)
+    return lambda: sum(1 for _ in reader.read())
+
+
+@case
+def read_streaming(directory: str):
+    reader = _reader(directory)
+    return lambda: sum(1 for _ in reader.read(streaming=True))
+
+
+@case
+def read_shared(directory: str):
+    reader = _reader(directory)
+    return lambda: sum(1 for _ in reader.read(share_values=True))
+
+
+@case
+def read_materialized(directory: str):
+    reader = _reader(directory)
+    return lambda: len(list(reader.read()))
+
+
+@case
+def build_plays(directory: str):
+    entries = []
+    for source in _reader(directory).sources:
+        with source.open() as file:
+            entries.extend(json.load(file))
+    return lambda: len([Play.from_entry(entry) for entry in entries])
+
+
+@case
+def aggregate_pass(directory: str):
+    plays = list(_reader(directory).read())
+
+    def run():
+        aggregate(
+            plays,
+            played_ms=Aggregate(),
+            top_artists=Aggregate("artist", top=10),
+            top_songs=Aggregate(("id", "song"), "count", top=10),
+            plays_by_year=Aggregate("year", "count"),
+        )
+        return len(plays)
+
+    return run
+
+
+@case
+def table_group_sum(directory: str):
+    table = _reader(directory).read_table()
+
+    def run():
+        table.group_sum("year")
+        table.group_sum("weekday")
+        table.group_count("hour")
+        return len(table)
+
+    return run
+
+
+def _run_case(name: str, directory: str, repeat: int) -> Dict[str, float]:
+    run = CASES[name](directory)
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        plays = run()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return {
+        "seconds": best,
+        "plays_per_second": plays / best,
+        "peak_rss_mib": _peak_rss() / 2**20,
+    }
+
+
+def _peak_rss() -> int:
+    # Linux keeps ru_maxrss across exec, so a spawned process would report the peak of
+    # its parent at the time of the fork; the high water mark of its own memory is not
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 2**10
+    except OSError:
+        pass
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak_rss if sys.platform == "darwin" else peak_rss * 2**10
+
+
+def run_suite(directory: str, cases, repeat: int) -> Dict[str, Dict[str, float]]:
+    """Runs the given cases on the export in directory, each in a fresh process."""
+    results = {}
+    context = multiprocessing.get_context("spawn")
+    for name in cases:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            results[name] = executor.submit(_run_case, name, directory, repeat).result()
+        result = results[name]
+        print(
+            f"{name.ljust(20)} {result['plays_per_second'] / 1000:8.0f}k plays/s "
+            f"{result['seconds']:7.3f} s {result['peak_rss_mib']:7.0f} MiB peak RSS"
+        )
+    return results
+
+
+def compare(results, baseline, tolerance: float) -> bool:
+    """Prints the change of every case against the baseline, and gets whether none
+    regressed: lost more than tolerance of its throughput or grew its peak RSS by more
+    than tolerance."""
+    passed = True
+    print(f"\ncompared to baseline (tolerance {tolerance:.0%})")
+    for name, result in results.items():
+        if name not in baseline:
+            print(f"{name.ljust(20)} not in baseline")
+            continue
+        speed = result["plays_per_second"] / baseline[name]["plays_per_second"] - 1
+        memory = result["peak_rss_mib"] / baseline[name]["peak_rss_mib"] - 1
+        regressed = speed < -tolerance or memory > tolerance
+        passed = passed and not regressed
+        print(
+            f"{name.ljust(20)} throughput {speed:+7.1%} peak RSS {memory:+7.1%}"
+            f"{'  REGRESSION' if regressed else ''}"
+        )
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--plays", type=int, default=200000)
+    parser.add_argument("--files", type=int, default=4)
+    parser.add_argument("--artists", type=int, default=500)
+    parser.add_argument("--tracks-per-artist", type=int, default=20)
+    parser.add_argument("--ips", type=int, default=None)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument(
+        "--cases", nargs="+", choices=sorted(CASES), default=list(CASES)
+    )
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="compare the results to this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.15)
+    args = parser.parse_args()
+
+    export = {
+        "plays": args.plays,
+        "files": args.files,
+        "artists": args.artists,
+        "tracks_per_artist": args.tracks_per_artist,
+        "ips": args.ips,
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        for as_zip in (False, True):
+            write_history_export(
+                directory,
+                args.plays,
+                args.files,
+                as_zip,
+                artists=args.artists,
+                tracks_per_artist=args.tracks_per_artist,
+                ips=args.ips,
+            )
+        print(", ".join(f"{key}={value}" for key, value in export.items()))
+        results = run_suite(directory, args.cases, args.repeat)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump({"export": export, "cases": results}, file, indent=2)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline["export"] != export:
+            print(f"\nwarning: the baseline was run on {baseline['export']}")
+        if not compare(results, baseline["cases"], args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""Generates synthetic Spotify extended streaming history exports for benchmarking."""
+
+import json
+import os
+import random
+import zipfile
+
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Any, List, Optional
+
+REASONS_START = ["trackdone", "clickrow", "fwdbtn", "backbtn", "playbtn", "appload"]
+REASONS_END = ["trackdone", "endplay", "fwdbtn", "backbtn", "logout", "unexpected-exit"]
+PLATFORMS = ["ios", "android", "windows", "OS X 10.15.1 [x86 8]", "web_player"]
+COUNTRIES = ["US", "SI", "DE", "GB", "CA"]
+
+
+def generate_entries(
+    plays: int,
+    artists: int = 500,
+    tracks_per_artist: int = 20,
+    episode_ratio: float = 0.05,
+    start: datetime = datetime(2015, 1, 1, tzinfo=timezone.utc),
+    seed: int = 0,
+    ips: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Generates plays entries in the format of Streaming_History_Audio_*.json.
+
+    The cardinality of the history is set by the number of artists, tracks_per_artist
+    and ips (connection addresses; any address by default)."""
+    rng = random.Random(seed)
+    timestamp = start
+    entries = []
+    for _ in range(plays):
+        timestamp += timedelta(seconds=rng.randint(30, 600))
+        artist = rng.randrange(artists)
+        track = rng.randrange(tracks_per_artist)
+        is_episode = rng.random() < episode_ratio
+        entries.append(
+            {
+                "ts": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "username": "username",
+                "platform": rng.choice(PLATFORMS),
+                "ms_played": rng.randint(0, 300000),
+                "conn_country": rng.choice(COUNTRIES),
+                "ip_addr_decrypted": (
+                    f"10.0.{rng.randrange(256)}.{rng.randrange(256)}"
+                    if ips is None
+                    else f"10.1.{rng.randrange(ips)}"
+                ),
+                "user_agent_decrypted": "unknown",
+                "master_metadata_track_name": (
+                    None if is_episode else f"Track {artist}-{track} ♪"
+                ),
+                "master_metadata_album_artist_name": (
+                    None if is_episode else f"Artist {artist}"
+                ),
+                "master_metadata_album_album_name": (
+                    None if is_episode else f"Album {artist}-{track // 10}"
+                ),
+                "spotify_track_uri": (
+                    None if is_episode else f"spotify:track:{artist:011d}{track:011d}"
+                ),
+                "episode_name": f"Episode {track}" if is_episode else None,
+                "episode_show_name": f"Show {artist}" if is_episode else None,
+                "spotify_episode_uri": (
+                    f"spotify:episode:{artist:011d}{track:011d}" if is_episode else None
+                ),
+                "reason_start": rng.choice(REASONS_START),
+                "reason_end": rng.choice(REASONS_END),
+                "shuffle": rng.random() < 0.5,
+                "skipped": rng.random() < 0.2,
+                "offline": rng.random() < 0.1,
+                "offline_timestamp": int(timestamp.timestamp() * 1000),
+                "incognito_mode": rng.random() < 0.01,
+            }
+        )
+    return entries
+
+
+def write_history_file(path: str, plays: int, **kwargs) -> str:
+    """Writes a single synthetic history file containing the given number of plays."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(generate_entries(plays, **kwargs), file, indent=2)
+    return path
+
+
+def write_history_export(
+    directory: str, plays: int, files: int = 4, as_zip: bool = False, **kwargs
+) -> str:
+    """Writes a synthetic export of the given number of plays, split into files named
+    like those of a real export (e.g. Streaming_History_Audio_2015-2017_0.json).
+
+    The files are written to a "Spotify Extended Streaming History" directory in
+    directory, or with as_zip to a my_spotify_data.zip archive there. Gets the path of
+    the directory or archive."""
+    entries = generate_entries(plays, **kwargs)
+    size = -(-len(entries) // files)
+    parts = [entries[i : i + size] for i in range(0, len(entries), size)]
+
+    export = os.path.join(directory, "Spotify Extended Streaming History")
+    path = os.path.join(directory, "my_spotify_data.zip") if as_zip else export
+    os.makedirs(directory if as_zip else export, exist_ok=True)
+    archive = zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) if as_zip else None
+    try:
+        for i, part in enumerate(parts):
+            first, last = part[0]["ts"][:4], part[-1]["ts"][:4]
+            years = first if first == last else f"{first}-{last}"
+            name = f"Streaming_History_Audio_{years}_{i}.json"
+            text = json.dumps(part, indent=2)
+            if archive is not None:
+                archive.writestr(f"Spotify Extended Streaming History/{name}", text)
+            else:
+                with open(os.path.join(export, name), "w", encoding="utf-8") as file:
+                    file.write(text)
+    finally:
+        if archive is not None:
+            archive.close()
+    return path
@@ -1,46 +1,21 @@
-from typing import Union, Callable, List, Set, Tuple, Any
+from typing import Union, Callable, Dict, List, Set, Any
 
 import dotenv
 import os
 import json
-from spotipy import Spotify, SpotifyOAuth, SpotifyException
-from time import sleep
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from spotipy import Spotify, SpotifyOAuth
 from collections import Counter
-from itertools import chain
 
-from spotify_history_reader import SpotifyHistoryReader, Play
+from spotify_history_reader import SpotifyHistoryReader, Play, PlayFilter
+from spotify_history_reader.enrichment import Enricher, EnrichmentCache
+from spotify_history_reader.ratelimit import RateLimiter
 
 
 dotenv.load_dotenv()
 
 
-class Cache:
-    def __init__(self, file_path):
-        self.file_path = file_path
-        self.cache = {}
-        if os.path.exists(self.file_path):
-            with open(self.file_path, "r", encoding="utf-8") as file:
-                self.cache = json.load(file)
-        self.dirty = False
-
-    def __contains__(self, item: str):
-        return item in self.cache
-
-    def __getitem__(self, item: str):
-        return self.cache[item]
-
-    def __setitem__(self, item: str, value: Any):
-        self.cache[item] = value
-        self.dirty = True
-
-    def flush(self):
-        if self.dirty:
-            dirname = os.path.dirname(self.file_path)
-            os.makedirs(dirname, exist_ok=True)
-            with open(self.file_path, "wt", encoding="utf-8") as file:
-                json.dump(self.cache, file)
-
-
 class Album:
     def __init__(self, name: str, release_date: str, total_tracks: int, uri: str):
         self.name = name
@@ -151,74 +126,125 @@ class SpotifyRepository:
         client_id: str,
         client_secret: str,
         directory=".cache",
+        max_in_flight: int = 8,
+        sapi: Spotify = None,
+        rate_limiter: RateLimiter = None,
     ):
-        self.artist_cache = Cache(os.path.join(directory, "artists.json"))
-        self.album_cache = Cache(os.path.join(directory, "album.json"))
-        self.track_cache = Cache(os.path.join(directory, "track.json"))
-
-        self.sapi = Spotify(
-            auth_manager=SpotifyOAuth(
-                client_id=client_id,
-                client_secret=client_secret,
-                redirect_uri="http://localhost:1234",
+        """max_in_flight bounds the number of batch requests sent concurrently, and all
+        requests share rate_limiter. A preconfigured client can be passed as sapi, e.g.
+        one pointed at a stub server by setting its prefix."""
+        # separate files, as the Enricher writes to the caches concurrently
+        self.artist_cache = EnrichmentCache(os.path.join(directory, "artists.sqlite"))
+        self.album_cache = EnrichmentCache(os.path.join(directory, "albums.sqlite"))
+        self.track_cache = EnrichmentCache(os.path.join(directory, "tracks.sqlite"))
+        # import the whole-file JSON caches of earlier versions of this sample
+        for cache, name in (
+            (self.artist_cache, "artists.json"),
+            (self.album_cache, "album.json"),
+            (self.track_cache, "track.json"),
+        ):
+            legacy_path = os.path.join(directory, name)
+            if os.path.exists(legacy_path):
+                with open(legacy_path, "r", encoding="utf-8") as file:
+                    for uri, value in json.load(file).items():
+                        cache[uri] = value
+                cache.flush()
+                os.rename(legacy_path, legacy_path + ".imported")
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = rate_limiter or RateLimiter()
+
+        if sapi is None:
+            # one pooled connection per request in flight
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=1, pool_maxsize=max_in_flight
             )
-        )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            # throttled requests are retried by the rate limiter, not by spotipy
+            sapi = Spotify(
+                auth_manager=SpotifyOAuth(
+                    client_id=client_id,
+                    client_secret=client_secret,
+                    redirect_uri="http://localhost:1234",
+                ),
+                requests_session=session,
+                status_retries=0,
+            )
+        self.sapi = sapi
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        self.artist_cache.flush()
-        self.album_cache.flush()
-        self.track_cache.flush()
+        self.artist_cache.close()
+        self.album_cache.close()
+        self.track_cache.close()
+        limiter = self.rate_limiter
+        if limiter.throttled:
+            print(
+                f"{limiter.calls} calls, {limiter.throttled} throttled, "
+                f"{limiter.retried} retried, {limiter.failed} failed"
+            )
 
     def _call_with_care(
         self, method: Callable[[Union[str, List[str]]], Any], arg: Union[str, List[str]]
     ):
-        try:
-            return method(arg)
-        except SpotifyException as se:
-            if se.http_status == 429:
-                print(se)
-                sleep(10)
-                return self._call_with_care(method, arg)
-        except Exception as e:
-            print(e)
-            raise
+        return self.rate_limiter.call(method, arg)
 
     def _ensure_cache_populated(
         self,
-        cache: Cache,
+        cache: EnrichmentCache,
         get_method: Callable[[List[str]], Any],
         uris: List[str],
         batch_size: int,
         results_selector: Callable[[Any], Any],
     ) -> None:
-        uncached_uris = [uri for uri in uris if uri not in cache]
-        deduped_uris = list(set(uncached_uris))
-        if len(deduped_uris) > 0:
-            for i in range(0, len(deduped_uris), batch_size):
-                if len(deduped_uris) > 1000 and (10 * i) % batch_size == 0:
-                    print(
-                        f"{i} / {len(deduped_uris)} ({100 * i / len(deduped_uris):0.1f} %)",
-                        end="\r",
-                    )
-                batch_uris = deduped_uris[i : i + batch_size]
-                if len(batch_uris) == 0:
-                    break
-
-                results = self._call_with_care(get_method, batch_uris)
-                for result in results_selector(results):
-                    cache[result["uri"]] = result
+        deduped_uris = list(dict.fromkeys(uri for uri in uris if uri not in cache))
+        if len(deduped_uris) == 0:
+            return
+
+        with ThreadPoolExecutor(self.max_in_flight) as executor:
+            futures = [
+                executor.submit(
+                    self._call_with_care, get_method, deduped_uris[i : i + batch_size]
+                )
+                for i in range(0, len(deduped_uris), batch_size)
+            ]
+            # results are only ever written to the cache from this thread
+            for done, future in enumerate(futures):
+                if len(deduped_uris) > 1000:
+                    print(f"{done} / {len(futures)} batches", end="\r")
+                self._cache_results(cache, results_selector(future.result()))
+
+    def _cache_results(self, cache: EnrichmentCache, results: List[Any]) -> List[Any]:
+        results = [result for result in results if result is not None]
+        for result in results:
+            cache[result["uri"]] = result
+        return results
+
+    def enricher(self, max_pending: int = 10000) -> Enricher:
+        """Gets an Enricher that fetches tracks, albums and artists through this
+        repository and its caches."""
+        return Enricher(
+            lambda uris: self._call_with_care(self.sapi.tracks, uris)["tracks"],
+            lambda uris: self._call_with_care(self.sapi.albums, uris)["albums"],
+            lambda uris: self._call_with_care(self.sapi.artists, uris)["artists"],
+            self.track_cache,
+            self.album_cache,
+            self.artist_cache,
+            max_in_flight=self.max_in_flight,
+            max_pending=max_pending,
+        )
 
     def artist(self, uri: str) -> EnrichedArtist:
         if uri not in self.artist_cache:
-            self.artist_cache[uri] = self.sapi.artist(uri)
+            self.artist_cache[uri] = self._call_with_care(self.sapi.artist, uri)
         return EnrichedArtist(self.artist_cache[uri])
 
     def album(self, uri: str) -> EnrichedAlbum:
         if uri not in self.album_cache:
-            self.album_cache[uri] = self.sapi.album(uri)
+            self.album_cache[uri] = self._call_with_care(self.sapi.album, uri)
         return EnrichedAlbum(self.album_cache[uri])
 
     def albums(
@@ -232,7 +258,7 @@ class SpotifyRepository:
 
     def track(self, uri: str) -> EnrichedTrack:
         if uri not in self.track_cache:
-            self.track_cache[uri] = self.sapi.track(uri)
+            self.track_cache[uri] = self._call_with_care(self.sapi.track, uri)
         return EnrichedTrack(self.track_cache[uri])
 
     def tracks(self, uris: List[str]) -> List[EnrichedTrack]:
@@ -248,47 +274,54 @@ class SpotifyRepository:
         return [EnrichedArtist(self.artist_cache[uri]) for uri in uris]
 
 
-with SpotifyHistoryReader() as reader:
-    reader.add_source_zip("~/Downloads/2024_12_07_spotify.zip")
-
-    play_uris = []
-    for play in reader.read():
-        if play.is_song and not play.connection.incognito_mode:
-            play_uris.append(play.id)
-
-client_id = os.getenv("SPOTIFY_CLIENT_ID")
-client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
+def main():
+    client_id = os.getenv("SPOTIFY_CLIENT_ID")
+    client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
 
-if client_id is None or len(client_id) == 0:
-    print("SPOTIFY_CLIENT_ID environment variable not found. See README")
+    if client_id is None or len(client_id) == 0:
+        print("SPOTIFY_CLIENT_ID environment variable not found. See README")
 
-if client_secret is None or len(client_secret) == 0:
-    print("SPOTIFY_CLIENT_SECRET environment variable not found. See README")
+    if client_secret is None or len(client_secret) == 0:
+        print("SPOTIFY_CLIENT_SECRET environment variable not found. See README")
 
-with SpotifyRepository(
-    client_id, client_secret, "samples/.cache"
-) as spotify_repository:
-    enriched_tracks = spotify_repository.tracks(play_uris)
+    artist_names: Dict[str, str] = {}
+    track_artist_counts: Counter = Counter()
+    album_artist_counts: Counter = Counter()
+    genre_counts: Counter = Counter()
+    seen_albums: Set[str] = set()
 
-    album_uris = set([x.album.uri for x in enriched_tracks])
-    enriched_albums = spotify_repository.albums(list(album_uris))
+    with SpotifyHistoryReader() as reader, SpotifyRepository(
+        client_id, client_secret, "samples/.cache"
+    ) as spotify_repository:
+        reader.add_source_zip("~/Downloads/2024_12_07_spotify.zip")
 
-    track_artists = list(chain.from_iterable([x.artists for x in enriched_tracks]))
-    track_artist_uris = [x.uri for x in track_artists]
-    enriched_artists = spotify_repository.artists(track_artist_uris)
-
-    print("\nsongs")
-    for artist_uri, count in Counter(track_artist_uris).most_common(10):
-        artist = spotify_repository.artist(artist_uri)
-        print(f"{artist.name} played {count} songs")
-
-    print("\nalbums")
-    album_artists = chain.from_iterable([x.artists for x in enriched_albums])
-    for artist_uri, count in Counter([x.uri for x in album_artists]).most_common(10):
-        artist = spotify_repository.artist(artist_uri)
-        print(f"{artist.name} played {count} albums")
-
-    print("\ngenres")
-    genres = list(chain.from_iterable([x.genres for x in enriched_artists]))
-    for genre, count in Counter(genres).most_common(10):
-        print(f"{genre} appeared {count} times")
+        # plays are enriched while the history is still being read
+        plays = reader.read(
+            play_filter=PlayFilter(songs_only=True, exclude_incognito=True)
+        )
+        for enriched in spotify_repository.enricher().enrich(plays):
+            for artist in enriched.artists:
+                artist_names[artist["uri"]] = artist["name"]
+                track_artist_counts[artist["uri"]] += 1
+            genre_counts.update(enriched.genres)
+            album = enriched.album
+            if album is not None and album["uri"] not in seen_albums:
+                seen_albums.add(album["uri"])
+                album_artist_counts.update(x["uri"] for x in album["artists"])
+
+        print("\nsongs")
+        for artist_uri, count in track_artist_counts.most_common(10):
+            print(f"{artist_names[artist_uri]} played {count} songs")
+
+        print("\nalbums")
+        for artist_uri, count in album_artist_counts.most_common(10):
+            artist = spotify_repository.artist(artist_uri)
+            print(f"{artist.name} played {count} albums")
+
+        print("\ngenres")
+        for genre, count in genre_counts.most_common(10):
+            print(f"{genre} appeared {count} times")
+
+
+if __name__ == "__main__":
+    main()
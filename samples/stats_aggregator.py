@@ -1,11 +1,8 @@
-from collections import Counter
+from spotify_history_reader import SpotifyHistoryReader, PlayFilter
+from spotify_history_reader.aggregate import Aggregate, aggregate
 
-from typing import Dict, Callable
 
-from spotify_history_reader import SpotifyHistoryReader, Play
-
-
-def aggregate_stats(predicate: Callable[[Play], bool] = lambda x: True, top=10):
+def aggregate_stats(play_filter: PlayFilter = None, top=10):
 
     history_paths = [
         "~/Downloads/Spotify/Spotify Extended Streaming History/Streaming_History_Audio_2021-2022_2.json",
@@ -17,36 +14,24 @@ def aggregate_stats(predicate: Callable[[Play], bool] = lambda x: True, top=10):
         for history_path in history_paths:
             reader.add_source(history_path)
 
-        played_ms = 0
-        play_time_by_artist: Dict[str, int] = {}
-        play_count_by_id: Dict[str, int] = {}
-        id_name_map: Dict[str, str] = {}
-        for play in reader.read():
-            if not predicate(play):
-                continue
-
+        # all stats are computed in a single pass over the history
+        results = aggregate(
+            reader.read(play_filter=play_filter),
             # total time
-            played_ms += play.playback.ms_played
-
+            played_ms=Aggregate(),
             # time by artist
-            if play.artist in play_time_by_artist:
-                play_time_by_artist[play.artist] += play.playback.ms_played
-            else:
-                play_time_by_artist[play.artist] = play.playback.ms_played
-
+            top_artists=Aggregate("artist", top=top),
             # play count by song
-            # TODO: Multiple URIs might correspond to "similar" songs, dedupe would be neat (but hard)
-            if play.id in play_count_by_id:
-                play_count_by_id[play.id] += 1
-            else:
-                id_name_map[play.id] = play.song
-                play_count_by_id[play.id] = 1
+            # TODO: Multiple URIs might correspond to "similar" songs, dedupe would be
+            # neat (but hard)
+            top_songs=Aggregate(("id", "song"), "count", top=top),
+        )
 
-    show_time_listened(played_ms)
+    show_time_listened(results["played_ms"])
 
     print(f"\nTop {top} artists by time listened")
     i = 1
-    for artist, counter in Counter(play_time_by_artist).most_common(top):
+    for artist, counter in results["top_artists"]:
         print(
             f"{str(i).ljust(3)} {artist.ljust(40)} {counter / 1000 / 60:0.0f} minutes"
         )
@@ -54,8 +39,8 @@ def aggregate_stats(predicate: Callable[[Play], bool] = lambda x: True, top=10):
 
     i = 1
     print(f"\nTop {top} songs by play count")
-    for play_id, counter in Counter(play_count_by_id).most_common(top):
-        print(f"{str(i).ljust(3)} {id_name_map[play_id].ljust(40)} {counter} times")
+    for (_, song), counter in results["top_songs"]:
+        print(f"{str(i).ljust(3)} {song.ljust(40)} {counter} times")
         i += 1
 
 
@@ -67,4 +52,4 @@ def show_time_listened(total_ms):
 
 
 if __name__ == "__main__":
-    aggregate_stats(lambda play: play.is_song)
+    aggregate_stats(PlayFilter(songs_only=True))
@@ -4,39 +4,26 @@ from matplotlib import pyplot as plt
 from typing import Dict, Callable, List, Set, Tuple, Any
 from enum import Enum
 
-from spotify_history_reader import SpotifyHistoryReader, Play
+from spotify_history_reader import SpotifyHistoryReader, PlayTable
 
 
 def plot_top_artists_over_time(
-    predicate: Callable[[Play], bool] = lambda x: True, top=5
+    mask: Callable[[PlayTable], Any] = lambda table: [True] * len(table), top=5
 ):
     with SpotifyHistoryReader() as reader:
         reader.add_source_zip("~/Downloads/Spotify.zip")
 
-        play_time_by_artist: Dict[str, int] = {}
-        play_time_by_artist_by_year: Dict[int, Dict[str, int]] = {}
-        for play in reader.read():
-            if not predicate(play):
-                continue
-
-            # time by artist:
-            if play.artist not in play_time_by_artist:
-                play_time_by_artist[play.artist] = play.playback.ms_played
-            else:
-                play_time_by_artist[play.artist] += play.playback.ms_played
-
-            # time by artist by year
-            if play.timestamp.year not in play_time_by_artist_by_year:
-                play_time_by_artist_by_year[play.timestamp.year] = {}
-
-            if play.artist in play_time_by_artist_by_year[play.timestamp.year]:
-                play_time_by_artist_by_year[play.timestamp.year][
-                    play.artist
-                ] += play.playback.ms_played
-            else:
-                play_time_by_artist_by_year[play.timestamp.year][
-                    play.artist
-                ] = play.playback.ms_played
+        table = reader.read_table()
+
+    table = table.filter(mask(table))
+
+    # time by artist:
+    play_time_by_artist: Dict[str, int] = table.group_sum("artist")
+
+    # time by artist by year
+    play_time_by_artist_by_year: Dict[int, Dict[str, int]] = {}
+    for (year, artist), ms_played in table.group_sum(("year", "artist")).items():
+        play_time_by_artist_by_year.setdefault(year, {})[artist] = ms_played
 
     top_artists_by_year: Dict[int, Set[str]] = {
         year: set(
@@ -102,4 +89,4 @@ def plot_artists_play_data(
 
 
 if __name__ == "__main__":
-    plot_top_artists_over_time(lambda play: play.is_song, 10)
+    plot_top_artists_over_time(lambda table: table.column("is_song"), 10)
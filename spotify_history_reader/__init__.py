@@ -1,2 +1,39 @@
-from spotify_history_reader.reader import SpotifyHistoryReader
-from spotify_history_reader.core import Play, Track, Episode
+import importlib
+
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from spotify_history_reader.reader import SpotifyHistoryReader
+    from spotify_history_reader.core import Play, Track, Episode
+    from spotify_history_reader.source import Source
+    from spotify_history_reader.table import PlayTable
+    from spotify_history_reader.filters import PlayFilter
+    from spotify_history_reader.metrics import ReadMetrics
+
+# the exports are imported on first use, so that running the command line (see cli)
+# does not import the reader before it is needed
+_EXPORTS = {
+    "SpotifyHistoryReader": "spotify_history_reader.reader",
+    "Play": "spotify_history_reader.core",
+    "Track": "spotify_history_reader.core",
+    "Episode": "spotify_history_reader.core",
+    "Source": "spotify_history_reader.source",
+    "PlayTable": "spotify_history_reader.table",
+    "PlayFilter": "spotify_history_reader.filters",
+    "ReadMetrics": "spotify_history_reader.metrics",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
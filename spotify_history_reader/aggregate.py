@@ -0,0 +1,130 @@
+import heapq
+
+from operator import attrgetter, itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.filters import PlayFilter
+
+KEYS: Dict[str, Callable[[Play], Any]] = {
+    "artist": attrgetter("artist"),
+    "song": attrgetter("song"),
+    "id": attrgetter("id"),
+    "is_song": attrgetter("is_song"),
+    "album": lambda play: play.track.album if play.is_song else None,
+    "year": attrgetter("year"),
+    "month": attrgetter("month"),
+    "weekday": attrgetter("weekday"),
+    "hour": attrgetter("hour"),
+    "platform": lambda play: play.connection.platform,
+    "country": lambda play: play.connection.country,
+}
+
+# the KEYS that are attributes of a Play, so that a tuple of them is got in one call
+_ATTRIBUTE_KEYS = (
+    "artist",
+    "song",
+    "id",
+    "is_song",
+    "year",
+    "month",
+    "weekday",
+    "hour",
+)
+
+MEASURES: Dict[str, Callable[[Play], int]] = {
+    "ms_played": lambda play: play.playback.ms_played,
+    "count": lambda play: 1,
+    "skips": lambda play: 1 if play.playback.skipped else 0,
+}
+
+
+class Aggregate:
+    """Sums a measure of the Plays in each group, updated one Play at a time.
+
+    by names the key (or a sequence of keys, giving tuple keys) to group the Plays by;
+    see KEYS for the available ones. With no keys, all Plays form a single group.
+    measure is one of MEASURES. If top is given, only the top groups by value are
+    reported, selected with a bounded heap instead of sorting all groups; of groups with
+    equal values, those seen first are reported first. If play_filter is given, only the
+    Plays matching it are added.
+
+    Aggregates of the same kind can be merged, e.g. to combine results of several
+    exports.
+    """
+
+    def __init__(
+        self,
+        by: Union[str, Sequence[str]] = (),
+        measure: str = "ms_played",
+        top: Optional[int] = None,
+        play_filter: Optional[PlayFilter] = None,
+    ):
+        self.by: Tuple[str, ...] = (by,) if isinstance(by, str) else tuple(by)
+        self.measure: str = measure
+        self.top: Optional[int] = top
+        self.play_filter: Optional[PlayFilter] = play_filter
+        self.totals: Dict[Any, int] = {}
+
+        keys = [KEYS[name] for name in self.by]
+        if not keys:
+            self._key = lambda play: None
+        elif len(keys) == 1:
+            self._key = keys[0]
+        elif all(name in _ATTRIBUTE_KEYS for name in self.by):
+            self._key = attrgetter(*self.by)
+        else:
+            self._key = lambda play: tuple(key(play) for key in keys)
+        self._value = MEASURES[measure]
+
+    def __getstate__(self):
+        # the key and measure functions are rebuilt rather than pickled
+        return self.by, self.measure, self.top, self.play_filter, self.totals
+
+    def __setstate__(self, state):
+        by, measure, top, play_filter, totals = state
+        self.__init__(by, measure, top, play_filter)
+        self.totals = totals
+
+    def add(self, play: Play):
+        """Adds a Play to its group, unless it does not match play_filter."""
+        if self.play_filter is not None and not self.play_filter.matches_play(play):
+            return
+        key = self._key(play)
+        self.totals[key] = self.totals.get(key, 0) + self._value(play)
+
+    def merge(self, other: "Aggregate"):
+        """Adds the groups of another aggregate of the same kind to this one."""
+        if (other.by, other.measure) != (self.by, self.measure):
+            raise ValueError("Only aggregates of the same keys and measure can merge")
+        totals = self.totals
+        for key, value in other.totals.items():
+            totals[key] = totals.get(key, 0) + value
+
+    def result(self) -> Union[int, Dict[Any, int], List[Tuple[Any, int]]]:
+        """Gets the aggregated value: a single number if there are no keys, the top
+        (key, value) pairs in descending order if top is set, or else all groups."""
+        if not self.by:
+            return self.totals.get(None, 0)
+        if self.top is not None:
+            return heapq.nlargest(self.top, self.totals.items(), key=itemgetter(1))
+        return dict(self.totals)
+
+
+def aggregate(plays: Iterable[Play], **aggregates: Aggregate) -> Dict[str, Any]:
+    """Computes all the given aggregates in a single pass over the Plays.
+
+    Returns the result of each aggregate under the name it was passed with, e.g.
+
+        aggregate(
+            reader.read(),
+            total=Aggregate(),
+            top_artists=Aggregate("artist", top=10),
+            plays_by_year=Aggregate("year", "count"),
+        )
+    """
+    adders = [aggregate.add for aggregate in aggregates.values()]
+    for play in plays:
+        for add in adders:
+            add(play)
+    return {name: aggregate.result() for name, aggregate in aggregates.items()}
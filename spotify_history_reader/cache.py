@@ -0,0 +1,118 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+from typing import Iterable, Iterator, Optional
+from spotify_history_reader.core import Play
+from spotify_history_reader.source import Source
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "spotify-history-reader"
+)
+
+# bump whenever the pickled representation of a Play changes
+_VERSION = 1
+_BATCH_SIZE = 1000
+
+
+class HistoryCache:
+    """An on-disk cache of the Plays parsed from each source.
+
+    Each source is cached in a pair of files: the Plays, pickled in batches, and a small
+    metadata file holding the fingerprint of the source (its size, modification time and
+    content digest). A cached source is only reused while its fingerprint still matches;
+    if only the modification time changed, the digest decides."""
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY):
+        self.directory: str = os.path.expanduser(directory)
+
+    def load(self, source: Source) -> Optional[Iterator[Play]]:
+        """Gets the cached Plays of the source, or None if they are missing or stale."""
+        plays_path, metadata_path = self._paths(source)
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as file:
+                metadata = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if metadata.get("version") != _VERSION or not os.path.exists(plays_path):
+            return None
+
+        size, mtime = source.stat()
+        if size != metadata["size"]:
+            return None
+        if mtime != metadata["mtime"]:
+            if source.digest() != metadata["digest"]:
+                return None
+            # unchanged content; remember the new time to skip the digest next time
+            metadata["mtime"] = mtime
+            self._write_metadata(metadata_path, metadata)
+        return self._read_plays(plays_path)
+
+    def store(self, source: Source, plays: Iterable[Play]) -> Iterator[Play]:
+        """Yields the given Plays of the source, writing them to the cache as they pass.
+
+        The cache entry is only committed once all Plays have been consumed."""
+        plays_path, metadata_path = self._paths(source)
+        size, mtime = source.stat()
+        metadata = {
+            "version": _VERSION,
+            "source": str(source),
+            "size": size,
+            "mtime": mtime,
+            "digest": source.digest(),
+        }
+
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".partial")
+        committed = False
+        try:
+            with open(fd, "wb") as file:
+                batch = []
+                for play in plays:
+                    batch.append(play)
+                    yield play
+                    if len(batch) == _BATCH_SIZE:
+                        pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+                        batch = []
+                if batch:
+                    pickle.dump(batch, file, pickle.HIGHEST_PROTOCOL)
+
+            # never leave metadata that describes different plays
+            if os.path.exists(metadata_path):
+                os.remove(metadata_path)
+            os.replace(temp_path, plays_path)
+            self._write_metadata(metadata_path, metadata)
+            committed = True
+        finally:
+            if not committed and os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def clear(self):
+        """Removes all cached sources."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith((".plays", ".meta", ".partial")):
+                os.remove(os.path.join(self.directory, name))
+
+    def _paths(self, source: Source):
+        key = hashlib.sha1(str(source).encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + ".plays", base + ".meta"
+
+    def _write_metadata(self, metadata_path: str, metadata: dict):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".partial")
+        with open(fd, "w", encoding="utf-8") as file:
+            json.dump(metadata, file)
+        os.replace(temp_path, metadata_path)
+
+    def _read_plays(self, plays_path: str) -> Iterator[Play]:
+        with open(plays_path, "rb") as file:
+            while True:
+                try:
+                    batch = pickle.load(file)
+                except EOFError:
+                    return
+                yield from batch
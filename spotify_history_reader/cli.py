@@ -0,0 +1,443 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import tempfile
+
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+# only the standard library is imported up front, so that --help and cached reports
+# never pay for importing the reader; everything else is imported where it is used
+
+# as cache.DEFAULT_CACHE_DIRECTORY, without importing the cache
+DEFAULT_CACHE_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "spotify-history-reader"
+)
+DEFAULT_TOP = 10
+DEFAULT_GAP_MINUTES = 30
+
+REPORTS = ("top-artists", "top-tracks", "yearly", "sessions")
+FORMATS = ("json", "csv")
+
+# bump whenever the rows of a report change
+_VERSION = 1
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Runs the spotify-history command with the given arguments (by default those of
+    the process), and gets its exit status."""
+    parser = _parser()
+    args = parser.parse_intermixed_args(argv)
+    path = os.path.expanduser(args.export)
+    if not os.path.exists(path):
+        parser.error(f"{args.export} does not exist")
+    if args.top < 1:
+        parser.error("--top must be at least 1")
+    for report in args.reports:
+        if report not in REPORTS:
+            parser.error(f"unknown report {report} (choose from {', '.join(REPORTS)})")
+    reports = list(dict.fromkeys(args.reports or REPORTS))
+
+    cache_directory = (
+        None if args.no_cache else os.path.expanduser(args.cache_directory)
+    )
+    results = None
+    if cache_directory is not None:
+        report_path = _report_path(
+            cache_directory, path, reports, args.top, args.gap_minutes
+        )
+        results = _load_report(report_path)
+    if results is None:
+        results = run_reports(
+            path, reports, args.top, args.gap_minutes, cache_directory, args.workers
+        )
+        if cache_directory is not None:
+            _store_report(report_path, results)
+
+    if args.format == "json":
+        _write_json(results, args.output)
+    else:
+        _write_csv(results, args.output)
+    return 0
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="spotify-history",
+        description="Reports on a Spotify streaming history export.",
+        epilog=(
+            "The Plays of every history file are cached after the first run, and so is "
+            "the output of each set of reports until the export changes."
+        ),
+    )
+    parser.add_argument(
+        "export", help="the export: a ZIP archive, a directory or a history file"
+    )
+    parser.add_argument(
+        "reports",
+        nargs="*",
+        metavar="report",
+        help=f"the reports to run in one pass, of {', '.join(REPORTS)} (default: all)",
+    )
+    parser.add_argument(
+        "-f", "--format", choices=FORMATS, default="json", help="(default: json)"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        help=(
+            "a file to write JSON to, or a directory to write a CSV file per report to "
+            "(default: standard output)"
+        ),
+    )
+    parser.add_argument(
+        "-n",
+        "--top",
+        type=int,
+        default=DEFAULT_TOP,
+        help=f"the number of artists and tracks to report (default: {DEFAULT_TOP})",
+    )
+    parser.add_argument(
+        "--gap-minutes",
+        type=float,
+        default=DEFAULT_GAP_MINUTES,
+        help=(
+            "the gap that ends a listening session, in minutes "
+            f"(default: {DEFAULT_GAP_MINUTES})"
+        ),
+    )
+    parser.add_argument(
+        "-j",
+        "--workers",
+        type=int,
+        help=(
+            "aggregate the history files in this many processes; the sessions report "
+            "needs a single pass in order of time and ignores it"
+        ),
+    )
+    parser.add_argument(
+        "--cache-directory",
+        default=DEFAULT_CACHE_DIRECTORY,
+        help="where parsed Plays and reports are cached (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="parse the export again and neither read nor write any cache",
+    )
+    return parser
+
+
+def run_reports(
+    path: str,
+    reports: Iterable[str] = REPORTS,
+    top: int = DEFAULT_TOP,
+    gap_minutes: float = DEFAULT_GAP_MINUTES,
+    cache_directory: Optional[str] = None,
+    workers: Optional[int] = None,
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Computes the named reports (see REPORTS) over the export at path (a ZIP archive,
+    directory or history file) in a single pass, and gets the rows of each.
+
+    The Plays are cached in cache_directory, if given, as with SpotifyHistoryReader.
+    With workers, the history files are aggregated in that many processes (see
+    federation.Federation), unless the sessions report is run: sessions need all the
+    Plays in order of time, so they are read in one stream by read_by_time()."""
+    from spotify_history_reader.aggregate import aggregate
+
+    reports = list(reports)
+    for report in reports:
+        if report not in REPORTS:
+            raise ValueError(f"Unknown report {report}")
+    aggregates = {
+        f"{report} {measure}": aggregate
+        for report in reports
+        if report in _GROUPS
+        for measure, aggregate in _aggregates(report, top).items()
+    }
+
+    if "sessions" in reports:
+        from spotify_history_reader.sessions import sessionize
+
+        reader = _reader(path, cache_directory)
+        adders = [aggregate.add for aggregate in aggregates.values()]
+        sessions = _SessionTotals()
+        for session in sessionize(
+            _observed(reader.read_by_time(), adders), _gap(gap_minutes)
+        ):
+            sessions.add(session)
+        results = {name: aggregate.result() for name, aggregate in aggregates.items()}
+    elif workers is not None and workers > 1:
+        from spotify_history_reader.federation import Federation
+
+        federation = Federation(cache_directory)
+        federation.add_export("", path)
+        results = federation.aggregate(workers, **aggregates)
+    else:
+        reader = _reader(path, cache_directory)
+        results = aggregate(reader.read(streaming=True), **aggregates)
+
+    rows = {}
+    for report in reports:
+        if report == "sessions":
+            rows[report] = _sessions(sessions.result())
+        else:
+            measures = {
+                measure: results[f"{report} {measure}"] for measure in _MEASURES
+            }
+            rows[report] = _ROWS[report](measures)
+    return rows
+
+
+def _reader(path: str, cache_directory: Optional[str]):
+    from spotify_history_reader.reader import SpotifyHistoryReader
+
+    reader = SpotifyHistoryReader(cache_directory)
+    if os.path.isdir(path):
+        reader.add_source_directory(path)
+    elif path.endswith(".zip"):
+        reader.add_source_zip(path)
+    else:
+        reader.add_source(path)
+    return reader
+
+
+def _gap(gap_minutes: float):
+    from datetime import timedelta
+
+    return timedelta(minutes=gap_minutes)
+
+
+def _observed(plays: Iterable, adders: List[Callable]) -> Iterator:
+    # passes the Plays through, adding each to the aggregates on the way
+    for play in plays:
+        for add in adders:
+            add(play)
+        yield play
+
+
+# the measures summed over the Plays in each group of a report
+_MEASURES = ("ms_played", "count", "skips")
+
+# the keys (see aggregate.KEYS) that the reports group the Plays by, whether only songs
+# are grouped, and the measure the groups are ranked by, if they are
+_GROUPS: Dict[str, Tuple[Any, bool, Optional[str]]] = {
+    "top-artists": ("artist", True, "ms_played"),
+    "top-tracks": (("id", "song", "artist"), True, "count"),
+    "yearly": ("year", False, None),
+}
+
+
+def _aggregates(report: str, top: int) -> Dict[str, Any]:
+    # the top groups by the ranking measure are selected by the Aggregate itself, and
+    # the other measures of just those groups looked up afterwards
+    from spotify_history_reader.aggregate import Aggregate
+    from spotify_history_reader.filters import PlayFilter
+
+    by, songs_only, ranked_by = _GROUPS[report]
+    play_filter = PlayFilter(songs_only=True) if songs_only else None
+    return {
+        measure: Aggregate(
+            by, measure, top if measure == ranked_by else None, play_filter
+        )
+        for measure in _MEASURES
+    }
+
+
+class _SessionTotals:
+    """Counts the listening sessions starting in each year, and their plays and
+    durations."""
+
+    def __init__(self):
+        # [sessions, plays, total duration in ms, longest duration in ms] by year
+        self.totals: Dict[int, List[int]] = {}
+
+    def add(self, session):
+        """Adds a Session to the year it started in."""
+        year = session.start.year
+        group = self.totals.get(year)
+        if group is None:
+            group = self.totals[year] = [0, 0, 0, 0]
+        duration = int(session.duration.total_seconds() * 1000)
+        group[0] += 1
+        group[1] += session.tracks
+        group[2] += duration
+        group[3] = max(group[3], duration)
+
+    def result(self) -> Dict[int, List[int]]:
+        """Gets the [sessions, plays, total duration, longest duration] of each year."""
+        return self.totals
+
+
+def _top_artists(measures: Dict[str, Any]) -> List[Dict[str, Any]]:
+    plays, skips = measures["count"], measures["skips"]
+    ranked = sorted(measures["ms_played"], key=lambda item: (-item[1], item[0]))
+    return [
+        {
+            "rank": rank,
+            "artist": artist,
+            "ms_played": ms_played,
+            "plays": plays[artist],
+            "skips": skips[artist],
+        }
+        for rank, (artist, ms_played) in enumerate(ranked, 1)
+    ]
+
+
+def _top_tracks(measures: Dict[str, Any]) -> List[Dict[str, Any]]:
+    ms_played, skips = measures["ms_played"], measures["skips"]
+    ranked = sorted(
+        measures["count"], key=lambda item: (-item[1], -ms_played[item[0]], item[0][0])
+    )
+    return [
+        {
+            "rank": rank,
+            "id": uri,
+            "song": song,
+            "artist": artist,
+            "plays": plays,
+            "ms_played": ms_played[(uri, song, artist)],
+            "skips": skips[(uri, song, artist)],
+        }
+        for rank, ((uri, song, artist), plays) in enumerate(ranked, 1)
+    ]
+
+
+def _yearly(measures: Dict[str, Any]) -> List[Dict[str, Any]]:
+    plays, skips = measures["count"], measures["skips"]
+    return [
+        {
+            "year": year,
+            "ms_played": ms_played,
+            "plays": plays[year],
+            "skips": skips[year],
+        }
+        for year, ms_played in sorted(measures["ms_played"].items())
+    ]
+
+
+def _sessions(totals: Dict[int, List[int]]) -> List[Dict[str, Any]]:
+    return [
+        {
+            "year": year,
+            "sessions": sessions,
+            "plays": plays,
+            "average_minutes": round(duration / sessions / 60000, 1),
+            "longest_minutes": round(longest / 60000, 1),
+        }
+        for year, (sessions, plays, duration, longest) in sorted(totals.items())
+    ]
+
+
+_ROWS: Dict[str, Callable[[Dict[str, Any]], List[Dict[str, Any]]]] = {
+    "top-artists": _top_artists,
+    "top-tracks": _top_tracks,
+    "yearly": _yearly,
+}
+
+
+def _report_path(
+    cache_directory: str,
+    path: str,
+    reports: List[str],
+    top: int,
+    gap_minutes: float,
+) -> str:
+    # the report is keyed by its options and the size and modification time of every
+    # file of the export, which only takes a stat per file to check
+    files = []
+    if os.path.isdir(path):
+        for root, _, names in os.walk(path):
+            for name in names:
+                if name.endswith(".json"):
+                    files.append(os.path.join(root, name))
+        files.sort()
+    else:
+        files.append(path)
+    fingerprint = [_VERSION, os.path.abspath(path), reports, top, gap_minutes]
+    for file in files:
+        stat = os.stat(file)
+        fingerprint.append([file, stat.st_size, stat.st_mtime_ns])
+    key = hashlib.sha1(json.dumps(fingerprint).encode("utf-8")).hexdigest()
+    return os.path.join(cache_directory, "reports", key + ".json")
+
+
+def _load_report(report_path: str) -> Optional[Dict[str, List[Dict[str, Any]]]]:
+    try:
+        with open(report_path, "r", encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _store_report(report_path: str, results: Dict[str, List[Dict[str, Any]]]):
+    directory = os.path.dirname(report_path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".partial")
+    with open(fd, "w", encoding="utf-8") as file:
+        json.dump(results, file)
+    os.replace(temp_path, report_path)
+
+
+def _write_json(results: Dict[str, List[Dict[str, Any]]], output: Optional[str]):
+    if output is None:
+        json.dump(results, sys.stdout, indent=2, ensure_ascii=False)
+        sys.stdout.write("\n")
+        return
+    with open(output, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2, ensure_ascii=False)
+        file.write("\n")
+
+
+def _write_csv(results: Dict[str, List[Dict[str, Any]]], output: Optional[str]):
+    import csv
+
+    if output is not None:
+        os.makedirs(output, exist_ok=True)
+        for report, rows in results.items():
+            path = os.path.join(output, report + ".csv")
+            with open(path, "w", encoding="utf-8", newline="") as file:
+                _write_rows(csv.writer(file), report, rows)
+        return
+    # on standard output, each report is a table of its own under a "# report" line
+    for position, (report, rows) in enumerate(results.items()):
+        if position:
+            sys.stdout.write("\n")
+        sys.stdout.write(f"# {report}\n")
+        _write_rows(csv.writer(sys.stdout, lineterminator="\n"), report, rows)
+
+
+def _write_rows(writer, report: str, rows: List[Dict[str, Any]]):
+    # the columns of a report are known even when it has no rows
+    columns = list(rows[0]) if rows else _COLUMNS[report]
+    writer.writerow(columns)
+    writer.writerows([row[column] for column in columns] for row in rows)
+
+
+_COLUMNS: Dict[str, List[str]] = {
+    "top-artists": ["rank", "artist", "ms_played", "plays", "skips"],
+    "top-tracks": ["rank", "id", "song", "artist", "plays", "ms_played", "skips"],
+    "yearly": ["year", "ms_played", "plays", "skips"],
+    "sessions": [
+        "year",
+        "sessions",
+        "plays",
+        "average_minutes",
+        "longest_minutes",
+    ],
+}
+
+
+if __name__ == "__main__":
+    sys.exit(main())
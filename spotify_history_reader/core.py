@@ -1,7 +1,60 @@
+import sys
+
 from datetime import datetime
+from typing import Optional, Union
+
+from spotify_history_reader.timestamps import fields, parse_epoch, to_datetime
+
+_CONNECTION_KEYS = (
+    "username",
+    "platform",
+    "ip_addr_decrypted",
+    "ip_addr",
+    "conn_country",
+    "offline",
+    "incognito_mode",
+)
+
+
+class _Missing:
+    """Marks connection keys that are absent from an entry, as opposed to null."""
+
+    def __reduce__(self):
+        # unpickles to the same instance so that identity checks keep working
+        return "_MISSING"
+
+
+_MISSING = _Missing()
+_ALL_MISSING = (_MISSING,) * len(_CONNECTION_KEYS)
+
+# the values of Play.row(), in order
+ROW_FIELDS = (
+    "timestamp",
+    "ms_played",
+    "is_song",
+    "id",
+    "song",
+    "artist",
+    "album",
+    "reason_start",
+    "reason_end",
+    "shuffle",
+    "skipped",
+    "username",
+    "platform",
+    "country",
+    "offline",
+    "incognito_mode",
+)
+
+
+def _intern_enum(value: Optional[str]) -> Optional[str]:
+    return sys.intern(value) if type(value) is str else value
 
 
 class Episode:
+    __slots__ = ("name", "show", "uri")
+
     def __init__(self, name: str, show: str, uri: str):
         self.name: str = name
         self.show: str = show
@@ -12,6 +65,8 @@ class Episode:
 
 
 class Track:
+    __slots__ = ("name", "album", "artist", "uri")
+
     def __init__(self, name: str, album: str, artist: str, uri: str):
         self.name: str = name
         self.album: str = album
@@ -23,24 +78,32 @@ class Track:
 
 
 class Connection:
+    __slots__ = ("username", "platform", "ip", "country", "offline", "incognito_mode")
+
     def __init__(self, data: dict):
-        self.username: str = data["username"] if "username" in data else "unknown"
-        self.platfrom: str = data["platfrom"] if "platfrom" in data else "unknown"
-        self.ip: str = (
-            data["ip_addr_decrypted"]
-            if "ip_addr_decrypted" in data
-            else (data["ip_addr"] if "ip_addr" in data else "unknown")
-        )
-        self.country: str = (
-            data["conn_country"] if "conn_country" in data else "unknown"
-        )
-        self.offline: bool = data["offline"] if "offline" in data else False
-        self.incognito_mode: bool = (
-            data["incognito_mode"] if "incognito_mode" in data else False
-        )
+        self.username: str = data.get("username", "unknown")
+        self.platform: str = data.get("platform", "unknown")
+        self.ip: str = data.get("ip_addr_decrypted", data.get("ip_addr", "unknown"))
+        self.country: str = data.get("conn_country", "unknown")
+        self.offline: bool = data.get("offline", False)
+        self.incognito_mode: bool = data.get("incognito_mode", False)
+
+    @property
+    def platfrom(self) -> str:
+        """Deprecated misspelling of platform"""
+        return self.platform
 
 
 class Playback:
+    __slots__ = (
+        "ms_played",
+        "reason_start",
+        "reason_end",
+        "shuffle",
+        "skipped",
+        "_timestamp",
+    )
+
     def __init__(
         self,
         ms_played: int,
@@ -48,84 +111,340 @@ class Playback:
         reason_end: str,
         shuffle: bool,
         skipped: bool,
-        timestamp: datetime,
+        timestamp: Union[datetime, int],
     ):
         self.ms_played: int = ms_played
         self.reason_start: str = reason_start
         self.reason_end: str = reason_end
         self.shuffle: bool = shuffle
         self.skipped: bool = skipped
-        self.timestamp: datetime = timestamp
+        # seconds since the epoch until first accessed
+        self._timestamp: Union[datetime, int] = timestamp
+
+    @property
+    def timestamp(self) -> datetime:
+        """Gets the timestamp of the playback in UTC, building it on first access"""
+        if not isinstance(self._timestamp, datetime):
+            self._timestamp = to_datetime(self._timestamp)
+        return self._timestamp
 
 
 class Play:
+    """A single entry of the streaming history.
+
+    Only the raw fields of the entry are kept; the track or episode, the connection and
+    the playback are built on first access."""
+
+    __slots__ = (
+        "_is_song",
+        "_uri",
+        "_name",
+        "_album",
+        "_artist",
+        "_ms_played",
+        "_reason_start",
+        "_reason_end",
+        "_shuffle",
+        "_skipped",
+        "_ts",
+        "_epoch",
+        "_connection_fields",
+        "_item",
+        "_connection",
+        "_playback",
+    )
+
     def __init__(self, **data: dict):
-        self.episode: Episode = None
-        self.track: Track = None
-
-        if data["spotify_episode_uri"]:
-            self.episode = Episode(
-                name=data["episode_name"],
-                show=data["episode_show_name"],
-                uri=data["spotify_episode_uri"],
-            )
-        elif data["spotify_track_uri"]:
-            self.track = Track(
-                name=data["master_metadata_track_name"],
-                album=data["master_metadata_album_album_name"],
-                artist=data["master_metadata_album_artist_name"],
-                uri=data["spotify_track_uri"],
-            )
+        self._load(data)
+
+    @classmethod
+    def from_entry(cls, data: dict, symbols: "Optional[SymbolTable]" = None) -> "Play":
+        """Creates a Play from an entry of a history file, without copying it. If a
+        SymbolTable is given, the values of the entry are shared through it."""
+        play = cls.__new__(cls)
+        play._load(data)
+        if symbols is not None:
+            symbols.share(play)
+        return play
+
+    def _load(self, data: dict):
+        if data.get("spotify_episode_uri"):
+            self._is_song = False
+            self._uri = data["spotify_episode_uri"]
+            self._name = data["episode_name"]
+            self._album = None
+            self._artist = data["episode_show_name"]
+        elif data.get("spotify_track_uri"):
+            self._is_song = True
+            self._uri = data["spotify_track_uri"]
+            self._name = data["master_metadata_track_name"]
+            self._album = data["master_metadata_album_album_name"]
+            self._artist = data["master_metadata_album_artist_name"]
         else:
             raise ValueError("Invalid play")
 
-        self.connection = Connection(data)
+        self._ms_played = data["ms_played"]
+        self._reason_start = data["reason_start"]
+        self._reason_end = data["reason_end"]
+        self._shuffle = data["shuffle"]
+        self._skipped = data["skipped"]
+        ts = data["ts"]
+        if not isinstance(ts, str):
+            raise ValueError("Invalid timestamp")
+        self._ts = ts
+        # parsed up front so that an invalid timestamp rejects the entry; only the
+        # datetime is built lazily
+        self._epoch = parse_epoch(ts)
+        self._connection_fields = tuple(map(data.get, _CONNECTION_KEYS, _ALL_MISSING))
+        self._item = None
+        self._connection = None
+        self._playback = None
 
-        self.playback = Playback(
-            ms_played=data["ms_played"],
-            reason_start=data["reason_start"],
-            reason_end=data["reason_end"],
-            shuffle=data["shuffle"],
-            skipped=data["skipped"],
-            timestamp=datetime.fromisoformat(data["ts"].replace("Z", "+00:00")),
-        )
+    def _new_item(self) -> Union[Track, Episode]:
+        if self._is_song:
+            return Track(self._name, self._album, self._artist, self._uri)
+        return Episode(self._name, self._artist, self._uri)
+
+    @property
+    def track(self) -> Track:
+        """Gets the track of the play, or None if the play was an episode"""
+        if not self._is_song:
+            return None
+        if self._item is None:
+            self._item = self._new_item()
+        return self._item
+
+    @property
+    def episode(self) -> Episode:
+        """Gets the episode of the play, or None if the play was a song"""
+        if self._is_song:
+            return None
+        if self._item is None:
+            self._item = self._new_item()
+        return self._item
+
+    @property
+    def connection(self) -> Connection:
+        """Gets the connection over which the play happened"""
+        if self._connection is None:
+            self._connection = Connection(
+                {
+                    key: value
+                    for key, value in zip(_CONNECTION_KEYS, self._connection_fields)
+                    if value is not _MISSING
+                }
+            )
+        return self._connection
+
+    @property
+    def playback(self) -> Playback:
+        """Gets the playback details of the play"""
+        if self._playback is None:
+            self._playback = Playback(
+                ms_played=self._ms_played,
+                reason_start=self._reason_start,
+                reason_end=self._reason_end,
+                shuffle=self._shuffle,
+                skipped=self._skipped,
+                timestamp=self.epoch,
+            )
+        return self._playback
 
     @property
     def artist(self) -> str:
         """Gets the artist (or show) of the play"""
-        if self.track is not None:
-            return self.track.artist
-        else:
-            return self.episode.show
+        return self._artist
 
     @property
     def song(self) -> str:
         """Gets the name of the song (or the episode) of the play"""
-        if self.track is not None:
-            return self.track.name
-        else:
-            return self.episode.name
+        return self._name
 
     @property
     def id(self) -> str:
         """Gets the identifier (URI) of the track played"""
-        if self.track is not None:
-            return self.track.uri
-        else:
-            return self.episode.uri
+        return self._uri
 
     @property
     def is_song(self) -> bool:
         """Gets whether the play was a song (the alternative being a podcast episode)"""
-        return self.track is not None
+        return self._is_song
 
     @property
     def timestamp(self) -> datetime:
         """Gets the timestamp of the play"""
         return self.playback.timestamp
 
+    @property
+    def epoch(self) -> int:
+        """Gets the timestamp of the play in seconds since the epoch, without building a
+        datetime"""
+        if self._epoch is None:
+            self._epoch = parse_epoch(self._ts)
+        return self._epoch
+
+    @property
+    def year(self) -> int:
+        """Gets the year of the play (in UTC, as are the month, weekday and hour)"""
+        return fields(self.epoch)[0]
+
+    @property
+    def month(self) -> int:
+        """Gets the month of the play"""
+        return fields(self.epoch)[1]
+
+    @property
+    def weekday(self) -> int:
+        """Gets the weekday of the play, Monday being 0"""
+        return fields(self.epoch)[3]
+
+    @property
+    def hour(self) -> int:
+        """Gets the hour of the play"""
+        return fields(self.epoch)[4]
+
+    def row(self) -> tuple:
+        """Gets the values of the play named by ROW_FIELDS, the timestamp in seconds
+        since the epoch, without building its track, playback or connection"""
+        (
+            username,
+            platform,
+            _,
+            _,
+            country,
+            offline,
+            incognito_mode,
+        ) = self._connection_fields
+        if _MISSING in (username, platform, country, offline, incognito_mode):
+            connection = self.connection
+            username, platform, country = (
+                connection.username,
+                connection.platform,
+                connection.country,
+            )
+            offline, incognito_mode = connection.offline, connection.incognito_mode
+        return (
+            self.epoch,
+            self._ms_played,
+            self._is_song,
+            self._uri,
+            self._name,
+            self._artist,
+            self._album,
+            self._reason_start,
+            self._reason_end,
+            self._shuffle,
+            self._skipped,
+            username,
+            platform,
+            country,
+            offline,
+            incognito_mode,
+        )
+
+    def __reduce__(self):
+        # pickles only the raw fields, which is considerably more compact and faster to
+        # load than the default state of a slotted object
+        return (
+            _restore_play,
+            (
+                self._is_song,
+                self._uri,
+                self._name,
+                self._album,
+                self._artist,
+                self._ms_played,
+                self._reason_start,
+                self._reason_end,
+                self._shuffle,
+                self._skipped,
+                self._ts,
+                self._connection_fields,
+            ),
+        )
+
     def __repr__(self):
         if self.episode:
             return str(self.episode)
         else:
             return str(self.track)
+
+
+class SymbolTable:
+    """Shares the values that repeat across the Plays read together.
+
+    Equal strings (names, URIs, platforms, ...) and identical connection fields are kept
+    once, and the Plays of the same track or episode share one Track or Episode, so a
+    materialized history takes far less memory and equal keys are found by identity in
+    dictionaries. The reader uses one table per read."""
+
+    __slots__ = ("_values", "_items")
+
+    def __init__(self):
+        self._values: dict = {}
+        self._items: dict = {}
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def value(self, value):
+        """Gets the first value equal to the given one, which must be hashable"""
+        return self._values.setdefault(value, value)
+
+    def share(self, play: Play) -> Play:
+        """Shares the values of a Play, and gets it back"""
+        share = self._values.setdefault
+        play._uri = share(play._uri, play._uri)
+        play._name = share(play._name, play._name)
+        play._album = share(play._album, play._album)
+        play._artist = share(play._artist, play._artist)
+        play._reason_start = _intern_enum(play._reason_start)
+        play._reason_end = _intern_enum(play._reason_end)
+
+        fields = play._connection_fields
+        shared = self._values.get(fields)
+        if shared is None:
+            shared = tuple(map(share, fields, fields))
+            self._values[shared] = shared
+        play._connection_fields = shared
+
+        key = (play._uri, play._name, play._album, play._artist)
+        item = self._items.get(key)
+        if item is None:
+            item = self._items[key] = play._new_item()
+        play._item = item
+        return play
+
+
+def _restore_play(
+    is_song,
+    uri,
+    name,
+    album,
+    artist,
+    ms_played,
+    reason_start,
+    reason_end,
+    shuffle,
+    skipped,
+    ts,
+    connection_fields,
+) -> Play:
+    play = Play.__new__(Play)
+    play._is_song = is_song
+    play._uri = uri
+    play._name = name
+    play._album = album
+    play._artist = artist
+    play._ms_played = ms_played
+    play._reason_start = reason_start
+    play._reason_end = reason_end
+    play._shuffle = shuffle
+    play._skipped = skipped
+    play._ts = ts
+    play._epoch = None
+    play._connection_fields = connection_fields
+    play._item = None
+    play._connection = None
+    play._playback = None
+    return play
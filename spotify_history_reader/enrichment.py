@@ -0,0 +1,358 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+from spotify_history_reader.core import Play
+
+# fetches the items of a batch of URIs, in the same order, with None for unknown ones
+Fetch = Callable[[List[str]], Sequence[Optional[Dict[str, Any]]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    value TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_by_age ON entries (namespace, updated);
+"""
+
+
+class EnrichmentCache:
+    """A persistent key-value store for data fetched to enrich Plays, backed by SQLite.
+
+    Entries are looked up one at a time as they are requested, so opening a cache takes
+    the same time however large it is. Writes are committed in small batches (every
+    commit_every writes, and on flush), so a crash loses at most the last batch.
+
+    Entries older than ttl seconds are treated as missing. If max_entries is given,
+    flush() evicts the oldest entries beyond it. Several caches, told apart by their
+    namespace, can share one database file, but SQLite lets only one of them hold
+    uncommitted writes at a time, so caches written to together need separate files."""
+
+    def __init__(
+        self,
+        path: str,
+        namespace: str = "default",
+        ttl: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        commit_every: int = 100,
+        memory_entries: int = 1024,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.path: str = os.path.expanduser(path)
+        self.namespace: str = namespace
+        self.ttl: Optional[float] = ttl
+        self.max_entries: Optional[int] = max_entries
+        self.commit_every: int = commit_every
+        self._clock = clock
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # guarded by the lock below, so the cache may be shared between threads
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+        self._lock = threading.RLock()
+        self._uncommitted = 0
+        # recently used entries, kept in memory as (value, updated)
+        self._recent: "OrderedDict[str, Any]" = OrderedDict()
+        self._memory_entries = memory_entries
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __contains__(self, key: str) -> bool:
+        return self._lookup(key) is not None
+
+    def __getitem__(self, key: str) -> Any:
+        entry = self._lookup(key)
+        if entry is None:
+            raise KeyError(key)
+        return entry[0]
+
+    def get(self, key: str, default: Any = None) -> Any:
+        entry = self._lookup(key)
+        return entry[0] if entry is not None else default
+
+    def __setitem__(self, key: str, value: Any):
+        updated = self._clock()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (self.namespace, key, json.dumps(value), updated),
+            )
+            self._remember(key, (value, updated))
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.namespace,)
+            ).fetchone()[0]
+
+    def flush(self):
+        """Evicts expired and surplus entries and commits all writes."""
+        with self._lock:
+            if self.ttl is not None:
+                self._connection.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND updated < ?",
+                    (self.namespace, self._clock() - self.ttl),
+                )
+            if self.max_entries is not None:
+                self._connection.execute(
+                    """DELETE FROM entries WHERE namespace = ? AND key IN (
+                        SELECT key FROM entries WHERE namespace = ?
+                        ORDER BY updated DESC LIMIT -1 OFFSET ?)""",
+                    (self.namespace, self.namespace, self.max_entries),
+                )
+            self._recent.clear()
+            self._commit()
+
+    def close(self):
+        """Flushes the cache and closes the database."""
+        self.flush()
+        self._connection.close()
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._recent.get(key)
+            if entry is None:
+                row = self._connection.execute(
+                    "SELECT value, updated FROM entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                ).fetchone()
+                if row is None:
+                    return None
+                entry = (json.loads(row[0]), row[1])
+            if self.ttl is not None and entry[1] < self._clock() - self.ttl:
+                return None
+            self._remember(key, entry)
+            return entry
+
+    def _remember(self, key: str, entry):
+        self._recent[key] = entry
+        self._recent.move_to_end(key)
+        if len(self._recent) > self._memory_entries:
+            self._recent.popitem(last=False)
+
+    def _commit(self):
+        self._connection.commit()
+        self._uncommitted = 0
+
+
+class EnrichedPlay:
+    """A Play together with the metadata fetched for it.
+
+    track, album and artists are the objects returned by the fetch functions of the
+    Enricher; album and artists fall back to the simplified objects embedded in the
+    track if they are not fetched separately. Episodes, and tracks that could not be
+    found, have no metadata."""
+
+    __slots__ = ("play", "track", "album", "artists")
+
+    def __init__(
+        self,
+        play: Play,
+        track: Optional[Dict[str, Any]] = None,
+        album: Optional[Dict[str, Any]] = None,
+        artists: Optional[List[Dict[str, Any]]] = None,
+    ):
+        self.play: Play = play
+        self.track: Optional[Dict[str, Any]] = track
+        self.album: Optional[Dict[str, Any]] = album
+        self.artists: List[Dict[str, Any]] = artists if artists is not None else []
+
+    @property
+    def genres(self) -> List[str]:
+        """Gets the genres of the artists of the play, without duplicates"""
+        genres = dict.fromkeys(
+            genre for artist in self.artists for genre in artist.get("genres") or ()
+        )
+        return list(genres)
+
+
+# the result of a URI that is still being fetched
+_PENDING = object()
+
+
+class _Stage:
+    def __init__(self, fetch: Fetch, store, batch_size: int):
+        self.fetch = fetch
+        self.store = store if store is not None else {}
+        self.batch_size = batch_size
+        self.queue: List[str] = []
+        self.requested = set()
+        self.missing = set()
+
+    def result(self, uri: str):
+        """Gets the result for uri, or else queues it to be fetched (unless it already
+        is) and gets _PENDING."""
+        if uri in self.missing:
+            return None
+        result = self.store.get(uri)
+        if result is None:
+            if uri not in self.requested:
+                self.requested.add(uri)
+                self.queue.append(uri)
+            return _PENDING
+        return result
+
+
+class Enricher:
+    """Enriches a stream of Plays, such as SpotifyHistoryReader.read(), with metadata
+    fetched in batches while the stream is still being read.
+
+    fetch_tracks (and optionally fetch_albums and fetch_artists) are called from worker
+    threads with lists of URIs, at most batch_sizes of them at a time, and must return
+    the items for them in the same order, with None for URIs that are not found. Each
+    URI is fetched once: results are kept in the given caches (anything with `in`,
+    `get` and item assignment, such as an EnrichmentCache, or a dict if none is given),
+    and URIs already in a cache are not fetched at all.
+
+    At most max_in_flight batches are fetched at once, and at most max_pending Plays are
+    held back waiting for their metadata, so memory use does not grow with the length of
+    the stream (beyond the caches). Plays are yielded as EnrichedPlays in their original
+    order."""
+
+    def __init__(
+        self,
+        fetch_tracks: Fetch,
+        fetch_albums: Optional[Fetch] = None,
+        fetch_artists: Optional[Fetch] = None,
+        track_cache=None,
+        album_cache=None,
+        artist_cache=None,
+        batch_sizes: Sequence[int] = (50, 20, 50),
+        max_in_flight: int = 8,
+        max_pending: int = 10000,
+    ):
+        self.max_in_flight: int = max_in_flight
+        self.max_pending: int = max_pending
+        self._tracks = _Stage(fetch_tracks, track_cache, batch_sizes[0])
+        self._albums = (
+            _Stage(fetch_albums, album_cache, batch_sizes[1]) if fetch_albums else None
+        )
+        self._artists = (
+            _Stage(fetch_artists, artist_cache, batch_sizes[2])
+            if fetch_artists
+            else None
+        )
+        self._stages = [
+            stage for stage in (self._tracks, self._albums, self._artists) if stage
+        ]
+
+    def enrich(self, plays: Iterable[Play]) -> Iterator[EnrichedPlay]:
+        """Gets the Plays with their metadata, in order."""
+        plays = iter(plays)
+        exhausted = False
+        pending: "deque[Play]" = deque()
+        # batches are handed back to this thread as they complete
+        completed: "queue.SimpleQueue" = queue.SimpleQueue()
+        in_flight = 0
+
+        with ThreadPoolExecutor(self.max_in_flight) as executor:
+
+            def send(partial: bool) -> int:
+                sent = 0
+                for stage in self._stages:
+                    while in_flight + sent < self.max_in_flight and (
+                        len(stage.queue) >= stage.batch_size
+                        or (partial and stage.queue)
+                    ):
+                        batch = stage.queue[: stage.batch_size]
+                        del stage.queue[: stage.batch_size]
+                        future = executor.submit(stage.fetch, batch)
+                        future.add_done_callback(
+                            lambda future, stage=stage, batch=batch: completed.put(
+                                (stage, batch, future)
+                            )
+                        )
+                        sent += 1
+                return sent
+
+            while True:
+                while True:
+                    try:
+                        self._receive(*completed.get_nowait())
+                    except queue.Empty:
+                        break
+                    in_flight -= 1
+
+                while pending:
+                    enriched = self._resolve(pending[0])
+                    if enriched is None:
+                        break
+                    pending.popleft()
+                    yield enriched
+
+                if not exhausted and len(pending) < self.max_pending:
+                    play = next(plays, None)
+                    if play is None:
+                        exhausted = True
+                    else:
+                        pending.append(play)
+                        self._resolve(play)
+                        in_flight += send(partial=False)
+                    continue
+
+                if not pending:
+                    break
+                # nothing more can be read until the oldest Play is complete
+                in_flight += send(partial=True)
+                self._receive(*completed.get())
+                in_flight -= 1
+
+    def _receive(self, stage: _Stage, batch: List[str], future: Future):
+        # raises the error of a failed fetch
+        results = future.result()
+        for uri, result in zip(batch, results):
+            stage.requested.discard(uri)
+            if result is None:
+                stage.missing.add(uri)
+            else:
+                stage.store[uri] = result
+                if stage is self._tracks:
+                    # request the album and artists before the Play reaches the front
+                    self._complete(result)
+
+    def _resolve(self, play: Play) -> Optional[EnrichedPlay]:
+        """Gets the Play with its metadata, or else requests what is missing and gets
+        None."""
+        if not play.is_song or not play.id:
+            return EnrichedPlay(play)
+        track = self._tracks.result(play.id)
+        if track is _PENDING:
+            return None
+        if track is None:
+            return EnrichedPlay(play)
+        album, artists = self._complete(track)
+        if album is _PENDING or _PENDING in artists:
+            return None
+        return EnrichedPlay(
+            play, track, album, [artist for artist in artists if artist is not None]
+        )
+
+    def _complete(self, track: Dict[str, Any]):
+        album = track.get("album")
+        if self._albums is not None and album:
+            album = self._albums.result(album["uri"])
+        artists = track.get("artists") or []
+        if self._artists is not None:
+            artists = [self._artists.result(artist["uri"]) for artist in artists]
+        return album, artists
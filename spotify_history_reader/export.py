@@ -0,0 +1,226 @@
+import csv
+import os
+
+from operator import itemgetter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from spotify_history_reader.core import ROW_FIELDS, Play
+from spotify_history_reader.timestamps import fields
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pa = None
+
+# the types of the exported columns: timestamps are UTC seconds, and dictionary columns
+# hold few distinct strings; see Play.row() for the values
+COLUMNS: Dict[str, str] = {
+    "timestamp": "timestamp",
+    "ms_played": "int",
+    "is_song": "bool",
+    "id": "string",
+    "song": "string",
+    "artist": "dictionary",
+    "album": "dictionary",
+    "reason_start": "dictionary",
+    "reason_end": "dictionary",
+    "shuffle": "bool",
+    "skipped": "bool",
+    "username": "dictionary",
+    "platform": "dictionary",
+    "country": "dictionary",
+    "offline": "bool",
+    "incognito_mode": "bool",
+}
+
+FORMATS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+
+DEFAULT_BATCH_SIZE = 65536
+
+
+def export(
+    plays: Iterable[Play],
+    directory: str,
+    format: str = "parquet",
+    columns: Optional[Sequence[str]] = None,
+    partition_by_year=True,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> List[str]:
+    """Writes the Plays to files in directory for other analytics tools, and gets the
+    paths of the files written.
+
+    format is "parquet" or "arrow" (the Arrow IPC file format), which need pyarrow, or
+    "csv", which does not. columns selects and orders the exported columns (see
+    COLUMNS); all are exported by default. With partition_by_year, the Plays of each
+    year go to their own directory, e.g. year=2021/plays.parquet, which engines such as
+    DuckDB, Spark and pyarrow.dataset read as a partition column.
+
+    The Plays are streamed through in batches of batch_size rows per year, so memory is
+    bounded however long the history; each batch is a row group (Parquet) or record
+    batch (Arrow)."""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format}")
+    if format != "csv" and pa is None:
+        raise ImportError(f"pyarrow is needed to export {format}")
+    names = list(columns) if columns is not None else list(ROW_FIELDS)
+    for name in names:
+        if name not in COLUMNS:
+            raise ValueError(f"Unknown column {name}")
+    row_of = Play.row
+    if names != list(ROW_FIELDS):
+        # the rows are built whole; keep the selected columns, in order
+        select = itemgetter(*(ROW_FIELDS.index(name) for name in names))
+        row_of = (
+            (lambda play: select(play.row()))
+            if len(names) > 1
+            else (lambda play: (select(play.row()),))
+        )
+    writer_class = _CsvWriter if format == "csv" else _ArrowWriter
+
+    writers: Dict[Optional[int], Any] = {}
+
+    def write(year: Optional[int], batch: List[tuple]):
+        writer = writers.get(year)
+        if writer is None:
+            path = directory
+            if year is not None:
+                path = os.path.join(path, f"year={year}")
+            os.makedirs(path, exist_ok=True)
+            writer = writers[year] = writer_class(
+                os.path.join(path, "plays" + FORMATS[format]),
+                format,
+                names,
+                [COLUMNS[name] for name in names],
+            )
+        writer.write(batch)
+
+    batches: Dict[Optional[int], List[tuple]] = {}
+    try:
+        for play in plays:
+            row = row_of(play)
+            year = play.year if partition_by_year else None
+            batch = batches.get(year)
+            if batch is None:
+                batch = batches[year] = []
+            batch.append(row)
+            if len(batch) >= batch_size:
+                write(year, batch)
+                batches[year] = []
+        for year, batch in batches.items():
+            if batch:
+                write(year, batch)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return [writer.path for _, writer in sorted(writers.items(), key=_year_order)]
+
+
+def _year_order(item) -> Tuple[int, int]:
+    year, _ = item
+    return (0, 0) if year is None else (1, year)
+
+
+class _CsvWriter:
+    """Writes batches of rows to a CSV file with a header, and timestamps in ISO 8601.
+    Flags are written as True or False, and None as an empty field."""
+
+    def __init__(self, path: str, format: str, names: List[str], types: List[str]):
+        self.path: str = path
+        self._file = open(path, "w", encoding="utf-8", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(names)
+        self._timestamp = types.index("timestamp") if "timestamp" in types else None
+
+    def write(self, rows: List[tuple]):
+        index = self._timestamp
+        if index is not None:
+            rows = [
+                row[:index] + (_iso_timestamp(row[index]),) + row[index + 1 :]
+                for row in rows
+            ]
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+def _iso_timestamp(epoch: int) -> str:
+    seconds = epoch % 3600
+    return f"{fields(epoch)[5]}:{seconds // 60:02d}:{seconds % 60:02d}Z"
+
+
+class _ArrowWriter:
+    """Writes batches of rows to a Parquet or Arrow IPC file with typed columns.
+
+    Each dictionary column keeps one dictionary across batches, growing as new values
+    appear: the IPC file format only allows later batches to extend a dictionary. Only
+    the new values of a batch are converted, so that the IPC writer emits them as a
+    delta, and a batch without new values reuses the dictionary as it is."""
+
+    def __init__(self, path: str, format: str, names: List[str], types: List[str]):
+        self.path: str = path
+        self._types = [_arrow_type(kind) for kind in types]
+        self._dictionaries: List[Optional[Dict[str, int]]] = [
+            {} if kind == "dictionary" else None for kind in types
+        ]
+        # the values of each dictionary column as an Arrow array, in index order
+        self._values: List[Any] = [pa.array([], pa.string()) for _ in types]
+        self._schema = pa.schema(
+            [pa.field(name, kind) for name, kind in zip(names, self._types)]
+        )
+        if format == "parquet":
+            self._writer = pa.parquet.ParquetWriter(path, self._schema)
+        else:
+            self._writer = pa.ipc.new_file(
+                path,
+                self._schema,
+                options=pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True),
+            )
+
+    def write(self, rows: List[tuple]):
+        arrays = []
+        for column, (values, kind, dictionary) in enumerate(
+            zip(zip(*rows), self._types, self._dictionaries)
+        ):
+            if dictionary is None:
+                arrays.append(pa.array(values, kind))
+                continue
+            indices = []
+            added = []
+            for value in values:
+                if value is None:
+                    indices.append(None)
+                    continue
+                index = dictionary.get(value)
+                if index is None:
+                    index = dictionary[value] = len(dictionary)
+                    added.append(value)
+                indices.append(index)
+            if added:
+                self._values[column] = pa.concat_arrays(
+                    [self._values[column], pa.array(added, pa.string())]
+                )
+            arrays.append(
+                pa.DictionaryArray.from_arrays(
+                    pa.array(indices, pa.int32()), self._values[column]
+                )
+            )
+        batch = pa.record_batch(arrays, schema=self._schema)
+        self._writer.write_table(pa.Table.from_batches([batch]))
+
+    def close(self):
+        self._writer.close()
+
+
+def _arrow_type(kind: str):
+    if kind == "timestamp":
+        return pa.timestamp("s", tz="UTC")
+    if kind == "int":
+        return pa.int64()
+    if kind == "bool":
+        return pa.bool_()
+    if kind == "dictionary":
+        return pa.dictionary(pa.int32(), pa.string())
+    return pa.string()
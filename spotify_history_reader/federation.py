@@ -0,0 +1,206 @@
+import os
+import pickle
+import sys
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from spotify_history_reader.aggregate import Aggregate
+from spotify_history_reader.cache import HistoryCache
+from spotify_history_reader.core import Play
+from spotify_history_reader.filters import PlayFilter
+from spotify_history_reader.reader import SpotifyHistoryReader, read_source
+from spotify_history_reader.source import Source
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+class Federation:
+    """The exports of many users, aggregated in parallel.
+
+    Exports (directories, ZIP archives or single history files) are registered by user.
+    Every source of every user is a shard: a pool of worker processes streams each shard
+    into partial aggregates, which are merged per user and then over all users. Only the
+    partial aggregates travel back from the workers, so memory in the parent grows with
+    the number of aggregates in flight rather than the number of Plays, and adding users
+    spreads over more cores instead of lengthening one serial scan.
+
+    Aggregates are anything with the add(), merge() and result() of aggregate.Aggregate,
+    including those of the sketches module, and must pickle."""
+
+    def __init__(self, cache_directory: Optional[str] = None):
+        """Creates a federation. If a cache_directory is given, the Plays of every
+        source are cached there, as with SpotifyHistoryReader."""
+        self.cache_directory: Optional[str] = cache_directory
+        self.readers: Dict[str, SpotifyHistoryReader] = {}
+
+    def add_export(self, user: str, path: str):
+        """Adds an export of a user: a directory, ZIP archive or history file."""
+        reader = self.readers.get(user)
+        if reader is None:
+            reader = self.readers[user] = SpotifyHistoryReader(self.cache_directory)
+        full_path = os.path.expanduser(path)
+        if os.path.isdir(full_path):
+            reader.add_source_directory(full_path)
+        elif full_path.endswith(".zip"):
+            reader.add_source_zip(full_path)
+        else:
+            reader.add_source(full_path)
+
+    @property
+    def users(self) -> List[str]:
+        """Gets the users with exports, in the order they were added"""
+        return list(self.readers)
+
+    def aggregate_users(
+        self,
+        workers: Optional[int] = None,
+        max_tasks_per_child: Optional[int] = None,
+        max_worker_memory: Optional[int] = None,
+        strict=False,
+        play_filter: Optional[PlayFilter] = None,
+        **aggregates: Aggregate,
+    ) -> Iterator[Tuple[str, Dict[str, Aggregate]]]:
+        """Yields each user with the given aggregates computed over all of their Plays,
+        as soon as all of the user's sources have been aggregated. The aggregates passed
+        in are templates and are left empty.
+
+        workers defaults to the number of CPUs, and at most twice as many shards are in
+        flight at a time. To cap the memory of the workers, max_tasks_per_child replaces
+        each worker after that many shards (only on Python 3.11 and later), and
+        max_worker_memory limits the address space of each worker, in bytes, where the
+        resource module is available; a worker that exceeds it fails with a
+        MemoryError."""
+        if max_tasks_per_child is not None and sys.version_info < (3, 11):
+            raise ValueError("max_tasks_per_child needs Python 3.11 or later")
+        return self._aggregate_users(
+            workers,
+            max_tasks_per_child,
+            max_worker_memory,
+            strict,
+            play_filter,
+            aggregates,
+        )
+
+    def _aggregate_users(
+        self,
+        workers: Optional[int],
+        max_tasks_per_child: Optional[int],
+        max_worker_memory: Optional[int],
+        strict: bool,
+        play_filter: Optional[PlayFilter],
+        aggregates: Dict[str, Aggregate],
+    ) -> Iterator[Tuple[str, Dict[str, Aggregate]]]:
+        # a generator of its own, so that the options are checked when called
+        template = pickle.dumps(aggregates)
+        shards = [
+            (user, source)
+            for user, reader in self.readers.items()
+            for source in reader.sources
+        ]
+        # the largest shards go first, so that no worker is left with one at the end
+        shards.sort(key=lambda shard: shard[1].stat()[0], reverse=True)
+        remaining = {user: 0 for user in self.readers}
+        for user, _ in shards:
+            remaining[user] += 1
+        merged: Dict[str, Dict[str, Aggregate]] = {}
+        for user, count in remaining.items():
+            if count == 0:
+                yield user, pickle.loads(template)
+
+        pool_options: Dict[str, Any] = {"max_workers": workers}
+        if max_tasks_per_child is not None:
+            pool_options["max_tasks_per_child"] = max_tasks_per_child
+        if max_worker_memory is not None:
+            pool_options["initializer"] = _limit_memory
+            pool_options["initargs"] = (max_worker_memory,)
+        with ProcessPoolExecutor(**pool_options) as executor:
+            max_in_flight = 2 * (workers or os.cpu_count() or 1)
+            pending = iter(shards)
+            in_flight = set()
+            while True:
+                for user, source in pending:
+                    in_flight.add(
+                        executor.submit(
+                            _aggregate_shard,
+                            user,
+                            source,
+                            strict,
+                            self.readers[user].cache,
+                            play_filter,
+                            template,
+                        )
+                    )
+                    if len(in_flight) >= max_in_flight:
+                        break
+                if not in_flight:
+                    return
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    user, partial = future.result()
+                    if user in merged:
+                        for name, aggregate in merged[user].items():
+                            aggregate.merge(partial[name])
+                    else:
+                        merged[user] = partial
+                    remaining[user] -= 1
+                    if remaining[user] == 0:
+                        yield user, merged.pop(user)
+
+    def aggregate(
+        self,
+        workers: Optional[int] = None,
+        max_tasks_per_child: Optional[int] = None,
+        max_worker_memory: Optional[int] = None,
+        strict=False,
+        play_filter: Optional[PlayFilter] = None,
+        **aggregates: Aggregate,
+    ) -> Dict[str, Any]:
+        """Computes the given aggregates over the Plays of all users, as
+        aggregate.aggregate() does for a single stream of Plays; see aggregate_users()
+        for the other arguments."""
+        total: Optional[Dict[str, Aggregate]] = None
+        for _, partial in self.aggregate_users(
+            workers,
+            max_tasks_per_child,
+            max_worker_memory,
+            strict,
+            play_filter,
+            **aggregates,
+        ):
+            if total is None:
+                total = partial
+            else:
+                for name, aggregate in total.items():
+                    aggregate.merge(partial[name])
+        if total is None:
+            total = aggregates
+        return {name: aggregate.result() for name, aggregate in total.items()}
+
+
+def _aggregate_shard(
+    user: str,
+    source: Source,
+    strict: bool,
+    cache: Optional[HistoryCache],
+    play_filter: Optional[PlayFilter],
+    template: bytes,
+) -> Tuple[str, Dict[str, Aggregate]]:
+    aggregates: Dict[str, Aggregate] = pickle.loads(template)
+    adders = [aggregate.add for aggregate in aggregates.values()]
+    plays: Iterator[Play] = read_source(source, strict, True, cache, play_filter)
+    for play in plays:
+        for add in adders:
+            add(play)
+    return user, aggregates
+
+
+def _limit_memory(max_bytes: int):
+    if resource is not None:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        if hard != resource.RLIM_INFINITY:
+            max_bytes = min(max_bytes, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (max_bytes, hard))
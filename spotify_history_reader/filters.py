@@ -0,0 +1,143 @@
+import re
+
+from datetime import datetime, timezone
+from typing import Iterable, Optional
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.source import Source
+from spotify_history_reader.timestamps import parse_epoch
+
+_TS_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# e.g. Streaming_History_Audio_2021-2022_2.json or Streaming_History_Audio_2024_5.json
+_YEARS_IN_NAME = re.compile(r"_(\d{4})(?:-(\d{4}))?(?:_\d+)?\.json$")
+
+
+class PlayFilter:
+    """Declarative conditions on the Plays returned by SpotifyHistoryReader.read().
+
+    The conditions are checked against the raw entries of the history files, before any
+    Play is built, and sources whose file name shows they lie outside of the time range
+    are not read at all. All given conditions must hold:
+    * start, end: the play happened at or after start and before end (naive datetimes
+      are taken to be in UTC)
+    * songs_only, episodes_only: the play was a song, or a podcast episode
+    * exclude_incognito: the play did not happen in incognito mode
+    * min_ms_played: the play lasted at least this long
+    * artists, uris: the artist (or show), or the URI, of the play is one of these
+    """
+
+    def __init__(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        songs_only: bool = False,
+        episodes_only: bool = False,
+        exclude_incognito: bool = False,
+        min_ms_played: int = 0,
+        artists: Optional[Iterable[str]] = None,
+        uris: Optional[Iterable[str]] = None,
+    ):
+        if songs_only and episodes_only:
+            raise ValueError("songs_only and episodes_only are mutually exclusive")
+        self.start: Optional[datetime] = _utc(start)
+        self.end: Optional[datetime] = _utc(end)
+        self.songs_only: bool = songs_only
+        self.episodes_only: bool = episodes_only
+        self.exclude_incognito: bool = exclude_incognito
+        self.min_ms_played: int = min_ms_played
+        self.artists: Optional[frozenset] = (
+            frozenset(artists) if artists is not None else None
+        )
+        self.uris: Optional[frozenset] = frozenset(uris) if uris is not None else None
+
+        # the time range in seconds since the epoch, as compared to Play.epoch, and as
+        # timestamps in the layout of history files, which sort lexicographically
+        self._start = self.start.timestamp() if self.start else None
+        self._end = self.end.timestamp() if self.end else None
+        self._start_ts = self.start.strftime(_TS_FORMAT) if self.start else None
+        self._end_ts = self.end.strftime(_TS_FORMAT) if self.end else None
+
+    def matches(self, entry: dict) -> bool:
+        """Gets whether the raw entry of a history file satisfies the filter."""
+        if self._start is not None or self._end is not None:
+            ts = entry.get("ts")
+            if type(ts) is str and len(ts) == 20 and ts[19] == "Z":
+                if self._start_ts is not None and ts < self._start_ts:
+                    return False
+                if self._end_ts is not None and ts >= self._end_ts:
+                    return False
+            else:
+                # other layouts (offsets, fractions of a second) are compared as parsed
+                try:
+                    epoch = parse_epoch(ts)
+                except (TypeError, ValueError):
+                    # left for building the Play to reject
+                    return True
+                if self._start is not None and epoch < self._start:
+                    return False
+                if self._end is not None and epoch >= self._end:
+                    return False
+        if self.songs_only or self.episodes_only:
+            is_episode = bool(entry.get("spotify_episode_uri"))
+            if is_episode == self.songs_only:
+                return False
+        if self.exclude_incognito and entry.get("incognito_mode"):
+            return False
+        if self.min_ms_played and (entry.get("ms_played") or 0) < self.min_ms_played:
+            return False
+        if self.artists is not None:
+            artist = entry.get("master_metadata_album_artist_name") or entry.get(
+                "episode_show_name"
+            )
+            if artist not in self.artists:
+                return False
+        if self.uris is not None:
+            uri = entry.get("spotify_episode_uri") or entry.get("spotify_track_uri")
+            if uri not in self.uris:
+                return False
+        return True
+
+    def matches_play(self, play: Play) -> bool:
+        """Gets whether an already built Play satisfies the filter."""
+        if self._start is not None and play.epoch < self._start:
+            return False
+        if self._end is not None and play.epoch >= self._end:
+            return False
+        if self.songs_only and not play.is_song:
+            return False
+        if self.episodes_only and play.is_song:
+            return False
+        if self.exclude_incognito and play.connection.incognito_mode:
+            return False
+        if self.min_ms_played and play.playback.ms_played < self.min_ms_played:
+            return False
+        if self.artists is not None and play.artist not in self.artists:
+            return False
+        if self.uris is not None and play.id not in self.uris:
+            return False
+        return True
+
+    def includes_source(self, source: Source) -> bool:
+        """Gets whether the source may hold matching plays, judging by the years in its
+        file name. Sources without years in their name are always included."""
+        match = _YEARS_IN_NAME.search(source.name)
+        if match is None:
+            return True
+        first_year = int(match.group(1))
+        last_year = int(match.group(2) or first_year)
+        if self.start is not None and last_year < self.start.year:
+            return False
+        if self.end is not None and datetime(first_year, 1, 1, tzinfo=timezone.utc) >= (
+            self.end
+        ):
+            return False
+        return True
+
+
+def _utc(timestamp: Optional[datetime]) -> Optional[datetime]:
+    if timestamp is None:
+        return None
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
@@ -0,0 +1,308 @@
+import hashlib
+import json
+import logging
+import os
+import pickle
+import tempfile
+
+from array import array
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.source import Source
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INDEX_DIRECTORY = os.path.join(
+    os.path.expanduser("~"), ".cache", "spotify-history-reader", "index"
+)
+
+# the indexed fields, and the keys of the entries they are read from
+FIELDS: Dict[str, str] = {
+    "artist": "master_metadata_album_artist_name",
+    "album": "master_metadata_album_album_name",
+    "track": "spotify_track_uri",
+    "show": "episode_show_name",
+    "episode": "spotify_episode_uri",
+}
+
+# bump whenever the layout of the index files changes
+_VERSION = 2
+
+
+class _Postings:
+    """The entries holding each value of a field, as ascending entry numbers.
+
+    The lists of all values are packed into one array, value i holding the numbers from
+    starts[i] to starts[i + 1], so a source with many distinct tracks takes a few bytes
+    per entry rather than an object per value."""
+
+    def __init__(self, values: List[str], starts: array, numbers: array):
+        self.values: List[str] = values
+        self.starts: array = starts
+        self.numbers: array = numbers
+        self._positions: Dict[str, int] = {
+            value: position for position, value in enumerate(values)
+        }
+
+    @staticmethod
+    def pack(lists: Dict[str, List[int]]) -> "_Postings":
+        starts, numbers = array("I", [0]), array("I")
+        for entries in lists.values():
+            numbers.extend(entries)
+            starts.append(len(numbers))
+        return _Postings(list(lists), starts, numbers)
+
+    def __getstate__(self):
+        return self.values, self.starts, self.numbers
+
+    def __setstate__(self, state):
+        self.__init__(*state)
+
+    def get(self, value: str) -> array:
+        """Gets the numbers of the entries holding the value."""
+        position = self._positions.get(value)
+        if position is None:
+            return self.numbers[:0]
+        return self.numbers[self.starts[position] : self.starts[position + 1]]
+
+
+class _SourceIndex:
+    """The index of one source: the byte offset of every entry, the Postings of each
+    field, and the numbers of the entries no Play can be built from. Those are left out
+    of the Postings, so lookups and counts skip them as read() does."""
+
+    def __init__(self, offsets: array, postings: Dict[str, _Postings], rejected: array):
+        # offsets has one more item than there are entries: the end of the last entry
+        self.offsets: array = offsets
+        self.postings: Dict[str, _Postings] = postings
+        self.rejected: array = rejected
+
+    @staticmethod
+    def build(source: Source) -> "_SourceIndex":
+        with source.open_binary() as file:
+            content = file.read()
+        text = content.decode("utf-8")
+        ascii_only = len(text) == len(content)
+        decoder = json.JSONDecoder()
+        lists: Dict[str, Dict[str, List[int]]] = {field: {} for field in FIELDS}
+        track_keys = [(field, FIELDS[field]) for field in ("artist", "album", "track")]
+        episode_keys = [(field, FIELDS[field]) for field in ("show", "episode")]
+        offsets = array("Q")
+        rejected = array("I")
+
+        position = _skip(text, 0)
+        if text[position : position + 1] != "[":
+            raise ValueError("Expected the file to contain a JSON array")
+        position = _skip(text, position + 1)
+        byte_position, char_position = 0, 0
+        while text[position : position + 1] not in ("]", ""):
+            # character positions only match byte positions in ASCII text
+            if not ascii_only:
+                byte_position += len(text[char_position:position].encode("utf-8"))
+                char_position = position
+            offsets.append(position if ascii_only else byte_position)
+            entry, position = decoder.raw_decode(text, position)
+            number = len(offsets) - 1
+            # as with Plays, an entry is an episode if it has an episode URI
+            keys = ()
+            try:
+                Play.from_entry(entry)
+            except ValueError:
+                rejected.append(number)
+            else:
+                keys = episode_keys if entry.get("spotify_episode_uri") else track_keys
+            for field, key in keys:
+                value = entry.get(key)
+                if isinstance(value, str):
+                    entries = lists[field].get(value)
+                    if entries is None:
+                        entries = lists[field][value] = []
+                    entries.append(number)
+            position = _skip(text, position)
+            if text[position : position + 1] == ",":
+                position = _skip(text, position + 1)
+        if not ascii_only:
+            byte_position += len(text[char_position:position].encode("utf-8"))
+        offsets.append(position if ascii_only else byte_position)
+        postings = {field: _Postings.pack(lists[field]) for field in FIELDS}
+        if rejected:
+            logger.warning(
+                "Skipped %d invalid entries of %s, the first being entry %d",
+                len(rejected),
+                source,
+                rejected[0],
+            )
+        return _SourceIndex(offsets, postings, rejected)
+
+    def entries(self, field: str, values: Iterable[str]) -> List[int]:
+        """Gets the numbers of the entries holding any of the values, in order."""
+        postings = self.postings[field]
+        numbers = set()
+        for value in values:
+            numbers.update(postings.get(value))
+        return sorted(numbers)
+
+
+def _values(field: str, values: Union[str, Iterable[str]]) -> List[str]:
+    if field not in FIELDS:
+        raise ValueError(f"Unknown field {field}")
+    return [values] if isinstance(values, str) else list(values)
+
+
+def _skip(text: str, position: int) -> int:
+    while text[position : position + 1] in (" ", "\t", "\n", "\r"):
+        position += 1
+    return position
+
+
+class HistoryIndex:
+    """Persistent inverted indexes of history files, from the artists, albums, tracks,
+    shows and episodes played (see FIELDS) to the entries that played them.
+
+    Each source is indexed by the byte offset of every entry and, for every value of
+    every field, the numbers of the entries holding it, so a lookup decodes only the
+    matching entries instead of the whole history. Entries that no Play can be built
+    from (e.g. with an invalid timestamp) are left out, as read() skips them.
+
+    The index of a source is built on first use and stored in directory, next to its
+    fingerprint (size, modification time and content digest) as with the HistoryCache;
+    it is rebuilt when the source changes. The indexes are kept in a directory of their
+    own rather than alongside the sources, which may be read-only or inside a zip
+    archive."""
+
+    def __init__(self, directory: str = DEFAULT_INDEX_DIRECTORY):
+        self.directory: str = os.path.expanduser(directory)
+        self._loaded: Dict[str, _SourceIndex] = {}
+
+    def lookup(
+        self,
+        sources: Iterable[Source],
+        field: str,
+        values: Union[str, Iterable[str]],
+        strict=False,
+    ) -> Iterator[Play]:
+        """Yields the Plays of the sources whose field holds the value (or any of the
+        values), in the order read() would yield them. If strict, a source with invalid
+        entries raises a ValueError, as it does in read()."""
+        values = _values(field, values)
+        decoder = json.JSONDecoder()
+        for source in sources:
+            index = self.get(source)
+            if strict and index.rejected:
+                raise ValueError(f"Invalid entry {index.rejected[0]} of {source}")
+            numbers = index.entries(field, values)
+            if not numbers:
+                continue
+            offsets = index.offsets
+            with source.open_binary() as file:
+                for number in numbers:
+                    start = offsets[number]
+                    file.seek(start)
+                    text = file.read(offsets[number + 1] - start).decode("utf-8")
+                    entry, _ = decoder.raw_decode(text)
+                    yield Play.from_entry(entry)
+
+    def count(
+        self, sources: Iterable[Source], field: str, values: Union[str, Iterable[str]]
+    ) -> int:
+        """Gets the number of Plays whose field holds the value (or any of the values),
+        without reading any of them. Invalid entries are not counted, as lookup() skips
+        them."""
+        values = _values(field, values)
+        return sum(len(self.get(source).entries(field, values)) for source in sources)
+
+    def values(self, sources: Iterable[Source], field: str) -> List[str]:
+        """Gets the distinct values of a field, sorted."""
+        _values(field, ())
+        distinct = set()
+        for source in sources:
+            distinct.update(self.get(source).postings[field].values)
+        return sorted(distinct)
+
+    def get(self, source: Source) -> _SourceIndex:
+        """Gets the index of a source, building it if it is missing or stale."""
+        key = str(source)
+        index = self._loaded.get(key)
+        if index is not None and self._is_fresh(source):
+            return index
+        index = self._load(source)
+        if index is None:
+            index = self._store(source, _SourceIndex.build(source))
+        self._loaded[key] = index
+        return index
+
+    def clear(self):
+        """Removes all stored indexes."""
+        self._loaded.clear()
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith((".index", ".meta", ".partial")):
+                os.remove(os.path.join(self.directory, name))
+
+    def _paths(self, source: Source):
+        key = hashlib.sha1(str(source).encode("utf-8")).hexdigest()
+        base = os.path.join(self.directory, key)
+        return base + ".index", base + ".meta"
+
+    def _is_fresh(self, source: Source) -> bool:
+        _, metadata_path = self._paths(source)
+        try:
+            with open(metadata_path, "r", encoding="utf-8") as file:
+                metadata = json.load(file)
+        except (OSError, ValueError):
+            return False
+        if metadata.get("version") != _VERSION:
+            return False
+        size, mtime = source.stat()
+        if size != metadata["size"]:
+            return False
+        if mtime != metadata["mtime"]:
+            if source.digest() != metadata["digest"]:
+                return False
+            # unchanged content; remember the new time to skip the digest next time
+            metadata["mtime"] = mtime
+            self._write(metadata_path, json.dumps(metadata).encode("utf-8"))
+        return True
+
+    def _load(self, source: Source) -> Optional[_SourceIndex]:
+        index_path, _ = self._paths(source)
+        if not self._is_fresh(source):
+            return None
+        try:
+            with open(index_path, "rb") as file:
+                offsets, postings, rejected = pickle.load(file)
+        except (OSError, EOFError, ValueError, pickle.UnpicklingError):
+            return None
+        return _SourceIndex(offsets, postings, rejected)
+
+    def _store(self, source: Source, index: _SourceIndex) -> _SourceIndex:
+        index_path, metadata_path = self._paths(source)
+        size, mtime = source.stat()
+        metadata = {
+            "version": _VERSION,
+            "source": str(source),
+            "size": size,
+            "mtime": mtime,
+            "digest": source.digest(),
+        }
+        os.makedirs(self.directory, exist_ok=True)
+        # never leave metadata that describes a different index
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+        self._write(
+            index_path,
+            pickle.dumps(
+                (index.offsets, index.postings, index.rejected),
+                pickle.HIGHEST_PROTOCOL,
+            ),
+        )
+        self._write(metadata_path, json.dumps(metadata).encode("utf-8"))
+        return index
+
+    def _write(self, path: str, content: bytes):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".partial")
+        with open(fd, "wb") as file:
+            file.write(content)
+        os.replace(temp_path, path)
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from array import array
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Iterator, Optional
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.timestamps import to_datetime
+
+logger = logging.getLogger(__name__)
+
+# a line of JSON with the watermark, followed by the index
+_STATE_FILE = "ingest.state"
+
+
+class IncrementalIngestor:
+    """Ingests successive, overlapping exports, passing on only Plays not seen before.
+
+    Plays are identified by their timestamp, URI and ms_played. The ingestor remembers
+    the latest timestamp it has ingested (the watermark) and an index of the Plays from
+    the lookback period before it. Plays older than the lookback period are assumed to
+    have been ingested with an earlier export and are dropped without consulting the
+    index; plays that arrive more than lookback late (e.g. synced from an offline
+    device) are therefore lost.
+
+    The state is kept in one file in state_directory, and only replaced once a batch of
+    Plays has been ingested completely. If that file exists but cannot be read (e.g. it
+    was truncated), state_lost is set and the ingestor starts from an empty state, so
+    every Play is passed on again.
+
+    The ingestor only decides which Plays are new; callers keep their aggregates (e.g. a
+    RollupCube) up to date by adding the Plays it yields. They must check state_lost
+    first, and rebuild their aggregates from scratch if it is set."""
+
+    def __init__(self, state_directory: str, lookback: timedelta = timedelta(days=30)):
+        self.state_directory: str = os.path.expanduser(state_directory)
+        self.lookback: timedelta = lookback
+        self.watermark: Optional[datetime] = None
+        self.state_lost: bool = False
+        # maps the hash of each indexed Play to its timestamp in epoch seconds
+        self._index: Dict[int, int] = {}
+        self._load()
+
+    def ingest(self, plays: Iterable[Play]) -> Iterator[Play]:
+        """Yields the Plays that have not been ingested before, such as the output of
+        SpotifyHistoryReader.read() for a new export.
+
+        Aggregates built from earlier exports can be kept up to date by adding just the
+        yielded Plays to them, unless state_lost is set."""
+        horizon = (
+            int((self.watermark - self.lookback).timestamp())
+            if self.watermark is not None
+            else None
+        )
+        index = dict(self._index)
+        latest = int(self.watermark.timestamp()) if self.watermark is not None else None
+        for play in plays:
+            seconds = play.epoch
+            if horizon is not None and seconds < horizon:
+                continue
+            key = _key(seconds, play.id, play.playback.ms_played)
+            if key in index:
+                continue
+            index[key] = seconds
+            if latest is None or seconds > latest:
+                latest = seconds
+            yield play
+
+        self.watermark = to_datetime(latest) if latest is not None else None
+        self._index = index
+        self._save()
+
+    def _load(self):
+        try:
+            with open(os.path.join(self.state_directory, _STATE_FILE), "rb") as file:
+                content = file.read()
+        except FileNotFoundError:
+            return
+        except OSError:
+            self._lose_state()
+            return
+        header, _, packed = content.partition(b"\n")
+        try:
+            state = json.loads(header)
+            # stored as alternating hashes and timestamps
+            index = array("Q")
+            index.frombytes(packed)
+            if len(index) != 2 * state["plays"]:
+                raise ValueError("Truncated index")
+            watermark = state["watermark"]
+            if watermark is not None:
+                watermark = datetime.fromisoformat(watermark)
+        except (ValueError, KeyError, TypeError):
+            self._lose_state()
+            return
+        self.watermark = watermark
+        self._index = dict(zip(index[0::2], index[1::2]))
+
+    def _lose_state(self):
+        logger.warning("Ignoring unreadable ingest state in %s", self.state_directory)
+        self.state_lost = True
+
+    def _save(self):
+        os.makedirs(self.state_directory, exist_ok=True)
+        if self.watermark is not None:
+            # the index only needs to cover the lookback period from now on
+            horizon = int((self.watermark - self.lookback).timestamp())
+            self._index = {
+                key: seconds
+                for key, seconds in self._index.items()
+                if seconds >= horizon
+            }
+
+        index = array("Q")
+        for key, seconds in self._index.items():
+            index.append(key)
+            index.append(seconds)
+        state = {
+            "watermark": self.watermark.isoformat() if self.watermark else None,
+            "plays": len(self._index),
+        }
+        fd, temp_path = tempfile.mkstemp(dir=self.state_directory, suffix=".partial")
+        with open(fd, "wb") as file:
+            file.write(json.dumps(state).encode("utf-8") + b"\n")
+            file.write(index.tobytes())
+        os.replace(temp_path, os.path.join(self.state_directory, _STATE_FILE))
+
+
+def _key(seconds: int, uri: str, ms_played: int) -> int:
+    digest = hashlib.blake2b(f"{seconds}|{uri}|{ms_played}".encode(), digest_size=8)
+    return int.from_bytes(digest.digest(), "little")
@@ -0,0 +1,127 @@
+import time
+
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+STAGES = ("read", "decode", "filter", "build", "cache", "total")
+
+
+class SourceMetrics:
+    """What reading one source took.
+
+    entries counts the entries decoded from the source, of which filtered were skipped
+    by the PlayFilter and rejected were invalid; plays counts the Plays yielded. seconds
+    holds the time spent in each of STAGES:
+    * read: reading the file (with streaming, this is part of decode instead)
+    * decode: decoding the JSON
+    * filter: checking entries against the PlayFilter
+    * build: building Plays from the entries
+    * cache: loading the Plays from the history cache
+    * total: from opening the source until its last Play was yielded, including the time
+      spent by the consumer of the Plays in between
+    Timestamps are parsed lazily, on first use, so that time falls to the consumer."""
+
+    __slots__ = (
+        "source",
+        "bytes_read",
+        "entries",
+        "filtered",
+        "rejected",
+        "plays",
+        "cached",
+        "seconds",
+    )
+
+    def __init__(self, source: str):
+        self.source: str = source
+        self.bytes_read: int = 0
+        self.entries: int = 0
+        self.filtered: int = 0
+        self.rejected: int = 0
+        self.plays: int = 0
+        self.cached: bool = False
+        self.seconds: Dict[str, float] = dict.fromkeys(STAGES, 0.0)
+
+    def add(self, other: "SourceMetrics"):
+        """Adds the counts and times of other to these metrics."""
+        self.bytes_read += other.bytes_read
+        self.entries += other.entries
+        self.filtered += other.filtered
+        self.rejected += other.rejected
+        self.plays += other.plays
+        for stage, seconds in other.seconds.items():
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    def timed(self, stage: str, function: Callable) -> Callable:
+        """Wraps function to add the time spent in it to stage."""
+        seconds = self.seconds
+        clock = time.perf_counter
+
+        def timed_function(*args):
+            start = clock()
+            try:
+                return function(*args)
+            finally:
+                seconds[stage] += clock() - start
+
+        return timed_function
+
+    def timed_iter(self, stage: str, iterable: Iterable) -> Iterator:
+        """Iterates over iterable, adding the time spent getting each item to stage and
+        counting the items as entries."""
+        seconds = self.seconds
+        clock = time.perf_counter
+        iterator = iter(iterable)
+        while True:
+            start = clock()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                seconds[stage] += clock() - start
+                return
+            seconds[stage] += clock() - start
+            self.entries += 1
+            yield item
+
+    def __repr__(self):
+        stages = ", ".join(
+            f"{stage}={seconds:0.3f}s" for stage, seconds in self.seconds.items()
+        )
+        return (
+            f"SourceMetrics({self.source!r}, bytes_read={self.bytes_read}, "
+            f"entries={self.entries}, filtered={self.filtered}, "
+            f"rejected={self.rejected}, plays={self.plays}, cached={self.cached}, "
+            f"{stages})"
+        )
+
+
+class ReadMetrics:
+    """Collects the SourceMetrics of every source read by a SpotifyHistoryReader.
+
+    Each callback is called with the SourceMetrics of a source as soon as the source has
+    been read, e.g. to forward them to a monitoring system."""
+
+    def __init__(self, *callbacks: Callable[[SourceMetrics], None]):
+        self.sources: List[SourceMetrics] = []
+        self.callbacks: List[Callable[[SourceMetrics], None]] = list(callbacks)
+
+    def add_callback(self, callback: Callable[[SourceMetrics], None]):
+        """Registers a callback to call with the SourceMetrics of every source read."""
+        self.callbacks.append(callback)
+
+    def record(self, metrics: SourceMetrics):
+        """Adds the metrics of a source that has been read."""
+        self.sources.append(metrics)
+        for callback in self.callbacks:
+            callback(metrics)
+
+    def totals(self, source: Optional[str] = None) -> SourceMetrics:
+        """Gets the summed metrics of all sources, or of all reads of one source."""
+        totals = SourceMetrics(source or "total")
+        for metrics in self.sources:
+            if source is None or metrics.source == source:
+                totals.add(metrics)
+        return totals
+
+    def clear(self):
+        """Forgets the metrics recorded so far."""
+        self.sources.clear()
@@ -0,0 +1,131 @@
+import random
+import threading
+import time
+
+from typing import Any, Callable, Optional
+
+
+def is_throttled(error: Exception) -> bool:
+    """Gets whether an error reports HTTP 429, as spotipy's SpotifyException does."""
+    return getattr(error, "http_status", None) == 429
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Gets the Retry-After header of an error in seconds, if it has one."""
+    headers = getattr(error, "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class RateLimiter:
+    """A token bucket shared by all callers of a rate limited API.
+
+    Calls are spread out to at most rate per second (with bursts of up to burst calls).
+    When a call is throttled, every caller pauses for the Retry-After time the server
+    asked for, or else for a jittered exponential backoff, and the rate is halved (once
+    per pause, however many concurrent calls were throttled); each successful call then
+    raises it again by increase (a tenth of the initial rate by default), up to the
+    initial rate. A throttled call is retried up to max_retries times before its error
+    is raised.
+
+    The number of calls made, throttled, retried and failed are counted in the
+    attributes of the same name."""
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        burst: int = 10,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        increase: Optional[float] = None,
+        is_throttled: Callable[[Exception], bool] = is_throttled,
+        retry_after: Callable[[Exception], Optional[float]] = retry_after,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.max_rate: float = rate
+        self.rate: float = rate
+        self.burst: int = burst
+        self.max_retries: int = max_retries
+        self.base_delay: float = base_delay
+        self.max_delay: float = max_delay
+        self.increase: float = increase if increase is not None else rate / 10
+        self._is_throttled = is_throttled
+        self._retry_after = retry_after
+        self._clock = clock
+        self._sleep = sleep
+
+        self.calls: int = 0
+        self.throttled: int = 0
+        self.retried: int = 0
+        self.failed: int = 0
+
+        self._lock = threading.Lock()
+        self._tokens: float = burst
+        self._updated: float = clock()
+        self._paused_until: float = 0.0
+
+    def acquire(self):
+        """Blocks until a call may be made."""
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+                self._updated = now
+                wait = self._paused_until - now
+                if wait <= 0:
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        self.calls += 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+    def call(self, method: Callable[..., Any], *args, **kwargs) -> Any:
+        """Calls method with the given arguments once the rate allows, retrying it while
+        it is throttled."""
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = method(*args, **kwargs)
+            except Exception as error:
+                if not self._is_throttled(error):
+                    self._count("failed")
+                    raise
+                self._count("throttled")
+                if attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+                self._back_off(error, attempt)
+                self._count("retried")
+                attempt += 1
+                continue
+
+            with self._lock:
+                self.rate = min(self.max_rate, self.rate + self.increase)
+            return result
+
+    def _back_off(self, error: Exception, attempt: int):
+        delay = self._retry_after(error)
+        if delay is None:
+            # full jitter
+            delay = random.random() * min(
+                self.max_delay, self.base_delay * 2**attempt
+            )
+        with self._lock:
+            now = self._clock()
+            if now >= self._paused_until:
+                self.rate = max(self.max_rate / 64, self.rate / 2)
+            self._tokens = 0
+            self._paused_until = max(self._paused_until, now + delay)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
@@ -1,35 +1,69 @@
 import json
+import logging
 import os
+import time
 import zipfile
-import tempfile
 
-from typing import List, Iterator
-from spotify_history_reader.core import Play
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Iterable, List, Iterator, Optional, TextIO, Tuple, Union
+from spotify_history_reader.cache import HistoryCache
+from spotify_history_reader.core import Play, SymbolTable
+from spotify_history_reader.filters import PlayFilter
+from spotify_history_reader.index import HistoryIndex
+from spotify_history_reader.metrics import ReadMetrics, SourceMetrics
+from spotify_history_reader.sessions import DEFAULT_REORDER_WINDOW, merge_by_time
+from spotify_history_reader.source import Source
+from spotify_history_reader.streaming import iter_json_array
+from spotify_history_reader.table import PlayTable
+
+logger = logging.getLogger(__name__)
+
+# invalid entries logged in full per source; the rest are only counted
+MAX_LOGGED_ENTRIES = 10
 
 
 class SpotifyHistoryReader:
     """A class for managing the reading of Plays from a set of data files."""
 
-    def __init__(self):
-        self.sources: List[str] = []
-        self.temp_directories: List[str] = []
+    def __init__(
+        self,
+        cache_directory: Optional[str] = None,
+        metrics: Optional[ReadMetrics] = None,
+        index_directory: Optional[str] = None,
+    ):
+        """Creates a history reader.
+
+        If a cache_directory is given (see cache.DEFAULT_CACHE_DIRECTORY), the Plays
+        parsed from each source are cached there, and later reads of an unchanged source
+        load them from the cache instead of parsing the JSON again.
+
+        If metrics are given, the bytes, entries and time spent in each stage of reading
+        every source are recorded there (see metrics.SourceMetrics). Without them,
+        reading is not instrumented at all.
+
+        If an index_directory is given (see index.DEFAULT_INDEX_DIRECTORY), lookup()
+        finds the Plays of an artist, album, track, show or episode through persistent
+        indexes of the sources kept there."""
+        self.sources: List[Source] = []
+        self.cache: Optional[HistoryCache] = (
+            HistoryCache(cache_directory) if cache_directory is not None else None
+        )
+        self.metrics: Optional[ReadMetrics] = metrics
+        self.index: Optional[HistoryIndex] = (
+            HistoryIndex(index_directory) if index_directory is not None else None
+        )
 
     def __enter__(self):
         return self
 
     def __exit__(self, exc_type, exc_value, traceback):
-        for temp_dir in self.temp_directories:
-            for root, dirs, files in os.walk(temp_dir, topdown=False):
-                for name in files:
-                    os.remove(os.path.join(root, name))
-                for name in dirs:
-                    os.rmdir(os.path.join(root, name))
+        pass
 
     def add_source(self, source_path: str):
         """Adds the provided source_path to the history reader."""
         full_path = os.path.expanduser(source_path)
         if self._path_exists(full_path):
-            self.sources.append(full_path)
+            self.sources.append(Source(full_path))
 
     def add_source_directory(self, source_directory: str):
         """Adds all files in the provided source_directory to the history reader."""
@@ -42,32 +76,297 @@ class SpotifyHistoryReader:
                         self.add_source(os.path.join(root, file))
 
     def add_source_zip(self, source_zip_path: str):
-        """Adds all files in the provided source_zip_path to the history reader."""
+        """Adds all JSON files in the provided source_zip_path to the history reader.
+
+        The files are read straight from the archive; nothing is extracted to disk."""
         full_path = os.path.expanduser(source_zip_path)
         if self._path_exists(full_path):
             with zipfile.ZipFile(full_path, "r") as zip_ref:
-                temp_dir = tempfile.mkdtemp()
-                self.temp_directories.append(temp_dir)
-                for file in zip_ref.namelist():
-                    zip_ref.extract(file, temp_dir)
-            self.add_source_directory(temp_dir)
-
-    def read(self, strict=False) -> Iterator[Play]:
-        """Reads all the Plays in the provided source files."""
-        for source_path in self.sources:
-            with open(source_path, "r") as file:
-                for entry in json.load(file):
-                    try:
-                        yield Play(**entry)
-                    except ValueError:
-                        print("Encountered exception while handling entry:")
-                        print(entry)
-                        if strict:
-                            raise
-                        print("Will continue without the entry")
+                for member in zip_ref.namelist():
+                    if member.endswith(".json"):
+                        self.sources.append(Source(full_path, member))
+
+    def read(
+        self,
+        strict=False,
+        streaming=False,
+        play_filter: Optional[PlayFilter] = None,
+        share_values=False,
+    ) -> Iterator[Play]:
+        """Reads all the Plays in the provided source files.
+
+        With streaming enabled, each source is parsed incrementally and every Play is
+        yielded as soon as its entry has been decoded, keeping memory flat regardless of
+        file size.
+
+        Entries that do not match play_filter are skipped before a Play is built for
+        them, and sources outside of its time range are not read at all.
+
+        With share_values enabled, the Plays of one read share their repeated strings,
+        connections and Tracks (see core.SymbolTable). This cuts the memory taken by a
+        materialized history to around a third, at some cost in parsing speed. It is
+        ignored when streaming, as the table holds every distinct value of the read.
+        """
+        symbols = SymbolTable() if share_values and not streaming else None
+        for source in self.sources:
+            yield from read_source(
+                source,
+                strict,
+                streaming,
+                self.cache,
+                play_filter,
+                symbols,
+                self.metrics,
+            )
+
+    def read_by_time(
+        self,
+        strict=False,
+        play_filter: Optional[PlayFilter] = None,
+        reorder_window: int = DEFAULT_REORDER_WINDOW,
+    ) -> Iterator[Play]:
+        """Reads all the Plays in the provided source files in order of time.
+
+        The sources are streamed side by side and merged, rather than read whole and
+        sorted: each is expected to be in order of time but for Plays at most
+        reorder_window places out of place, so memory is bounded by reorder_window Plays
+        per source."""
+        return merge_by_time(
+            (
+                read_source(
+                    source, strict, True, self.cache, play_filter, None, self.metrics
+                )
+                for source in self.sources
+            ),
+            reorder_window,
+        )
+
+    def read_table(
+        self, strict=False, play_filter: Optional[PlayFilter] = None
+    ) -> PlayTable:
+        """Reads all the Plays in the provided source files into a PlayTable."""
+        return PlayTable.from_plays(self.read(strict, True, play_filter))
+
+    def read_parallel(
+        self,
+        workers: Optional[int] = None,
+        ordered=True,
+        strict=False,
+        play_filter: Optional[PlayFilter] = None,
+        share_values=False,
+    ) -> Iterator[Play]:
+        """Reads all the Plays in the provided source files in a pool of processes.
+
+        Each source file is parsed by its own worker. When ordered is True, Plays are
+        yielded in the same order as read() would yield them; otherwise the Plays of
+        each source are yielded as soon as its worker finishes. workers defaults to the
+        number of CPUs.
+
+        With share_values enabled, the Plays of each source share their repeated strings
+        as in read(), though not with the Plays of other sources.
+        """
+        instrumented = self.metrics is not None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            if ordered:
+                results = executor.map(
+                    _read_source_plays,
+                    self.sources,
+                    [strict] * len(self.sources),
+                    [self.cache] * len(self.sources),
+                    [play_filter] * len(self.sources),
+                    [instrumented] * len(self.sources),
+                    [share_values] * len(self.sources),
+                )
+            else:
+                futures = [
+                    executor.submit(
+                        _read_source_plays,
+                        source,
+                        strict,
+                        self.cache,
+                        play_filter,
+                        instrumented,
+                        share_values,
+                    )
+                    for source in self.sources
+                ]
+                results = (future.result() for future in as_completed(futures))
+            for plays, source_metrics in results:
+                if source_metrics is not None:
+                    self.metrics.record(source_metrics)
+                yield from plays
+
+    def lookup(
+        self, field: str, values: Union[str, Iterable[str]], strict=False
+    ) -> Iterator[Play]:
+        """Reads the Plays whose field (see index.FIELDS) holds the value, or any of the
+        values, decoding only the matching entries of each source. The index of a source
+        is built on first use, and rebuilt when the source changes. Invalid entries are
+        skipped, or raise a ValueError if strict, as in read()."""
+        if self.index is None:
+            raise ValueError("Looking up Plays needs an index_directory")
+        return self.index.lookup(self.sources, field, values, strict)
+
+    def clear_cache(self):
+        """Removes all Plays cached in the cache directory, if there is one."""
+        if self.cache is not None:
+            self.cache.clear()
 
     def _path_exists(self, path: str) -> bool:
         if not os.path.exists(path):
-            print(f"Path {path} was not found")
+            logger.warning("Path %s was not found", path)
             return False
         return True
+
+
+def read_source(
+    source: Source,
+    strict=False,
+    streaming=False,
+    cache: Optional[HistoryCache] = None,
+    play_filter: Optional[PlayFilter] = None,
+    symbols: Optional[SymbolTable] = None,
+    metrics: Optional[ReadMetrics] = None,
+) -> Iterator[Play]:
+    """Reads the Plays of a single source, as SpotifyHistoryReader.read() does for each
+    of its sources, e.g. in a worker process that was handed one source."""
+    if play_filter is not None and not play_filter.includes_source(source):
+        return
+    if metrics is None:
+        yield from _source_plays(source, strict, streaming, cache, play_filter, symbols)
+        return
+
+    source_metrics = SourceMetrics(source.name)
+    start = time.perf_counter()
+    try:
+        for play in _source_plays(
+            source, strict, streaming, cache, play_filter, symbols, source_metrics
+        ):
+            source_metrics.plays += 1
+            yield play
+    finally:
+        source_metrics.seconds["total"] = time.perf_counter() - start
+        metrics.record(source_metrics)
+
+
+def _source_plays(
+    source: Source,
+    strict: bool,
+    streaming: bool,
+    cache: Optional[HistoryCache],
+    play_filter: Optional[PlayFilter],
+    symbols: Optional[SymbolTable],
+    metrics: Optional[SourceMetrics] = None,
+) -> Iterator[Play]:
+    if cache is None:
+        yield from _parse_source(
+            source, strict, streaming, play_filter, symbols, metrics
+        )
+        return
+
+    load = cache.load if metrics is None else metrics.timed("cache", cache.load)
+    # load only checks the cache; the Plays are read as they are iterated
+    plays = load(source)
+    if plays is None:
+        # the cache holds every play of a source, so the filter only applies afterwards
+        plays = cache.store(
+            source, _parse_source(source, strict, streaming, None, symbols, metrics)
+        )
+    else:
+        if metrics is not None:
+            metrics.cached = True
+            plays = metrics.timed_iter("cache", plays)
+        if symbols is not None:
+            plays = map(symbols.share, plays)
+    if play_filter is not None:
+        plays = filter(play_filter.matches_play, plays)
+    yield from plays
+
+
+def _parse_source(
+    source: Source,
+    strict: bool,
+    streaming: bool,
+    play_filter: Optional[PlayFilter] = None,
+    symbols: Optional[SymbolTable] = None,
+    metrics: Optional[SourceMetrics] = None,
+) -> Iterator[Play]:
+    rejected = 0
+    with source.open() as file:
+        build = Play.from_entry
+        matches = play_filter.matches if play_filter is not None else None
+        if metrics is None:
+            entries = iter_json_array(file) if streaming else json.load(file)
+        else:
+            entries = _instrumented_entries(file, streaming, metrics)
+            build = metrics.timed("build", build)
+            if matches is not None:
+                matches = _counted_filter(metrics.timed("filter", matches), metrics)
+
+        # numbered before filtering, so that logged numbers are positions in the source
+        for index, entry in enumerate(entries):
+            if matches is not None and not matches(entry):
+                continue
+            try:
+                yield build(entry, symbols)
+            except ValueError:
+                if strict:
+                    raise
+                rejected += 1
+                if rejected <= MAX_LOGGED_ENTRIES:
+                    logger.warning(
+                        "Skipping invalid entry %d of %s: %.500r", index, source, entry
+                    )
+        if metrics is not None:
+            metrics.rejected = rejected
+            metrics.bytes_read = _bytes_read(file)
+    if rejected > MAX_LOGGED_ENTRIES:
+        logger.warning(
+            "Skipped %d invalid entries of %s (%d not logged)",
+            rejected,
+            source,
+            rejected - MAX_LOGGED_ENTRIES,
+        )
+
+
+def _instrumented_entries(file: TextIO, streaming: bool, metrics: SourceMetrics):
+    if streaming:
+        return metrics.timed_iter("decode", iter_json_array(file))
+    text = metrics.timed("read", file.read)()
+    entries = metrics.timed("decode", json.loads)(text)
+    metrics.entries = len(entries)
+    return entries
+
+
+def _counted_filter(matches, metrics: SourceMetrics):
+    def counted_matches(entry: dict) -> bool:
+        if matches(entry):
+            return True
+        metrics.filtered += 1
+        return False
+
+    return counted_matches
+
+
+def _bytes_read(file: TextIO) -> int:
+    try:
+        return file.buffer.tell()
+    except (AttributeError, OSError, ValueError):
+        return 0
+
+
+def _read_source_plays(
+    source: Source,
+    strict: bool,
+    cache: Optional[HistoryCache],
+    play_filter: Optional[PlayFilter],
+    instrumented: bool = False,
+    share_values: bool = False,
+) -> Tuple[List[Play], Optional[SourceMetrics]]:
+    metrics = ReadMetrics() if instrumented else None
+    # pickling the list keeps the values shared within it
+    symbols = SymbolTable() if share_values else None
+    plays = list(
+        read_source(source, strict, False, cache, play_filter, symbols, metrics)
+    )
+    return plays, metrics.sources[0] if metrics and metrics.sources else None
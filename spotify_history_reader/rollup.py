@@ -0,0 +1,219 @@
+import os
+import sqlite3
+
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.timestamps import fields
+
+# grains slice the ISO timestamp of a play, e.g. 2020-01-02T08 for its hour
+GRAINS: Dict[str, int] = {"year": 4, "month": 7, "day": 10, "hour": 13}
+
+DIMENSIONS: Dict[str, Callable[[Play], Optional[str]]] = {
+    "all": lambda play: "",
+    "artist": lambda play: play.artist if play.is_song else None,
+    "track": lambda play: play.id if play.is_song else None,
+    "show": lambda play: play.artist if not play.is_song else None,
+    "platform": lambda play: play.connection.platform,
+    "country": lambda play: play.connection.country,
+}
+
+MEASURES = ("ms_played", "plays", "skips")
+
+# the grains each dimension is rolled up by; hours by artist or track would take close
+# to a row per play
+DEFAULT_ROLLUPS: Dict[str, Tuple[str, ...]] = {
+    "all": ("year", "month", "day", "hour"),
+    "artist": ("year", "month", "day"),
+    "track": ("year", "month"),
+    "show": ("year", "month", "day"),
+    "platform": ("year", "month", "day", "hour"),
+    "country": ("year", "month", "day", "hour"),
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS rollup (
+    grain TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    key TEXT NOT NULL,
+    ms_played INTEGER NOT NULL,
+    plays INTEGER NOT NULL,
+    skips INTEGER NOT NULL,
+    PRIMARY KEY (grain, dimension, bucket, key)
+) WITHOUT ROWID;
+"""
+
+_UPSERT = """
+INSERT INTO rollup (grain, dimension, bucket, key, ms_played, plays, skips)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (grain, dimension, bucket, key) DO UPDATE SET
+    ms_played = ms_played + excluded.ms_played,
+    plays = plays + excluded.plays,
+    skips = skips + excluded.skips
+"""
+
+
+class RollupCube:
+    """Pre-aggregated totals of Plays, stored in SQLite, to answer group-bys over the
+    whole history without reading it again.
+
+    rollups maps each dimension (see DIMENSIONS) to the grains (see GRAINS) it is rolled
+    up by. For every time bucket of those grains and every key of the dimension, the
+    cube holds the summed ms_played and the number of plays and skips. The "all"
+    dimension has a single key, "", holding the totals of each bucket.
+
+    Rows are only added or summed into, so the cube is kept up to date by passing it the
+    new Plays of each export, e.g. from an IncrementalIngestor; Plays passed twice are
+    counted twice."""
+
+    def __init__(self, path: str, rollups: Dict[str, Sequence[str]] = DEFAULT_ROLLUPS):
+        self.path: str = os.path.expanduser(path)
+        self.rollups: Dict[str, Tuple[str, ...]] = {
+            dimension: tuple(grains) for dimension, grains in rollups.items()
+        }
+        for dimension, grains in self.rollups.items():
+            if dimension not in DIMENSIONS:
+                raise ValueError(f"Unknown dimension {dimension}")
+            for grain in grains:
+                if grain not in GRAINS:
+                    raise ValueError(f"Unknown grain {grain}")
+
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(self.path)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def update(self, plays: Iterable[Play], batch_size: int = 100000) -> int:
+        """Adds the Plays to the cube, and gets how many were added.
+
+        Totals are summed by hour in memory, and rolled up into every grain and written
+        once batch_size hours and keys are held, and at the end, each batch in one
+        transaction."""
+        keys = [(dimension, DIMENSIONS[dimension]) for dimension in self.rollups]
+        totals: Dict[Tuple[str, str, str], List[int]] = {}
+        count = 0
+        for play in plays:
+            count += 1
+            playback = play.playback
+            hour = fields(play.epoch)[5]
+            ms_played = playback.ms_played or 0
+            skipped = 1 if playback.skipped else 0
+            for dimension, key_of in keys:
+                key = key_of(play)
+                if key is None:
+                    continue
+                row = (hour, dimension, key)
+                total = totals.get(row)
+                if total is None:
+                    totals[row] = [ms_played, 1, skipped]
+                else:
+                    total[0] += ms_played
+                    total[1] += 1
+                    total[2] += skipped
+            if len(totals) >= batch_size:
+                self._write(totals)
+                totals = {}
+        self._write(totals)
+        return count
+
+    def totals(
+        self,
+        dimension: str = "all",
+        grain: str = "year",
+        measure: str = "ms_played",
+        key: Optional[str] = None,
+    ) -> Dict[Any, int]:
+        """Gets the measure of every bucket of a grain, by (bucket, key), or by bucket
+        alone for the "all" dimension or a single key."""
+        _check_measure(measure)
+        query = (
+            f"SELECT bucket, key, {measure} FROM rollup "
+            "WHERE grain = ? AND dimension = ?"
+        )
+        parameters: Tuple[str, ...] = (grain, dimension)
+        if key is not None:
+            query += " AND key = ?"
+            parameters += (key,)
+        rows = self._connection.execute(query, parameters)
+        if dimension == "all" or key is not None:
+            return {bucket: value for bucket, _, value in rows}
+        return {(bucket, key): value for bucket, key, value in rows}
+
+    def top(
+        self,
+        dimension: str,
+        grain: str = "year",
+        n: int = 10,
+        measure: str = "ms_played",
+    ) -> Dict[str, List[Tuple[str, int]]]:
+        """Gets the top n keys of a dimension by measure in every bucket of a grain, as
+        (key, value) pairs in descending order."""
+        _check_measure(measure)
+        rows = self._connection.execute(
+            f"""SELECT bucket, key, value FROM (
+                SELECT bucket, key, {measure} AS value, ROW_NUMBER() OVER (
+                    PARTITION BY bucket ORDER BY {measure} DESC, key
+                ) AS rank
+                FROM rollup WHERE grain = ? AND dimension = ?
+            ) WHERE rank <= ? ORDER BY bucket, rank""",
+            (grain, dimension, n),
+        )
+        top: Dict[str, List[Tuple[str, int]]] = {}
+        for bucket, key, value in rows:
+            top.setdefault(bucket, []).append((key, value))
+        return top
+
+    def by_hour_of_week(self, measure: str = "ms_played") -> Dict[Tuple[int, int], int]:
+        """Gets the measure summed by (weekday, hour), Monday being weekday 0."""
+        _check_measure(measure)
+        rows = self._connection.execute(
+            f"""SELECT
+                (CAST(strftime('%w', substr(bucket, 1, 10)) AS INTEGER) + 6) % 7,
+                CAST(substr(bucket, 12, 2) AS INTEGER),
+                SUM({measure})
+            FROM rollup WHERE grain = 'hour' AND dimension = 'all'
+            GROUP BY 1, 2"""
+        )
+        return {(weekday, hour): value for weekday, hour, value in rows}
+
+    def clear(self):
+        """Removes all totals from the cube."""
+        with self._connection:
+            self._connection.execute("DELETE FROM rollup")
+
+    def close(self):
+        """Closes the database of the cube."""
+        self._connection.close()
+
+    def _write(self, totals: Dict[Tuple[str, str, str], List[int]]):
+        rows: Dict[Tuple[str, str, str, str], List[int]] = {}
+        for (hour, dimension, key), (ms_played, plays, skips) in totals.items():
+            for grain in self.rollups[dimension]:
+                row = (grain, dimension, hour[: GRAINS[grain]], key)
+                total = rows.get(row)
+                if total is None:
+                    rows[row] = [ms_played, plays, skips]
+                else:
+                    total[0] += ms_played
+                    total[1] += plays
+                    total[2] += skips
+        with self._connection:
+            self._connection.executemany(
+                _UPSERT, (row + tuple(total) for row, total in rows.items())
+            )
+
+
+def _check_measure(measure: str):
+    # measures are spliced into the SQL, so only the known ones may pass
+    if measure not in MEASURES:
+        raise ValueError(f"Unknown measure {measure}")
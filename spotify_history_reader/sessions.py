@@ -0,0 +1,117 @@
+import heapq
+
+from collections import Counter
+from datetime import datetime, timedelta
+from itertools import count
+from operator import attrgetter
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from spotify_history_reader.core import Play
+
+DEFAULT_GAP = timedelta(minutes=30)
+DEFAULT_REORDER_WINDOW = 1000
+
+_timestamp = attrgetter("timestamp")
+
+
+def reorder(plays: Iterable[Play], window: int = DEFAULT_REORDER_WINDOW):
+    """Sorts a stream of Plays that is almost in order of time, such as a history file,
+    holding at most window Plays at a time. A Play that is more than window places
+    ahead of where it belongs is yielded out of order."""
+    heap = []
+    sequence = count()
+    for play in plays:
+        entry = (play.timestamp, next(sequence), play)
+        if len(heap) < window:
+            heapq.heappush(heap, entry)
+        else:
+            yield heapq.heappushpop(heap, entry)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def merge_by_time(
+    streams: Iterable[Iterable[Play]], window: int = DEFAULT_REORDER_WINDOW
+) -> Iterator[Play]:
+    """Merges streams of Plays that are each almost in order of time (see reorder) into
+    a single stream in order of time, without sorting them as a whole."""
+    return heapq.merge(*(reorder(stream, window) for stream in streams), key=_timestamp)
+
+
+class Session:
+    """A listening session: consecutive Plays with short gaps between them.
+
+    The timestamp of a Play marks when it stopped playing, so the session starts when
+    its first Play started, ms_played before that Play's timestamp."""
+
+    __slots__ = ("plays",)
+
+    def __init__(self, plays: List[Play]):
+        self.plays: List[Play] = plays
+
+    @property
+    def start(self) -> datetime:
+        """Gets the time the first Play of the session started"""
+        first = self.plays[0]
+        return first.timestamp - timedelta(milliseconds=first.playback.ms_played)
+
+    @property
+    def end(self) -> datetime:
+        """Gets the time the last Play of the session stopped"""
+        return self.plays[-1].timestamp
+
+    @property
+    def duration(self) -> timedelta:
+        """Gets the time from the start to the end of the session"""
+        return self.end - self.start
+
+    @property
+    def ms_played(self) -> int:
+        """Gets the time spent playing during the session"""
+        return sum(play.playback.ms_played for play in self.plays)
+
+    @property
+    def tracks(self) -> int:
+        """Gets the number of Plays in the session"""
+        return len(self.plays)
+
+    @property
+    def skip_rate(self) -> float:
+        """Gets the share of the Plays of the session that were skipped"""
+        return sum(1 for play in self.plays if play.playback.skipped) / len(self.plays)
+
+    @property
+    def transitions(self) -> Dict[Tuple[Optional[str], Optional[str]], int]:
+        """Gets how often each (reason_end, reason_start) pair occurred between
+        consecutive Plays of the session"""
+        return Counter(
+            (previous.playback.reason_end, play.playback.reason_start)
+            for previous, play in zip(self.plays, self.plays[1:])
+        )
+
+    def __repr__(self):
+        return (
+            f"Session({self.start.isoformat()}, {self.tracks} plays, {self.duration})"
+        )
+
+
+def sessionize(
+    plays: Iterable[Play], gap: timedelta = DEFAULT_GAP
+) -> Iterator[Session]:
+    """Splits a stream of Plays in order of time (see merge_by_time and
+    SpotifyHistoryReader.read_by_time()) into Sessions, wherever more than gap passes
+    between the end of one Play and the start of the next. Only the Plays of the current
+    session are held in memory."""
+    current: List[Play] = []
+    end: Optional[datetime] = None
+    for play in plays:
+        timestamp = play.timestamp
+        start = timestamp - timedelta(milliseconds=play.playback.ms_played)
+        if current and start - end > gap:
+            yield Session(current)
+            current = []
+        current.append(play)
+        if len(current) == 1 or timestamp > end:
+            end = timestamp
+    if current:
+        yield Session(current)
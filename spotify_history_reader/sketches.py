@@ -0,0 +1,435 @@
+import hashlib
+import heapq
+import math
+
+from array import array
+from operator import itemgetter
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from spotify_history_reader.aggregate import KEYS, MEASURES
+from spotify_history_reader.core import Play
+
+
+def stable_hash(key: Any) -> int:
+    """Gets a 64 bit hash of the string form of key that, unlike hash(), is the same in
+    every process, so that sketches built in different processes can be merged."""
+    digest = hashlib.blake2b(str(key).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class CountMinSketch:
+    """Estimates the total count of every key in width * depth counters.
+
+    An estimate is never below the true count, and exceeds it by at most
+    e / width * total with probability 1 - exp(-depth)."""
+
+    def __init__(self, width: int = 2048, depth: int = 5):
+        self.width: int = width
+        self.depth: int = depth
+        self.total: int = 0
+        self._counters = array("q", bytes(8 * width * depth))
+
+    @classmethod
+    def from_error(cls, epsilon: float, delta: float) -> "CountMinSketch":
+        """Creates a sketch whose estimates exceed the true counts by at most
+        epsilon * total with probability 1 - delta."""
+        return cls(math.ceil(math.e / epsilon), math.ceil(math.log(1 / delta)))
+
+    @property
+    def error(self) -> float:
+        """Gets the bound on the overestimate of any count, as explained above"""
+        return math.e / self.width * self.total
+
+    def add(self, key: Any, count: int = 1):
+        """Adds count to the count of key."""
+        self.total += count
+        counters = self._counters
+        width = self.width
+        first, second = self._hashes(key)
+        for row in range(self.depth):
+            counters[row * width + (first + row * second) % width] += count
+
+    def estimate(self, key: Any) -> int:
+        """Gets the estimated count of key."""
+        counters = self._counters
+        width = self.width
+        first, second = self._hashes(key)
+        return min(
+            counters[row * width + (first + row * second) % width]
+            for row in range(self.depth)
+        )
+
+    def merge(self, other: "CountMinSketch"):
+        """Adds the counts of another sketch of the same size to this one."""
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Only sketches of the same size can merge")
+        self.total += other.total
+        counters = self._counters
+        for index, count in enumerate(other._counters):
+            counters[index] += count
+
+    @staticmethod
+    def _hashes(key: Any) -> Tuple[int, int]:
+        # one hash split in two, combined into a hash per row (Kirsch and Mitzenmacher)
+        hashed = stable_hash(key)
+        return hashed & 0xFFFFFFFF, hashed >> 32
+
+
+class SpaceSaving:
+    """Finds the heaviest keys of a stream while counting at most capacity keys.
+
+    When a new key arrives with all counters taken, it replaces the lightest key and
+    inherits its count as error. Any key heavier than total / capacity is kept, and the
+    count of a kept key exceeds its true count by at most its error."""
+
+    def __init__(self, capacity: int = 1000):
+        self.capacity: int = capacity
+        self.total: int = 0
+        # key: [count, error]
+        self.counters: Dict[Any, List[int]] = {}
+        # (count, sequence, key) of the kept keys; counts only grow, so an entry whose
+        # count is stale is pushed back with its current count when it reaches the top
+        self._heap: List[Tuple[int, int, Any]] = []
+        self._sequence: int = 0
+
+    def add(self, key: Any, count: int = 1):
+        """Adds count to the count of key."""
+        self.total += count
+        counter = self.counters.get(key)
+        if counter is not None:
+            counter[0] += count
+        elif len(self.counters) < self.capacity:
+            self.counters[key] = [count, 0]
+            self._push(count, key)
+        else:
+            floor = self.counters.pop(self._pop_lightest())[0]
+            self.counters[key] = [floor + count, floor]
+            self._push(floor + count, key)
+
+    def _push(self, count: int, key: Any):
+        self._sequence += 1
+        heapq.heappush(self._heap, (count, self._sequence, key))
+
+    def _pop_lightest(self) -> Any:
+        heap, counters = self._heap, self.counters
+        while True:
+            count, sequence, key = heap[0]
+            current = counters[key][0]
+            if current == count:
+                heapq.heappop(heap)
+                return key
+            heapq.heapreplace(heap, (current, sequence, key))
+
+    def top(self, n: int) -> List[Tuple[Any, int]]:
+        """Gets the n heaviest keys as (key, count) pairs in descending order."""
+        ranked = sorted(self.counters.items(), key=lambda item: -item[1][0])
+        return [(key, count) for key, (count, _) in ranked[:n]]
+
+    def error(self, key: Any) -> int:
+        """Gets how much the count of key may be overestimated."""
+        counter = self.counters.get(key)
+        return counter[1] if counter is not None else self.min_count()
+
+    def min_count(self) -> int:
+        """Gets the count of the lightest key kept, which bounds the count of any key
+        that is not kept."""
+        if len(self.counters) < self.capacity:
+            return 0
+        return min(count for count, _ in self.counters.values())
+
+    def merge(self, other: "SpaceSaving"):
+        """Adds the counts of another summary to this one, keeping the capacity heaviest
+        keys (Agarwal et al., Mergeable Summaries)."""
+        merged: Dict[Any, List[int]] = {}
+        floor, other_floor = self.min_count(), other.min_count()
+        for key in self.counters.keys() | other.counters.keys():
+            count, error = self.counters.get(key, (floor, floor))
+            other_count, other_error = other.counters.get(
+                key, (other_floor, other_floor)
+            )
+            merged[key] = [count + other_count, error + other_error]
+        ranked = sorted(merged.items(), key=lambda item: -item[1][0])
+        self.counters = dict(ranked[: self.capacity])
+        self.total += other.total
+        self._heap = []
+        for key, (count, _) in self.counters.items():
+            self._push(count, key)
+
+
+class HyperLogLog:
+    """Estimates the number of distinct keys in 2 ** precision one byte registers, with
+    a standard error of 1.04 / sqrt(2 ** precision) (1.6% at the default precision)."""
+
+    def __init__(self, precision: int = 12):
+        if not 4 <= precision <= 18:
+            raise ValueError("precision must be between 4 and 18")
+        self.precision: int = precision
+        self.registers = bytearray(1 << precision)
+
+    @property
+    def error(self) -> float:
+        """Gets the standard error of the estimate, relative to the true count"""
+        return 1.04 / math.sqrt(len(self.registers))
+
+    def add(self, key: Any):
+        """Adds a key."""
+        hashed = stable_hash(key)
+        precision = self.precision
+        index = hashed >> (64 - precision)
+        rest = (hashed << precision) & 0xFFFFFFFFFFFFFFFF
+        rank = 64 - precision + 1 if rest == 0 else 64 - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self) -> int:
+        """Gets the estimated number of distinct keys added."""
+        registers = self.registers
+        m = len(registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0**-register for register in registers)
+        zeros = registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # linear counting is more accurate while few registers are set
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+
+    def merge(self, other: "HyperLogLog"):
+        """Adds the keys of another sketch of the same precision to this one."""
+        if other.precision != self.precision:
+            raise ValueError("Only sketches of the same precision can merge")
+        self.registers = bytearray(map(max, self.registers, other.registers))
+
+
+class TDigest:
+    """Estimates quantiles of a stream of numbers in about compression centroids, most
+    accurately towards the extremes (Dunning's merging t-digest)."""
+
+    def __init__(self, compression: int = 100):
+        self.compression: int = compression
+        self.count: float = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        # (mean, weight) pairs in order of mean
+        self._centroids: List[Tuple[float, float]] = []
+        self._buffer: List[Tuple[float, float]] = []
+
+    def add(self, value: float, weight: float = 1):
+        """Adds a value."""
+        self._buffer.append((value, weight))
+        self.count += weight
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+        if len(self._buffer) >= 5 * self.compression:
+            self._compress()
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Gets the estimated value below which a share q of the values lie."""
+        self._compress()
+        centroids = self._centroids
+        if not centroids:
+            return None
+        if len(centroids) == 1:
+            return centroids[0][0]
+        target = q * self.count
+        # each centroid is centered on the middle of its weight
+        cumulative = 0.0
+        previous_mean, previous_center = self.min, 0.0
+        for mean, weight in centroids:
+            center = cumulative + weight / 2
+            if target < center:
+                span = center - previous_center
+                share = (target - previous_center) / span if span else 0.0
+                return previous_mean + share * (mean - previous_mean)
+            cumulative += weight
+            previous_mean, previous_center = mean, center
+        span = self.count - previous_center
+        share = (target - previous_center) / span if span else 1.0
+        return previous_mean + min(share, 1.0) * (self.max - previous_mean)
+
+    def merge(self, other: "TDigest"):
+        """Adds the values of another digest to this one."""
+        other._compress()
+        self._buffer.extend(other._centroids)
+        self.count += other.count
+        for value in (other.min, other.max):
+            if value is not None:
+                self.min = value if self.min is None else min(self.min, value)
+                self.max = value if self.max is None else max(self.max, value)
+        self._compress()
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self._centroids + self._buffer)
+        self._buffer = []
+        total = sum(weight for _, weight in points)
+        merged: List[Tuple[float, float]] = []
+        cumulative = 0.0
+        mean, weight = points[0]
+        for next_mean, next_weight in points[1:]:
+            q = (cumulative + weight + next_weight) / total
+            # centroids may only grow large where q(1 - q) is, i.e. away from the tails
+            if weight + next_weight <= 4 * total * q * (1 - q) / self.compression:
+                weight += next_weight
+                mean += (next_mean - mean) * next_weight / weight
+            else:
+                merged.append((mean, weight))
+                cumulative += weight
+                mean, weight = next_mean, next_weight
+        merged.append((mean, weight))
+        self._centroids = merged
+
+
+class ApproximateTop:
+    """Like Aggregate(by, measure, top=n), in fixed memory: finds the top n groups with
+    a SpaceSaving summary of capacity groups, and estimates the value of any group with
+    a CountMinSketch (see estimate()). Every group worth more than 1 / capacity of the
+    total is found; among groups of similar value, as when no group stands out, the
+    ranking is approximate."""
+
+    def __init__(
+        self,
+        by: Union[str, Sequence[str]],
+        measure: str = "ms_played",
+        n: int = 10,
+        capacity: int = 1000,
+        width: int = 2048,
+        depth: int = 5,
+    ):
+        self.by: Tuple[str, ...] = (by,) if isinstance(by, str) else tuple(by)
+        self.measure: str = measure
+        self.n: int = n
+        self.heavy_hitters = SpaceSaving(capacity)
+        self.sketch = CountMinSketch(width, depth)
+        self._bind()
+
+    def __getstate__(self):
+        # the key and measure functions are rebuilt rather than pickled
+        return self.by, self.measure, self.n, self.heavy_hitters, self.sketch
+
+    def __setstate__(self, state):
+        self.by, self.measure, self.n, self.heavy_hitters, self.sketch = state
+        self._bind()
+
+    def _bind(self):
+        keys = [KEYS[name] for name in self.by]
+        if len(keys) == 1:
+            self._key = keys[0]
+        else:
+            self._key = lambda play: tuple(key(play) for key in keys)
+        self._value = MEASURES[self.measure]
+
+    def add(self, play: Play):
+        """Adds a Play to its group."""
+        key, value = self._key(play), self._value(play)
+        self.heavy_hitters.add(key, value)
+        self.sketch.add(key, value)
+
+    def estimate(self, key: Any) -> int:
+        """Gets the estimated value of a group; see CountMinSketch for the error."""
+        return self.sketch.estimate(key)
+
+    def merge(self, other: "ApproximateTop"):
+        """Adds the groups of another aggregate of the same kind to this one."""
+        if (other.by, other.measure) != (self.by, self.measure):
+            raise ValueError("Only aggregates of the same keys and measure can merge")
+        self.heavy_hitters.merge(other.heavy_hitters)
+        self.sketch.merge(other.sketch)
+
+    def result(self) -> List[Tuple[Any, int]]:
+        """Gets the top (key, value) pairs in descending order. Both the SpaceSaving
+        count and the CountMinSketch estimate of a group can only overestimate its
+        value, so the lower of the two is reported."""
+        candidates = [
+            (key, min(count, self.sketch.estimate(key)))
+            for key, count in self.heavy_hitters.top(self.heavy_hitters.capacity)
+        ]
+        return heapq.nlargest(self.n, candidates, key=itemgetter(1))
+
+
+class ApproximateDistinct:
+    """Counts the distinct values of a key (e.g. "id" for tracks) with a HyperLogLog,
+    overall or per group of by (e.g. "year"), which should have few values."""
+
+    def __init__(self, of: str = "id", by: Optional[str] = None, precision: int = 12):
+        self.of: str = of
+        self.by: Optional[str] = by
+        self.precision: int = precision
+        self.sketches: Dict[Any, HyperLogLog] = {}
+        self._bind()
+
+    def __getstate__(self):
+        return self.of, self.by, self.precision, self.sketches
+
+    def __setstate__(self, state):
+        self.of, self.by, self.precision, self.sketches = state
+        self._bind()
+
+    def _bind(self):
+        self._of = KEYS[self.of]
+        self._group = KEYS[self.by] if self.by is not None else lambda play: None
+
+    def add(self, play: Play):
+        """Adds the value of a Play to the sketch of its group."""
+        group = self._group(play)
+        sketch = self.sketches.get(group)
+        if sketch is None:
+            sketch = self.sketches[group] = HyperLogLog(self.precision)
+        sketch.add(self._of(play))
+
+    def merge(self, other: "ApproximateDistinct"):
+        """Adds the values of another aggregate of the same kind to this one."""
+        if (other.of, other.by, other.precision) != (self.of, self.by, self.precision):
+            raise ValueError("Only aggregates of the same keys can merge")
+        for group, sketch in other.sketches.items():
+            if group in self.sketches:
+                self.sketches[group].merge(sketch)
+            else:
+                self.sketches[group] = HyperLogLog(self.precision)
+                self.sketches[group].merge(sketch)
+
+    def result(self) -> Union[int, Dict[Any, int]]:
+        """Gets the estimated number of distinct values, per group if by is set."""
+        if self.by is None:
+            sketch = self.sketches.get(None)
+            return sketch.count() if sketch is not None else 0
+        return {group: sketch.count() for group, sketch in self.sketches.items()}
+
+
+class ApproximateQuantiles:
+    """Estimates quantiles of a measure of the Plays (ms_played by default) with a
+    TDigest."""
+
+    def __init__(
+        self,
+        measure: str = "ms_played",
+        quantiles: Sequence[float] = (0.5, 0.9, 0.99),
+        compression: int = 100,
+    ):
+        self.measure: str = measure
+        self.quantiles: Tuple[float, ...] = tuple(quantiles)
+        self.digest = TDigest(compression)
+        self._value = MEASURES[measure]
+
+    def __getstate__(self):
+        return self.measure, self.quantiles, self.digest
+
+    def __setstate__(self, state):
+        self.measure, self.quantiles, self.digest = state
+        self._value = MEASURES[self.measure]
+
+    def add(self, play: Play):
+        """Adds the measure of a Play."""
+        self.digest.add(self._value(play))
+
+    def merge(self, other: "ApproximateQuantiles"):
+        """Adds the values of another aggregate of the same measure to this one."""
+        if other.measure != self.measure:
+            raise ValueError("Only aggregates of the same measure can merge")
+        self.digest.merge(other.digest)
+
+    def result(self) -> Dict[float, Optional[float]]:
+        """Gets the estimated value of each quantile."""
+        return {q: self.digest.quantile(q) for q in self.quantiles}
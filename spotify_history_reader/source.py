@@ -0,0 +1,65 @@
+import hashlib
+import io
+import os
+import zipfile
+
+from typing import BinaryIO, Optional, TextIO, Tuple
+
+
+class Source:
+    """A history file to read Plays from, on disk or a member of a ZIP archive."""
+
+    def __init__(self, path: str, member: Optional[str] = None):
+        self.path: str = path
+        self.member: Optional[str] = member
+
+    @property
+    def name(self) -> str:
+        """Gets the file name of the source, without any directories"""
+        return os.path.basename(self.member if self.member is not None else self.path)
+
+    def open(self) -> TextIO:
+        """Opens the source for reading as text, without extracting archive members."""
+        return io.TextIOWrapper(self.open_binary(), encoding="utf-8")
+
+    def open_binary(self) -> BinaryIO:
+        """Opens the source for reading as bytes, without extracting archive members.
+
+        Archive members can seek, but seeking backwards decompresses them again from the
+        start."""
+        if self.member is None:
+            return open(self.path, "rb")
+        # the member stream keeps the archive file open after the ZipFile is closed
+        with zipfile.ZipFile(self.path, "r") as archive:
+            return archive.open(self.member)
+
+    def stat(self) -> Tuple[int, int]:
+        """Gets the size and modification time (in ns) of the source.
+
+        Members of an archive report the modification time of the archive itself."""
+        stat = os.stat(self.path)
+        if self.member is None:
+            return stat.st_size, stat.st_mtime_ns
+        with zipfile.ZipFile(self.path, "r") as archive:
+            return archive.getinfo(self.member).file_size, stat.st_mtime_ns
+
+    def digest(self) -> str:
+        """Gets a digest of the contents of the source.
+
+        Members of an archive use the CRC-32 stored in the archive and are not read."""
+        if self.member is None:
+            content_hash = hashlib.blake2b()
+            with open(self.path, "rb") as file:
+                for chunk in iter(lambda: file.read(1 << 20), b""):
+                    content_hash.update(chunk)
+            return content_hash.hexdigest()
+        with zipfile.ZipFile(self.path, "r") as archive:
+            return f"crc32:{archive.getinfo(self.member).CRC:08x}"
+
+    def __str__(self):
+        if self.member is None:
+            return self.path
+        return os.path.join(self.path, self.member)
+
+    def __repr__(self):
+        return f"Source({str(self)!r})"
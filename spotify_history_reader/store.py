@@ -0,0 +1,294 @@
+import heapq
+import mmap
+import os
+import struct
+import tempfile
+
+from bisect import bisect_left
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional
+
+from spotify_history_reader.core import Play
+
+# the records sorted in memory at a time while building; larger histories are sorted
+# in runs of this many records, spilled to temporary files and merged
+DEFAULT_RUN_SIZE = 1 << 18
+# the decoded strings kept in memory by an open store
+DEFAULT_STRING_CACHE_SIZE = 1 << 16
+
+_MAGIC = b"SHRSTORE"
+_VERSION = 2
+# magic, version, record count, string count, offset of the string offsets, offset of
+# the string data
+_HEADER = struct.Struct("<8sIQQQQ")
+# timestamp (ms), ms played, then string codes for the uri, name, album, artist,
+# reason_start, reason_end, username, platform, ip and country, then the flags
+_RECORD = struct.Struct("<qq10IB")
+_TIMESTAMP = struct.Struct("<q")
+_STRING_OFFSETS = struct.Struct("<QQ")
+_NONE = 0xFFFFFFFF
+# ms played of a play without any
+_NO_MS_PLAYED = -(2**63)
+
+_IS_SONG, _SHUFFLE, _SKIPPED, _OFFLINE, _INCOGNITO = (1 << bit for bit in range(5))
+
+
+class _Timestamps:
+    """A read-only sequence of the record timestamps, for bisecting the mapped file."""
+
+    def __init__(self, buffer: mmap.mmap, count: int):
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> int:
+        offset = _HEADER.size + index * _RECORD.size
+        return _TIMESTAMP.unpack_from(self.buffer, offset)[0]
+
+
+class HistoryStore:
+    """A memory-mapped file of Plays sorted by timestamp, for time range lookups.
+
+    Plays are stored as fixed-width records, with all strings replaced by codes into a
+    string table at the end of the file. Records and strings are only decoded when a
+    lookup returns them, so the store never needs to fit into memory. At most
+    string_cache_size decoded strings are kept, evicting the least recently used."""
+
+    def __init__(self, path: str, string_cache_size: int = DEFAULT_STRING_CACHE_SIZE):
+        self.path: str = os.path.expanduser(path)
+        self.string_cache_size: int = string_cache_size
+        with open(self.path, "rb") as file:
+            self._buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, _, strings_offset, data_offset = _HEADER.unpack_from(
+            self._buffer
+        )
+        if magic != _MAGIC or version != _VERSION:
+            self._buffer.close()
+            raise ValueError(f"{self.path} is not a history store")
+
+        self._count: int = count
+        self._strings_offset: int = strings_offset
+        self._data_offset: int = data_offset
+        self._strings: "OrderedDict[int, str]" = OrderedDict()
+        self._timestamps = _Timestamps(self._buffer, count)
+
+    @staticmethod
+    def build(
+        path: str, plays: Iterable[Play], run_size: int = DEFAULT_RUN_SIZE
+    ) -> "HistoryStore":
+        """Writes the given Plays to a new store at path and opens it.
+
+        The Plays are sorted while building: up to run_size records at a time in memory,
+        larger histories in sorted runs that are spilled to temporary files next to path
+        and merged. Only the distinct strings of the Plays are held in memory
+        throughout. A Play whose ms_played is neither an integer nor None raises a
+        ValueError."""
+        codes: Dict[str, int] = {}
+        strings: List[bytes] = []
+
+        def encode(value: Optional[str]) -> int:
+            if value is None:
+                return _NONE
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(strings)
+                strings.append(value.encode("utf-8"))
+            return code
+
+        path = os.path.expanduser(path)
+        runs: List[BinaryIO] = []
+        records: List[bytes] = []
+        count = 0
+        try:
+            for play in plays:
+                connection, playback = play.connection, play.playback
+                ms_played = playback.ms_played
+                if ms_played is None:
+                    ms_played = _NO_MS_PLAYED
+                elif not isinstance(ms_played, int):
+                    raise ValueError(f"Invalid ms_played {ms_played!r} of {play!r}")
+                flags = (
+                    (_IS_SONG if play.is_song else 0)
+                    | (_SHUFFLE if playback.shuffle else 0)
+                    | (_SKIPPED if playback.skipped else 0)
+                    | (_OFFLINE if connection.offline else 0)
+                    | (_INCOGNITO if connection.incognito_mode else 0)
+                )
+                records.append(
+                    _RECORD.pack(
+                        play.epoch * 1000,
+                        ms_played,
+                        encode(play.id),
+                        encode(play.song),
+                        encode(play.track.album if play.is_song else None),
+                        encode(play.artist),
+                        encode(playback.reason_start),
+                        encode(playback.reason_end),
+                        encode(connection.username),
+                        encode(connection.platform),
+                        encode(connection.ip),
+                        encode(connection.country),
+                        flags,
+                    )
+                )
+                if len(records) >= run_size:
+                    runs.append(_spill(records, os.path.dirname(path)))
+                    count += len(records)
+                    records = []
+            records.sort(key=_timestamp)
+            count += len(records)
+            sorted_records: Iterable[bytes] = records
+            if runs:
+                sorted_records = heapq.merge(
+                    *(_read_run(run) for run in runs), records, key=_timestamp
+                )
+
+            strings_offset = _HEADER.size + count * _RECORD.size
+            data_offset = strings_offset + (len(strings) + 1) * 8
+            with open(path, "wb") as file:
+                file.write(
+                    _HEADER.pack(
+                        _MAGIC,
+                        _VERSION,
+                        count,
+                        len(strings),
+                        strings_offset,
+                        data_offset,
+                    )
+                )
+                file.writelines(sorted_records)
+                position = 0
+                for string in strings:
+                    file.write(struct.pack("<Q", position))
+                    position += len(string)
+                file.write(struct.pack("<Q", position))
+                file.writelines(strings)
+        finally:
+            for run in runs:
+                run.close()
+        return HistoryStore(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Unmaps the store."""
+        self._buffer.close()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[Play]:
+        return self._plays(0, self._count)
+
+    def between(self, start: datetime, end: datetime) -> Iterator[Play]:
+        """Yields the Plays with a timestamp from start (inclusive) to end (exclusive).
+
+        Naive datetimes are taken to be in UTC. The range is found with a binary search,
+        so only the matching records are read."""
+        first = bisect_left(self._timestamps, _epoch_ms(start))
+        last = bisect_left(self._timestamps, _epoch_ms(end), first)
+        return self._plays(first, last)
+
+    def _plays(self, first: int, last: int) -> Iterator[Play]:
+        for index in range(first, last):
+            yield self._play(index)
+
+    def _play(self, index: int) -> Play:
+        (
+            timestamp,
+            ms_played,
+            uri,
+            name,
+            album,
+            artist,
+            reason_start,
+            reason_end,
+            username,
+            platform,
+            ip,
+            country,
+            flags,
+        ) = _RECORD.unpack_from(self._buffer, _HEADER.size + index * _RECORD.size)
+        is_song = bool(flags & _IS_SONG)
+        song, episode = (
+            (self._string(uri), None) if is_song else (None, self._string(uri))
+        )
+        return Play.from_entry(
+            {
+                "ts": datetime.fromtimestamp(timestamp / 1000, timezone.utc).strftime(
+                    "%Y-%m-%dT%H:%M:%SZ"
+                ),
+                "ms_played": ms_played if ms_played != _NO_MS_PLAYED else None,
+                "spotify_track_uri": song,
+                "master_metadata_track_name": self._string(name) if song else None,
+                "master_metadata_album_album_name": self._string(album),
+                "master_metadata_album_artist_name": (
+                    self._string(artist) if song else None
+                ),
+                "spotify_episode_uri": episode,
+                "episode_name": self._string(name) if episode else None,
+                "episode_show_name": self._string(artist) if episode else None,
+                "reason_start": self._string(reason_start),
+                "reason_end": self._string(reason_end),
+                "shuffle": bool(flags & _SHUFFLE),
+                "skipped": bool(flags & _SKIPPED),
+                "offline": bool(flags & _OFFLINE),
+                "incognito_mode": bool(flags & _INCOGNITO),
+                "username": self._string(username),
+                "platform": self._string(platform),
+                "ip_addr_decrypted": self._string(ip),
+                "conn_country": self._string(country),
+            }
+        )
+
+    def _string(self, code: int) -> Optional[str]:
+        if code == _NONE:
+            return None
+        strings = self._strings
+        string = strings.get(code)
+        if string is not None:
+            strings.move_to_end(code)
+            return string
+        start, end = _STRING_OFFSETS.unpack_from(
+            self._buffer, self._strings_offset + code * 8
+        )
+        string = strings[code] = self._buffer[
+            self._data_offset + start : self._data_offset + end
+        ].decode("utf-8")
+        if len(strings) > self.string_cache_size:
+            strings.popitem(last=False)
+        return string
+
+
+def _timestamp(record: bytes) -> int:
+    # records start with their little-endian timestamp, so sort on the decoded value
+    return _TIMESTAMP.unpack_from(record)[0]
+
+
+def _spill(records: List[bytes], directory: str) -> BinaryIO:
+    records.sort(key=_timestamp)
+    run = tempfile.TemporaryFile(dir=directory or None)
+    run.writelines(records)
+    run.seek(0)
+    return run
+
+
+def _read_run(run: BinaryIO) -> Iterator[bytes]:
+    while True:
+        record = run.read(_RECORD.size)
+        if not record:
+            return
+        yield record
+
+
+def _epoch_ms(timestamp: datetime) -> int:
+    if timestamp.tzinfo is None:
+        timestamp = timestamp.replace(tzinfo=timezone.utc)
+    return int(timestamp.timestamp() * 1000)
@@ -0,0 +1,85 @@
+import json
+import re
+
+from typing import Any, Iterator, TextIO
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+_DECODER = json.JSONDecoder()
+_WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+
+class _ChunkedText:
+    """A sliding window over a text file, refilled one chunk at a time."""
+
+    def __init__(self, file: TextIO, chunk_size: int):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.index = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Appends the next chunk of the file to the unconsumed part of the buffer.
+
+        Returns False once the end of the file has been reached."""
+        if self.eof:
+            return False
+        chunk = self.file.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.index :] + chunk
+        self.index = 0
+        return True
+
+    def peek(self) -> str:
+        """Skips whitespace and returns the next character, or "" at the end."""
+        while True:
+            self.index = _WHITESPACE.match(self.buffer, self.index).end()
+            if self.index < len(self.buffer):
+                return self.buffer[self.index]
+            if not self.fill():
+                return ""
+
+    def decode(self) -> Any:
+        """Decodes the JSON value starting at the next non-whitespace character."""
+        self.peek()
+        while True:
+            try:
+                value, end = _DECODER.raw_decode(self.buffer, self.index)
+            except json.JSONDecodeError:
+                # the value is most likely cut off by the end of the buffer
+                if self.fill():
+                    continue
+                raise
+            # a number at the very end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and self.fill():
+                continue
+            self.index = end
+            return value
+
+
+def iter_json_array(
+    file: TextIO, chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> Iterator[Any]:
+    """Yields the elements of the top-level JSON array in file one at a time.
+
+    Unlike json.load, only the current chunk of the file and the element being decoded
+    are held in memory, so the first element is available as soon as it has been
+    read."""
+    text = _ChunkedText(file, chunk_size)
+    if text.peek() != "[":
+        raise ValueError("Expected the file to contain a JSON array")
+    text.index += 1
+    if text.peek() == "]":
+        return
+
+    while True:
+        yield text.decode()
+        separator = text.peek()
+        text.index += 1
+        if separator == "]":
+            return
+        if separator != ",":
+            raise ValueError(f"Expected ',' or ']' in JSON array, found {separator!r}")
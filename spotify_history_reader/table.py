@@ -0,0 +1,279 @@
+from array import array
+from collections import Counter, defaultdict
+from datetime import datetime, timezone
+from itertools import compress
+from math import prod
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple, Union
+
+from spotify_history_reader.core import ROW_FIELDS, Play
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+# typecodes of the stored columns; "q" is always 64 bits, unlike "l"
+_INT = "q"
+_BOOL = "b"
+
+_MS_PER_HOUR = 3600 * 1000
+_MS_PER_DAY = 24 * _MS_PER_HOUR
+
+# the most combinations of group codes that can be packed into an int64
+_MAX_PACKED = 2**63
+
+# the positions in Play.row() of the values read into a table
+_ROW_POSITIONS = tuple(
+    ROW_FIELDS.index(name)
+    for name in ("timestamp", "ms_played", "is_song", "incognito_mode", "skipped")
+)
+
+
+class _Dictionary:
+    """Maps each distinct string of a column to a small integer code."""
+
+    def __init__(self, values: List[str] = None):
+        self.values: List[str] = values if values is not None else []
+        self.codes: Dict[str, int] = {value: i for i, value in enumerate(self.values)}
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class PlayTable:
+    """A columnar representation of a set of Plays.
+
+    Each play is a row of the following columns:
+    * timestamp: milliseconds since the epoch (UTC)
+    * ms_played: milliseconds the track was played
+    * is_song, incognito_mode, skipped: flags
+    * artist, song, id: dictionary encoded strings, see Play for their meaning
+
+    The year, month, weekday and hour of each play can be used as group keys as well.
+    Operations run on whole columns, using NumPy when it is installed."""
+
+    INT_COLUMNS = ("timestamp", "ms_played")
+    BOOL_COLUMNS = ("is_song", "incognito_mode", "skipped")
+    STRING_COLUMNS = ("artist", "song", "id")
+    DERIVED_COLUMNS = ("year", "month", "weekday", "hour")
+
+    def __init__(
+        self,
+        columns: Dict[str, array] = None,
+        dictionaries: Dict[str, _Dictionary] = None,
+    ):
+        self.columns: Dict[str, array] = columns or {
+            **{name: array(_INT) for name in self.INT_COLUMNS},
+            **{name: array(_BOOL) for name in self.BOOL_COLUMNS},
+            **{name: array(_INT) for name in self.STRING_COLUMNS},
+        }
+        self.dictionaries: Dict[str, _Dictionary] = dictionaries or {
+            name: _Dictionary() for name in self.STRING_COLUMNS
+        }
+
+    @staticmethod
+    def from_plays(plays: Iterable[Play]) -> "PlayTable":
+        """Builds a table from the given Plays."""
+        table = PlayTable()
+        columns = table.columns
+        timestamps, ms_played = columns["timestamp"], columns["ms_played"]
+        is_song, incognito, skipped = (columns[name] for name in table.BOOL_COLUMNS)
+        artists, songs, ids = (columns[name] for name in table.STRING_COLUMNS)
+        encode_artist, encode_song, encode_id = (
+            table.dictionaries[name].encode for name in table.STRING_COLUMNS
+        )
+
+        epoch_at, ms_played_at, is_song_at, incognito_at, skipped_at = _ROW_POSITIONS
+        for play in plays:
+            # the raw values, without building the playback or connection
+            row = play.row()
+            timestamps.append(row[epoch_at] * 1000)
+            ms_played.append(row[ms_played_at])
+            is_song.append(row[is_song_at])
+            incognito.append(bool(row[incognito_at]))
+            skipped.append(bool(row[skipped_at]))
+            artists.append(encode_artist(play.artist))
+            songs.append(encode_song(play.song))
+            ids.append(encode_id(play.id))
+        return table
+
+    def __len__(self) -> int:
+        return len(self.columns["timestamp"])
+
+    def column(self, name: str) -> Sequence:
+        """Gets the values of the named column.
+
+        String columns are returned decoded; all others are returned as NumPy arrays
+        when NumPy is installed, or as arrays otherwise, ready to be used in a filter
+        mask."""
+        if name in self.dictionaries:
+            values = self.dictionaries[name].values
+            return [values[code] for code in self.columns[name]]
+        return self._values(name)
+
+    def timestamps(self) -> List[datetime]:
+        """Gets the timestamp of each play as a datetime."""
+        return [
+            datetime.fromtimestamp(ms / 1000, timezone.utc)
+            for ms in self.columns["timestamp"]
+        ]
+
+    def filter(self, mask: Iterable[Any]) -> "PlayTable":
+        """Returns a table with only the rows for which mask is true."""
+        if np is not None:
+            mask = np.asarray(mask, dtype=bool)
+            columns = {
+                name: array(values.typecode, _as_numpy(values)[mask].tobytes())
+                for name, values in self.columns.items()
+            }
+        else:
+            mask = bytes(bool(selected) for selected in mask)
+            columns = {
+                name: array(values.typecode, compress(values, mask))
+                for name, values in self.columns.items()
+            }
+        return PlayTable(columns, self.dictionaries)
+
+    def sum(self, column: str = "ms_played") -> int:
+        """Gets the sum of the named column."""
+        if np is not None:
+            return int(_as_numpy(self.columns[column]).sum())
+        return sum(self.columns[column])
+
+    def group_sum(
+        self, by: Union[str, Sequence[str]], value: str = "ms_played"
+    ) -> Dict[Any, int]:
+        """Sums the value column over the rows of each group.
+
+        by is a column name or a sequence of column names; in the latter case the keys
+        of the returned dictionary are tuples. If value is None, the rows are counted
+        instead."""
+        names = [by] if isinstance(by, str) else list(by)
+        if len(self) == 0:
+            return {}
+
+        keys = [self._key(name) for name in names]
+        values = self.columns[value] if value is not None else None
+        if np is not None:
+            groups = _group_numpy([codes for codes, _ in keys], values)
+        else:
+            groups = _group_python([codes for codes, _ in keys], values)
+
+        labels = [label for _, label in keys]
+        if isinstance(by, str):
+            return {labels[0](codes[0]): total for codes, total in groups}
+        return {
+            tuple(label(code) for label, code in zip(labels, codes)): total
+            for codes, total in groups
+        }
+
+    def group_count(self, by: Union[str, Sequence[str]]) -> Dict[Any, int]:
+        """Counts the rows of each group; see group_sum."""
+        return self.group_sum(by, None)
+
+    def _values(self, name: str) -> Sequence[int]:
+        if name in self.DERIVED_COLUMNS:
+            return _derive(name, self._values("timestamp"))
+        values = self.columns[name]
+        return _as_numpy(values) if np is not None else values
+
+    def _key(self, name: str) -> Tuple[Sequence[int], Callable[[int], Any]]:
+        """Gets the codes of a group key column, and a function from codes to labels."""
+        if name in self.dictionaries:
+            return self._values(name), self.dictionaries[name].values.__getitem__
+        if name in self.BOOL_COLUMNS:
+            return self._values(name), bool
+        return self._values(name), int
+
+
+def _as_numpy(values: array):
+    return np.frombuffer(
+        values, dtype=np.int8 if values.typecode == _BOOL else np.int64
+    )
+
+
+def _derive(name: str, timestamps: Sequence[int]) -> Sequence[int]:
+    if np is not None:
+        if name == "year":
+            years = timestamps.astype("datetime64[ms]").astype("datetime64[Y]")
+            return years.astype(np.int64) + 1970
+        if name == "month":
+            months = timestamps.astype("datetime64[ms]").astype("datetime64[M]")
+            return months.astype(np.int64) % 12 + 1
+        if name == "weekday":
+            # the epoch was a Thursday
+            return (timestamps // _MS_PER_DAY + 3) % 7
+        return timestamps // _MS_PER_HOUR % 24
+
+    if name == "weekday":
+        return array(_INT, ((ms // _MS_PER_DAY + 3) % 7 for ms in timestamps))
+    if name == "hour":
+        return array(_INT, (ms // _MS_PER_HOUR % 24 for ms in timestamps))
+
+    # the calendar is only consulted once per distinct day
+    dates: Dict[int, datetime] = {}
+    derived = array(_INT)
+    for ms in timestamps:
+        day = ms // _MS_PER_DAY
+        date = dates.get(day)
+        if date is None:
+            date = dates[day] = datetime.fromtimestamp(day * 86400, timezone.utc)
+        derived.append(date.year if name == "year" else date.month)
+    return derived
+
+
+def _group_python(
+    code_columns: List[Sequence[int]], values: Sequence[int]
+) -> Iterable[Tuple[Tuple[int, ...], int]]:
+    rows = zip(*code_columns)
+    if values is None:
+        return Counter(rows).items()
+    totals: Dict[Tuple[int, ...], int] = defaultdict(int)
+    for row, value in zip(rows, values):
+        totals[row] += value
+    return totals.items()
+
+
+def _group_numpy(
+    code_columns: List[Sequence[int]], values: array
+) -> Iterable[Tuple[Tuple[int, ...], int]]:
+    code_columns = [np.asarray(codes).astype(np.int64) for codes in code_columns]
+    offsets = [int(codes.min()) for codes in code_columns]
+    sizes = [
+        int(codes.max()) - offset + 1 for codes, offset in zip(code_columns, offsets)
+    ]
+    # the packed keys and the sums must fit in an int64; wider groupings and larger
+    # sums are grouped in Python
+    if prod(sizes) > _MAX_PACKED or _may_overflow(values):
+        return _group_python([codes.tolist() for codes in code_columns], values)
+
+    # pack the codes of every key into a single integer per row
+    combined = np.zeros(len(code_columns[0]), dtype=np.int64)
+    for codes, offset, size in zip(code_columns, offsets, sizes):
+        combined = combined * size + (codes - offset)
+
+    groups, inverse = np.unique(combined, return_inverse=True)
+    if values is None:
+        totals = np.bincount(inverse)
+    else:
+        # summed in int64 rather than the float64 of bincount, to stay exact
+        totals = np.zeros(len(groups), dtype=np.int64)
+        np.add.at(totals, inverse.ravel(), _as_numpy(values))
+
+    # unpack the codes of each group
+    unpacked = []
+    for offset, size in zip(reversed(offsets), reversed(sizes)):
+        unpacked.append((groups % size + offset).tolist())
+        groups = groups // size
+    return zip(zip(*reversed(unpacked)), totals.tolist())
+
+
+def _may_overflow(values: array) -> bool:
+    if values is None or not len(values):
+        return False
+    numbers = _as_numpy(values)
+    return max(-int(numbers.min()), int(numbers.max())) * len(numbers) >= _MAX_PACKED
@@ -0,0 +1,119 @@
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+# the timestamps of history files are laid out as in 2021-06-30T23:59:59Z
+_DIGITS = (0, 1, 2, 3, 5, 6, 8, 9, 11, 12)
+
+# each memo is cleared when it outgrows this many hours (15 years)
+_MAX_MEMO = 1 << 17
+
+# hours since the epoch, by the date and hour prefix of a timestamp (2021-06-30T23)
+_HOURS: Dict[str, int] = {}
+# seconds into the hour, by the minutes and seconds of a timestamp (:59:59)
+_SECONDS: Dict[str, int] = {
+    f":{minute:02d}:{second:02d}": minute * 60 + second
+    for minute in range(60)
+    for second in range(60)
+}
+# the fields of an hour since the epoch: year, month, day, weekday, hour, and the
+# date and hour prefix
+_FIELDS: Dict[int, Tuple[int, int, int, int, int, str]] = {}
+
+
+def parse_epoch(ts: str) -> int:
+    """Gets the seconds since the epoch of a timestamp of a history file.
+
+    The layout of history files is parsed with lookups alone: the date and hour in a
+    memo, so that each hour is only parsed once, and the minutes and seconds in a table.
+    Other ISO 8601 timestamps are parsed with datetime, as UTC unless they have an
+    offset, without the fraction of a second."""
+    hours = _HOURS.get(ts[:13])
+    if hours is None:
+        hours = _parse_hours(ts[:13])
+    if hours is not None and ts[19:] == "Z":
+        seconds = _SECONDS.get(ts[13:19])
+        if seconds is not None:
+            return hours * 3600 + seconds
+    return int(to_utc(datetime.fromisoformat(ts.replace("Z", "+00:00"))).timestamp())
+
+
+def to_datetime(epoch: int) -> datetime:
+    """Gets the UTC datetime of the seconds since the epoch."""
+    return datetime.fromtimestamp(epoch, timezone.utc)
+
+
+def to_utc(timestamp: datetime) -> datetime:
+    """Gets the datetime in UTC, taking one without a time zone to be in UTC already."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=timezone.utc)
+    return timestamp.astimezone(timezone.utc)
+
+
+def fields(epoch: int) -> Tuple[int, int, int, int, int, str]:
+    """Gets the (year, month, day, weekday, hour, hour prefix) of the seconds since the
+    epoch, in UTC, with Monday being weekday 0 and the hour prefix as in 2021-06-30T23.
+    The calendar is only consulted once per hour."""
+    hours = epoch // 3600
+    hour_fields = _FIELDS.get(hours)
+    if hour_fields is None:
+        if len(_FIELDS) >= _MAX_MEMO:
+            _FIELDS.clear()
+        year, month, day = _civil_from_days(hours // 24)
+        hour = hours % 24
+        hour_fields = _FIELDS[hours] = (
+            year,
+            month,
+            day,
+            # the epoch was a Thursday
+            (hours // 24 + 3) % 7,
+            hour,
+            f"{year:04d}-{month:02d}-{day:02d}T{hour:02d}",
+        )
+    return hour_fields
+
+
+def _parse_hours(prefix: str) -> Optional[int]:
+    if (
+        len(prefix) != 13
+        or not all(prefix[index].isdigit() for index in _DIGITS)
+        or (
+            prefix[4],
+            prefix[7],
+            prefix[10],
+        )
+        != ("-", "-", "T")
+    ):
+        return None
+    try:
+        timestamp = datetime(
+            int(prefix[:4]),
+            int(prefix[5:7]),
+            int(prefix[8:10]),
+            int(prefix[11:13]),
+            tzinfo=timezone.utc,
+        )
+    except ValueError:
+        return None
+    if len(_HOURS) >= _MAX_MEMO:
+        _HOURS.clear()
+    hours = _HOURS[prefix] = int(timestamp.timestamp()) // 3600
+    return hours
+
+
+def _civil_from_days(days: int) -> Tuple[int, int, int]:
+    # the (year, month, day) of the days since the epoch in the proleptic Gregorian
+    # calendar, in integer arithmetic (Howard Hinnant's civil_from_days)
+    days += 719468
+    era = days // 146097
+    day_of_era = days - era * 146097
+    year_of_era = (
+        day_of_era - day_of_era // 1460 + day_of_era // 36524 - day_of_era // 146096
+    ) // 365
+    day_of_year = day_of_era - (
+        365 * year_of_era + year_of_era // 4 - year_of_era // 100
+    )
+    shifted_month = (5 * day_of_year + 2) // 153
+    day = day_of_year - (153 * shifted_month + 2) // 5 + 1
+    month = shifted_month + 3 if shifted_month < 10 else shifted_month - 9
+    year = year_of_era + era * 400 + (1 if month <= 2 else 0)
+    return year, month, day
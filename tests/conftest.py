@@ -0,0 +1,57 @@
+import json
+
+import pytest
+
+
+def _entry(ts: str, uri: str, artist: str = "Gorillaz", ms_played: int = 8778):
+    return {
+        "conn_country": "SI",
+        "episode_name": None,
+        "episode_show_name": None,
+        "incognito_mode": False,
+        "ip_addr_decrypted": "1.2.3.4",
+        "master_metadata_album_album_name": "Humanz",
+        "master_metadata_album_artist_name": artist,
+        "master_metadata_track_name": "Andromeda (feat. DRAM)",
+        "ms_played": ms_played,
+        "offline": False,
+        "offline_timestamp": 1572964071330,
+        "platform": "OS X 10.15.1 [x86 8]",
+        "reason_end": "endplay",
+        "reason_start": "clickrow",
+        "shuffle": True,
+        "skipped": None,
+        "spotify_episode_uri": None,
+        "spotify_track_uri": uri,
+        "ts": ts,
+        "user_agent_decrypted": "unknown",
+        "username": "username",
+    }
+
+
+@pytest.fixture
+def entries():
+    return [
+        _entry("2019-11-05T14:28:00Z", "spotify:track:2C0KFbb4v9CNWR5c9jWcKC"),
+        _entry("2019-11-05T14:31:12Z", "spotify:track:0d28khcov6AiegSCpG5TuT"),
+        dict(
+            _entry("2020-01-02T08:00:00Z", None, artist=None, ms_played=1200000),
+            episode_name="Episode 1",
+            episode_show_name="The Show",
+            spotify_episode_uri="spotify:episode:5hSbmBGiXKmTTRIbjRQhBQ",
+        ),
+        _entry("2021-06-30T23:59:59Z", "spotify:track:1mea3bSkSGXuIRvnydlB5b", "Björk"),
+    ]
+
+
+@pytest.fixture
+def write_history(tmp_path):
+    """Writes entries to a history file in tmp_path and returns its path."""
+
+    def write(entries, name="Streaming_History_Audio_2019-2021_0.json"):
+        path = tmp_path / name
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(entries, file, indent=2)
+        return str(path)
+
+    return write
@@ -0,0 +1,47 @@
+import pickle
+
+import pytest
+
+from spotify_history_reader.aggregate import Aggregate, aggregate
+from spotify_history_reader.core import Play
+from spotify_history_reader.filters import PlayFilter
+
+
+@pytest.fixture
+def plays(entries):
+    return [Play.from_entry(entry) for entry in entries]
+
+
+def test_single_pass(plays):
+    results = aggregate(
+        iter(plays),
+        total=Aggregate(),
+        by_artist=Aggregate("artist"),
+        by_year_and_song=Aggregate(("year", "is_song"), "count"),
+        top_artist=Aggregate("artist", top=1),
+        top_song_artist=Aggregate(
+            "artist", top=1, play_filter=PlayFilter(songs_only=True)
+        ),
+    )
+
+    assert results == {
+        "total": 3 * 8778 + 1200000,
+        "by_artist": {"Gorillaz": 2 * 8778, "The Show": 1200000, "Björk": 8778},
+        "by_year_and_song": {(2019, True): 2, (2020, False): 1, (2021, True): 1},
+        "top_artist": [("The Show", 1200000)],
+        "top_song_artist": [("Gorillaz", 2 * 8778)],
+    }
+
+
+def test_merge(plays):
+    first, second = Aggregate("artist", "count"), Aggregate("artist", "count")
+    for play in plays[:2]:
+        first.add(play)
+    for play in plays[1:]:
+        second.add(play)
+
+    first.merge(pickle.loads(pickle.dumps(second)))
+    assert first.result() == {"Gorillaz": 3, "The Show": 1, "Björk": 1}
+
+    with pytest.raises(ValueError):
+        first.merge(Aggregate("artist"))
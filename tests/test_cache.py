@@ -0,0 +1,56 @@
+import os
+
+from spotify_history_reader import reader as reader_module
+from spotify_history_reader.reader import SpotifyHistoryReader
+
+
+def read_ids(path, cache_directory):
+    with SpotifyHistoryReader(cache_directory=str(cache_directory)) as reader:
+        reader.add_source(path)
+        return [p.id for p in reader.read()]
+
+
+def test_unchanged_source_is_loaded_from_cache(
+    entries, write_history, tmp_path, monkeypatch
+):
+    path = write_history(entries)
+    expected = read_ids(path, tmp_path / "cache")
+
+    def fail(*args):
+        raise AssertionError("source was parsed instead of loaded from the cache")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(reader_module, "_parse_source", fail)
+        assert read_ids(path, tmp_path / "cache") == expected
+
+        # a new modification time alone falls back to comparing digests
+        os.utime(path, ns=(0, 0))
+        assert read_ids(path, tmp_path / "cache") == expected
+
+
+def test_changed_source_is_rebuilt(entries, write_history, tmp_path):
+    path = write_history(entries)
+    read_ids(path, tmp_path / "cache")
+
+    write_history(entries[:1])
+    assert read_ids(path, tmp_path / "cache") == [entries[0]["spotify_track_uri"]]
+
+
+def test_clear_cache(entries, write_history, tmp_path):
+    with SpotifyHistoryReader(cache_directory=str(tmp_path / "cache")) as reader:
+        reader.add_source(write_history(entries))
+        list(reader.read())
+        assert len(os.listdir(tmp_path / "cache")) == 2
+
+        reader.clear_cache()
+        assert os.listdir(tmp_path / "cache") == []
+
+
+def test_partially_read_source_is_not_cached(entries, write_history, tmp_path):
+    with SpotifyHistoryReader(cache_directory=str(tmp_path / "cache")) as reader:
+        reader.add_source(write_history(entries))
+        plays = reader.read()
+        next(plays)
+        plays.close()
+
+    assert os.listdir(tmp_path / "cache") == []
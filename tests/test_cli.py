@@ -0,0 +1,103 @@
+import json
+import os
+import subprocess
+import sys
+import zipfile
+
+import pytest
+
+from spotify_history_reader import cli
+
+
+def test_runs_all_reports_in_one_pass(entries, write_history, tmp_path, capsys):
+    write_history(entries)
+    cache_directory = str(tmp_path / "cache")
+
+    assert cli.main([str(tmp_path), "--cache-directory", cache_directory]) == 0
+
+    results = json.loads(capsys.readouterr().out)
+    assert list(results) == list(cli.REPORTS)
+    assert results["top-artists"] == [
+        {"rank": 1, "artist": "Gorillaz", "ms_played": 17556, "plays": 2, "skips": 0},
+        {"rank": 2, "artist": "Björk", "ms_played": 8778, "plays": 1, "skips": 0},
+    ]
+    assert [row["id"] for row in results["top-tracks"]] == [
+        "spotify:track:0d28khcov6AiegSCpG5TuT",
+        "spotify:track:1mea3bSkSGXuIRvnydlB5b",
+        "spotify:track:2C0KFbb4v9CNWR5c9jWcKC",
+    ]
+    assert results["yearly"] == [
+        {"year": 2019, "ms_played": 17556, "plays": 2, "skips": 0},
+        {"year": 2020, "ms_played": 1200000, "plays": 1, "skips": 0},
+        {"year": 2021, "ms_played": 8778, "plays": 1, "skips": 0},
+    ]
+    assert [
+        (row["year"], row["sessions"], row["plays"]) for row in results["sessions"]
+    ] == [
+        (2019, 1, 2),
+        (2020, 1, 1),
+        (2021, 1, 1),
+    ]
+
+
+def test_reuses_cached_reports_until_the_export_changes(
+    entries, write_history, tmp_path, capsys, monkeypatch
+):
+    path = write_history(entries[:2])
+    arguments = [path, "yearly", "--cache-directory", str(tmp_path / "cache")]
+    cli.main(arguments)
+    first = capsys.readouterr().out
+
+    def fail(*args, **kwargs):
+        raise AssertionError("the cached report was not used")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(cli, "run_reports", fail)
+        cli.main(arguments)
+        assert capsys.readouterr().out == first
+        # other options are another report
+        with pytest.raises(AssertionError):
+            cli.main(arguments + ["--top", "1"])
+
+    write_history(entries)
+    os.utime(path, ns=(0, 0))
+    cli.main(arguments)
+    assert len(json.loads(capsys.readouterr().out)["yearly"]) == 3
+
+
+def test_writes_csv_per_report(entries, write_history, tmp_path):
+    zip_path = tmp_path / "my_spotify_data.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(
+            write_history(entries), "Streaming_History_Audio_2019-2021_0.json"
+        )
+    output = tmp_path / "reports"
+
+    cli.main(
+        [str(zip_path), "top-artists", "yearly", "-n", "1", "-f", "csv"]
+        + ["-o", str(output), "-j", "2", "--no-cache"]
+    )
+
+    assert sorted(os.listdir(output)) == ["top-artists.csv", "yearly.csv"]
+    with open(output / "top-artists.csv", encoding="utf-8") as file:
+        assert file.read().splitlines() == [
+            "rank,artist,ms_played,plays,skips",
+            "1,Gorillaz,17556,2,0",
+        ]
+    assert not os.path.exists(tmp_path / "cache")
+
+
+def test_rejects_unknown_reports(tmp_path):
+    with pytest.raises(SystemExit):
+        cli.main([str(tmp_path), "top-albums"])
+
+
+def test_does_not_import_the_reader_up_front():
+    code = (
+        "import sys, spotify_history_reader.cli; "
+        "print('spotify_history_reader.reader' in sys.modules)"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "False"
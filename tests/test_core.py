@@ -0,0 +1,85 @@
+import json
+import pickle
+
+import pytest
+
+from spotify_history_reader.core import Play, SymbolTable
+
+
+def test_play_fields(entries):
+    song, _, episode, _ = (Play.from_entry(entry) for entry in entries)
+
+    assert song.is_song and song.episode is None
+    assert (song.artist, song.track.album, song.id) == (
+        "Gorillaz",
+        "Humanz",
+        "spotify:track:2C0KFbb4v9CNWR5c9jWcKC",
+    )
+    assert not episode.is_song and episode.track is None
+    assert (episode.artist, episode.song) == ("The Show", "Episode 1")
+    assert song.playback.ms_played == 8778
+    assert song.timestamp.isoformat() == "2019-11-05T14:28:00+00:00"
+    assert song.epoch == int(song.timestamp.timestamp())
+    assert (song.year, song.month, song.weekday, song.hour) == (2019, 11, 1, 14)
+    assert song.connection.platform == "OS X 10.15.1 [x86 8]"
+    assert song.connection.ip == "1.2.3.4"
+
+
+def test_connection_platform(entries):
+    connection = Play.from_entry(entries[0]).connection
+
+    assert connection.platform == "OS X 10.15.1 [x86 8]"
+    # the misspelled name of older versions is kept as an alias
+    assert connection.platfrom == connection.platform
+    assert Play.from_entry(dict(entries[0], platform=None)).connection.platform is None
+
+
+def test_timestamp_agrees_with_epoch(entries):
+    play = Play.from_entry(dict(entries[0], ts="2019-11-05T16:28:00.750+02:00"))
+
+    assert play.epoch == 1572964080
+    assert play.timestamp.isoformat() == "2019-11-05T14:28:00+00:00"
+
+
+def test_sub_objects_are_built_once(entries):
+    play = Play(**entries[0])
+
+    assert play.track is play.track
+    assert play.connection is play.connection
+    assert play.playback is play.playback
+
+
+def test_missing_and_null_connection_fields(entries):
+    entry = dict(entries[0], offline=None)
+    del entry["ip_addr_decrypted"], entry["conn_country"]
+
+    connection = pickle.loads(pickle.dumps(Play.from_entry(entry))).connection
+
+    assert connection.offline is None
+    assert (connection.ip, connection.country) == ("unknown", "unknown")
+
+
+def test_invalid_play(entries):
+    with pytest.raises(ValueError):
+        Play.from_entry(dict(entries[0], spotify_track_uri=None))
+    for ts in ("garbage", None):
+        with pytest.raises(ValueError):
+            Play.from_entry(dict(entries[0], ts=ts))
+
+
+def test_symbol_table_shares_values(entries):
+    symbols = SymbolTable()
+    # copies, as separately decoded entries would be
+    first, second = (json.loads(json.dumps(entries[0])) for _ in range(2))
+    first, second = Play.from_entry(first, symbols), Play.from_entry(second, symbols)
+
+    assert first.track is second.track
+    assert first.artist is second.artist
+    assert first.playback.reason_end is second.playback.reason_end
+    assert first.connection.platform is second.connection.platform
+    assert first._connection_fields is second._connection_fields
+
+    renamed = Play.from_entry(
+        dict(entries[0], master_metadata_track_name="Busted"), symbols
+    )
+    assert renamed.track is not first.track and renamed.song == "Busted"
@@ -0,0 +1,230 @@
+import importlib.util
+import os
+import threading
+import time
+
+import pytest
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.enrichment import Enricher, EnrichmentCache
+from spotify_history_reader.ratelimit import RateLimiter
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "cache" / "enrichment.sqlite")
+
+
+def test_entries_persist(path):
+    with EnrichmentCache(path, "track") as cache:
+        cache["spotify:track:1"] = {"name": "Andromeda", "artists": [{"uri": "a"}]}
+        assert "spotify:track:1" in cache
+
+    with EnrichmentCache(path, "track") as cache, EnrichmentCache(
+        path, "album"
+    ) as other:
+        assert cache["spotify:track:1"]["name"] == "Andromeda"
+        assert len(cache) == 1
+        assert "spotify:track:1" not in other
+        with pytest.raises(KeyError):
+            other["spotify:track:1"]
+
+
+def test_writes_are_committed_in_batches(path):
+    cache = EnrichmentCache(path, commit_every=2)
+    cache["a"], cache["b"], cache["c"] = 1, 2, 3
+
+    # another connection, as after a crash, sees the committed batch only
+    with EnrichmentCache(path) as reader:
+        assert (reader.get("a"), reader.get("b"), reader.get("c")) == (1, 2, None)
+    cache.close()
+
+
+def test_expired_entries_are_missing(path):
+    now = [0.0]
+    with EnrichmentCache(path, ttl=10, clock=lambda: now[0]) as cache:
+        cache["a"] = 1
+        now[0] = 5
+        cache["b"] = 2
+        now[0] = 12
+        assert "a" not in cache and cache["b"] == 2
+
+        cache.flush()
+        assert len(cache) == 1
+
+
+def test_oldest_entries_are_evicted(path):
+    now = [0.0]
+    with EnrichmentCache(path, max_entries=2, clock=lambda: now[0]) as cache:
+        for key in "abc":
+            now[0] += 1
+            cache[key] = key
+        cache.flush()
+
+        assert len(cache) == 2
+        assert "a" not in cache and "c" in cache
+
+
+class FakeApi:
+    """Serves tracks with an album and artist each, counting the URIs fetched."""
+
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.fetched = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _fetch(self, uris, item):
+        with self._lock:
+            self.fetched.extend(uris)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return [item(uri) if "unknown" not in uri else None for uri in uris]
+
+    def tracks(self, uris):
+        return self._fetch(
+            uris,
+            lambda uri: {
+                "uri": uri,
+                "album": {"uri": "album:" + uri[-1]},
+                "artists": [{"uri": "artist:" + uri[-1]}],
+            },
+        )
+
+    def albums(self, uris):
+        return self._fetch(uris, lambda uri: {"uri": uri, "name": "Humanz"})
+
+    def artists(self, uris):
+        return self._fetch(uris, lambda uri: {"uri": uri, "genres": ["pop", "art pop"]})
+
+
+def enricher(api, **kwargs):
+    return Enricher(api.tracks, api.albums, api.artists, **kwargs)
+
+
+def test_enriches_plays_in_order(entries):
+    entries.append(dict(entries[0], spotify_track_uri="spotify:track:unknown"))
+    plays = [Play.from_entry(entry) for entry in entries * 3]
+    api = FakeApi()
+
+    enriched = list(enricher(api).enrich(plays))
+
+    assert [e.play for e in enriched] == plays
+    song = enriched[0]
+    assert song.track["uri"] == plays[0].id
+    assert song.album == {"uri": "album:C", "name": "Humanz"}
+    assert song.genres == ["pop", "art pop"]
+    episode, unknown = enriched[2], enriched[4]
+    assert (episode.track, episode.album, episode.artists) == (None, None, [])
+    assert unknown.track is None
+    # every URI is fetched once
+    assert len(api.fetched) == len(set(api.fetched)) == 4 + 3 + 3
+
+
+def test_cached_uris_are_not_fetched(entries, tmp_path):
+    plays = [Play.from_entry(entry) for entry in entries]
+    with EnrichmentCache(str(tmp_path / "tracks.sqlite")) as track_cache:
+        list(enricher(FakeApi(), track_cache=track_cache).enrich(plays))
+
+        api = FakeApi()
+        enriched = list(enricher(api, track_cache=track_cache).enrich(plays))
+
+    assert enriched[0].track["uri"] == plays[0].id
+    assert not [uri for uri in api.fetched if uri.startswith("spotify:track")]
+
+
+def test_bounds_requests_and_pending_plays(entries):
+    entries = [
+        dict(entries[0], spotify_track_uri="spotify:track:%d" % i) for i in range(200)
+    ]
+    read = []
+
+    def plays():
+        for entry in entries:
+            read.append(entry)
+            yield Play.from_entry(entry)
+
+    api = FakeApi(delay=0.01)
+    stream = enricher(api, batch_sizes=(5, 5, 5), max_in_flight=3, max_pending=20)
+    stream = stream.enrich(plays())
+
+    next(stream)
+    assert len(read) <= 21
+    assert len(list(stream)) == 199
+    assert api.max_in_flight <= 3
+
+
+class Throttled(Exception):
+    http_status = 429
+    headers = {"Retry-After": "2"}
+
+
+class SpotifyStub:
+    """Answers as spotipy's Spotify client does, from a FakeApi, recording the batches
+    requested and throttling the first one."""
+
+    def __init__(self, api):
+        self.api = api
+        self.batches = []
+        self._throttle = True
+
+    def _request(self, kind, uris):
+        self.batches.append((kind, list(uris)))
+        if self._throttle:
+            self._throttle = False
+            raise Throttled()
+        return {kind: getattr(self.api, kind)(uris)}
+
+    def tracks(self, uris):
+        return self._request("tracks", uris)
+
+    def albums(self, uris):
+        return self._request("albums", uris)
+
+    def artists(self, uris):
+        return self._request("artists", uris)
+
+
+def test_sample_repository_fetches_batches_through_the_rate_limiter(entries, tmp_path):
+    pytest.importorskip("spotipy")
+    pytest.importorskip("dotenv")
+    spec = importlib.util.spec_from_file_location(
+        "enrichment_sample",
+        os.path.join(os.path.dirname(__file__), "..", "samples", "enrichment.py"),
+    )
+    sample = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(sample)
+
+    plays = [
+        Play.from_entry(dict(entries[0], spotify_track_uri="spotify:track:%d" % i))
+        for i in range(120)
+    ]
+    now, sleeps = [0.0], []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    api = FakeApi(delay=0.01)
+    sapi = SpotifyStub(api)
+    rate_limiter = RateLimiter(rate=1000, burst=1000, clock=lambda: now[0], sleep=sleep)
+    with sample.SpotifyRepository(
+        None, None, str(tmp_path), 2, sapi, rate_limiter
+    ) as repository:
+        enriched = list(repository.enricher().enrich(plays))
+
+    assert [e.track["uri"] for e in enriched] == [play.id for play in plays]
+    # the tracks go out in batches of at most 50, the throttled one twice
+    tracks = [uris for kind, uris in sapi.batches if kind == "tracks"]
+    assert sorted(len(uris) for uris in tracks) == [20, 50, 50, 50]
+    assert api.max_in_flight <= 2
+    assert sleeps[0] == 2
+    assert (rate_limiter.throttled, rate_limiter.retried, rate_limiter.failed) == (
+        1,
+        1,
+        0,
+    )
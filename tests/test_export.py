@@ -0,0 +1,114 @@
+import csv
+import os
+
+import pytest
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.export import export
+
+
+@pytest.fixture
+def plays(entries):
+    return [Play.from_entry(entry) for entry in entries]
+
+
+def test_row_matches_play(plays):
+    song, _, episode, _ = plays
+    assert song.row() == (
+        1572964080,
+        8778,
+        True,
+        "spotify:track:2C0KFbb4v9CNWR5c9jWcKC",
+        "Andromeda (feat. DRAM)",
+        "Gorillaz",
+        "Humanz",
+        "clickrow",
+        "endplay",
+        True,
+        None,
+        "username",
+        "OS X 10.15.1 [x86 8]",
+        "SI",
+        False,
+        False,
+    )
+    assert episode.row()[2:7] == (
+        False,
+        "spotify:episode:5hSbmBGiXKmTTRIbjRQhBQ",
+        "Episode 1",
+        "The Show",
+        None,
+    )
+
+
+def test_exports_csv_partitioned_by_year(plays, tmp_path):
+    paths = export(plays, str(tmp_path), "csv", batch_size=1)
+    assert [os.path.relpath(path, tmp_path) for path in paths] == [
+        os.path.join(f"year={year}", "plays.csv") for year in (2019, 2020, 2021)
+    ]
+    with open(paths[0], encoding="utf-8", newline="") as file:
+        rows = list(csv.DictReader(file))
+    assert [row["timestamp"] for row in rows] == [
+        "2019-11-05T14:28:00Z",
+        "2019-11-05T14:31:12Z",
+    ]
+    assert rows[0]["is_song"] == "True" and rows[0]["skipped"] == ""
+
+    paths = export(
+        plays,
+        str(tmp_path / "flat"),
+        "csv",
+        columns=["artist"],
+        partition_by_year=False,
+    )
+    with open(paths[0], encoding="utf-8", newline="") as file:
+        assert list(csv.reader(file)) == [
+            ["artist"],
+            ["Gorillaz"],
+            ["Gorillaz"],
+            ["The Show"],
+            ["Björk"],
+        ]
+
+    with pytest.raises(ValueError):
+        export(plays, str(tmp_path), "csv", columns=["ip"])
+
+
+def test_exports_parquet_and_arrow(plays, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow as pa
+    import pyarrow.dataset
+
+    for format, dataset_format in (("parquet", "parquet"), ("arrow", "ipc")):
+        export(plays * 3, str(tmp_path / format), format, batch_size=2)
+        table = pa.dataset.dataset(
+            str(tmp_path / format), format=dataset_format, partitioning="hive"
+        ).to_table(columns=["artist", "ms_played", "year"])
+        assert table.schema.field("artist").type == pa.dictionary(
+            pa.int32(), pa.string()
+        )
+        assert sorted(zip(*table.to_pydict().values())) == sorted(
+            [
+                ("Gorillaz", 8778, 2019),
+                ("Gorillaz", 8778, 2019),
+                ("The Show", 1200000, 2020),
+                ("Björk", 8778, 2021),
+            ]
+            * 3
+        )
+
+
+def test_arrow_dictionaries_grow_by_deltas(plays, tmp_path):
+    pytest.importorskip("pyarrow")
+    import pyarrow as pa
+
+    (path,) = export(
+        plays * 2, str(tmp_path), "arrow", partition_by_year=False, batch_size=1
+    )
+
+    with pa.ipc.open_file(path) as reader:
+        table = reader.read_all()
+        assert reader.stats.num_replaced_dictionaries == 0
+        assert reader.stats.num_dictionary_deltas > 0
+    artists = ["Gorillaz", "Gorillaz", "The Show", "Björk"]
+    assert table.column("artist").to_pylist() == artists * 2
@@ -0,0 +1,64 @@
+import sys
+import zipfile
+
+import pytest
+
+from spotify_history_reader.aggregate import Aggregate
+from spotify_history_reader.federation import Federation
+from spotify_history_reader.sketches import ApproximateDistinct
+
+
+def test_aggregates_per_user_and_overall(entries, write_history, tmp_path):
+    zip_path = tmp_path / "my_spotify_data.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(
+            write_history(entries[2:], "Streaming_History_Audio_2020-2021_1.json"),
+            "Spotify Extended Streaming History/Streaming_History_Audio_2020-2021_1.json",
+        )
+
+    federation = Federation()
+    federation.add_export("alice", write_history(entries[:1], "alice_0.json"))
+    federation.add_export("alice", write_history(entries[1:2], "alice_1.json"))
+    federation.add_export("bob", str(zip_path))
+    federation.add_export("carol", str(tmp_path / "missing"))
+    aggregates = {
+        "played": Aggregate(),
+        "by_artist": Aggregate("artist", "count"),
+        "tracks": ApproximateDistinct("id"),
+    }
+
+    users = {
+        user: {name: aggregate.result() for name, aggregate in partials.items()}
+        for user, partials in federation.aggregate_users(workers=2, **aggregates)
+    }
+    assert users == {
+        "alice": {"played": 17556, "by_artist": {"Gorillaz": 2}, "tracks": 2},
+        "bob": {
+            "played": 1208778,
+            "by_artist": {"The Show": 1, "Björk": 1},
+            "tracks": 2,
+        },
+        "carol": {"played": 0, "by_artist": {}, "tracks": 0},
+    }
+    assert federation.aggregate(workers=2, **aggregates) == {
+        "played": 1226334,
+        "by_artist": {"Gorillaz": 2, "The Show": 1, "Björk": 1},
+        "tracks": 4,
+    }
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="needs Python 3.11")
+def test_recycles_workers(entries, write_history):
+    federation = Federation()
+    for number, entry in enumerate(entries):
+        federation.add_export("alice", write_history([entry], f"alice_{number}.json"))
+
+    assert federation.aggregate(
+        workers=2, max_tasks_per_child=1, total=Aggregate()
+    ) == {"total": 1226334}
+
+
+def test_recycling_workers_needs_python_3_11(monkeypatch):
+    monkeypatch.setattr(sys, "version_info", (3, 10, 0))
+    with pytest.raises(ValueError):
+        Federation().aggregate_users(max_tasks_per_child=1)
@@ -0,0 +1,71 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.filters import PlayFilter
+from spotify_history_reader.reader import SpotifyHistoryReader
+from spotify_history_reader.source import Source
+
+
+@pytest.mark.parametrize(
+    "play_filter, expected",
+    [
+        (PlayFilter(), [0, 1, 2, 3]),
+        (PlayFilter(start=datetime(2019, 11, 5, 14, 31, 12)), [1, 2, 3]),
+        (PlayFilter(end=datetime(2020, 1, 2, 8, tzinfo=timezone.utc)), [0, 1]),
+        (PlayFilter(songs_only=True), [0, 1, 3]),
+        (PlayFilter(episodes_only=True), [2]),
+        (PlayFilter(min_ms_played=10000), [2]),
+        (PlayFilter(artists=["Björk", "The Show"]), [2, 3]),
+        (PlayFilter(uris=["spotify:track:2C0KFbb4v9CNWR5c9jWcKC"]), [0]),
+    ],
+)
+def test_conditions(entries, write_history, tmp_path, play_filter, expected):
+    expected_ids = [
+        entries[i]["spotify_track_uri"] or entries[i]["spotify_episode_uri"]
+        for i in expected
+    ]
+    assert [i for i, e in enumerate(entries) if play_filter.matches(e)] == expected
+
+    path = write_history(entries)
+    for cache_directory in (None, str(tmp_path / "cache"), str(tmp_path / "cache")):
+        with SpotifyHistoryReader(cache_directory) as reader:
+            reader.add_source(path)
+            assert [p.id for p in reader.read(play_filter=play_filter)] == expected_ids
+
+
+@pytest.mark.parametrize(
+    "ts", ["2019-11-05T13:31:12-01:00", "2019-11-05T14:31:12.500Z", "garbage"]
+)
+def test_time_range_of_other_timestamp_layouts(entries, ts):
+    entry = dict(entries[1], ts=ts)
+    play_filter = PlayFilter(start=datetime(2019, 11, 5, 14, 31, 12))
+
+    # invalid timestamps are left for building the Play to reject
+    assert play_filter.matches(entry)
+    if ts != "garbage":
+        assert play_filter.matches_play(Play.from_entry(entry))
+        assert not PlayFilter(end=datetime(2019, 11, 5, 14, 31, 12)).matches(entry)
+
+
+def test_exclude_incognito(entries):
+    play_filter = PlayFilter(exclude_incognito=True)
+    assert play_filter.matches(entries[0])
+    assert not play_filter.matches(dict(entries[0], incognito_mode=True))
+
+
+@pytest.mark.parametrize(
+    "name, included",
+    [
+        ("Streaming_History_Audio_2018-2019_1.json", False),
+        ("Streaming_History_Audio_2019-2021_0.json", True),
+        ("Streaming_History_Audio_2021_3.json", True),
+        ("Streaming_History_Audio_2022-2023_4.json", False),
+        ("Streaming_History_Video_2015-2024.json", True),
+        ("Userdata.json", True),
+    ],
+)
+def test_sources_outside_of_time_range_are_skipped(name, included):
+    play_filter = PlayFilter(start=datetime(2020, 3, 1), end=datetime(2022, 1, 1))
+    assert play_filter.includes_source(Source(name)) == included
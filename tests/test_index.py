@@ -0,0 +1,78 @@
+import os
+import zipfile
+
+import pytest
+
+from spotify_history_reader.index import HistoryIndex
+from spotify_history_reader.reader import SpotifyHistoryReader
+
+
+def test_lookup_decodes_only_matching_entries(entries, write_history, tmp_path):
+    # the non-ASCII artist first, so that later byte offsets differ from characters
+    history = write_history(entries[3:] + entries[:3])
+    with SpotifyHistoryReader(index_directory=str(tmp_path / "index")) as reader:
+        reader.add_source(history)
+        assert [p.timestamp.year for p in reader.lookup("artist", "Gorillaz")] == [
+            2019,
+            2019,
+        ]
+        assert [p.artist for p in reader.lookup("artist", ["Björk", "Nobody"])] == [
+            "Björk"
+        ]
+        assert [p.song for p in reader.lookup("show", "The Show")] == ["Episode 1"]
+        assert [
+            p.id
+            for p in reader.lookup(
+                "track",
+                {
+                    "spotify:track:0d28khcov6AiegSCpG5TuT",
+                    entries[3]["spotify_track_uri"],
+                },
+            )
+        ] == [entries[3]["spotify_track_uri"], "spotify:track:0d28khcov6AiegSCpG5TuT"]
+        assert reader.index.count(reader.sources, "album", "Humanz") == 3
+        assert reader.index.values(reader.sources, "artist") == ["Björk", "Gorillaz"]
+        with pytest.raises(ValueError):
+            list(reader.lookup("platform", "ios"))
+
+    # a new index loads what was stored, and rebuilds it once the source changes
+    index = HistoryIndex(str(tmp_path / "index"))
+    assert len(os.listdir(index.directory)) == 2
+    assert index.count(reader.sources, "artist", "Gorillaz") == 2
+    write_history(entries[:1])
+    assert index.count(reader.sources, "artist", "Gorillaz") == 1
+    assert [p.id for p in index.lookup(reader.sources, "artist", "Gorillaz")] == [
+        entries[0]["spotify_track_uri"]
+    ]
+
+
+def test_lookup_in_zip(entries, write_history, tmp_path):
+    zip_path = tmp_path / "my_spotify_data.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        archive.write(
+            write_history(entries), "Streaming_History_Audio_2019-2021_0.json"
+        )
+
+    with SpotifyHistoryReader(index_directory=str(tmp_path / "index")) as reader:
+        reader.add_source_zip(str(zip_path))
+        assert [p.artist for p in reader.lookup("artist", ["Björk", "Gorillaz"])] == [
+            "Gorillaz",
+            "Gorillaz",
+            "Björk",
+        ]
+
+
+def test_lookup_skips_invalid_entries(entries, write_history, tmp_path, caplog):
+    entries[1]["ts"] = "garbage"
+    history = write_history(entries)
+
+    with SpotifyHistoryReader(index_directory=str(tmp_path / "index")) as reader:
+        reader.add_source(history)
+        assert [p.id for p in reader.lookup("artist", "Gorillaz")] == [
+            entries[0]["spotify_track_uri"]
+        ]
+        assert "Skipped 1 invalid entries" in caplog.text
+        assert reader.index.count(reader.sources, "artist", "Gorillaz") == 1
+        assert reader.index.count(reader.sources, "album", "Humanz") == 2
+        with pytest.raises(ValueError):
+            list(reader.lookup("artist", "Björk", strict=True))
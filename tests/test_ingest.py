@@ -0,0 +1,55 @@
+import os
+
+from datetime import timedelta
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.ingest import IncrementalIngestor
+
+
+def plays(entries):
+    return [Play.from_entry(entry) for entry in entries]
+
+
+def test_only_new_plays_are_ingested(entries, tmp_path):
+    first = IncrementalIngestor(str(tmp_path), lookback=timedelta(days=3650))
+    assert len(list(first.ingest(plays(entries[:3])))) == 3
+
+    second = IncrementalIngestor(str(tmp_path), lookback=timedelta(days=3650))
+    assert second.watermark == plays(entries)[2].timestamp
+    new = list(second.ingest(plays(entries + entries[3:])))
+    assert [p.artist for p in new] == ["Björk"]
+
+
+def test_plays_before_lookback_are_skipped(entries, tmp_path):
+    ingestor = IncrementalIngestor(str(tmp_path), lookback=timedelta(days=1))
+    list(ingestor.ingest(plays(entries[2:3])))
+
+    late = dict(entries[0], ts="2020-01-01T00:00:00Z")
+    assert list(ingestor.ingest(plays([late, entries[2], entries[0]]))) == []
+
+
+def test_incomplete_ingest_is_not_saved(entries, tmp_path):
+    ingestor = IncrementalIngestor(str(tmp_path))
+    partial = ingestor.ingest(plays(entries))
+    next(partial)
+    partial.close()
+
+    assert IncrementalIngestor(str(tmp_path)).watermark is None
+
+
+def test_unreadable_state_is_reported_as_lost(entries, tmp_path):
+    assert not IncrementalIngestor(str(tmp_path)).state_lost
+    list(IncrementalIngestor(str(tmp_path)).ingest(plays(entries)))
+    assert os.listdir(tmp_path) == ["ingest.state"]
+    state_path = os.path.join(str(tmp_path), "ingest.state")
+    with open(state_path, "rb") as file:
+        content = file.read()
+
+    for damaged in (content[:-16], content[:-3], content[:10]):
+        with open(state_path, "wb") as file:
+            file.write(damaged)
+        ingestor = IncrementalIngestor(str(tmp_path))
+        assert ingestor.state_lost
+        assert ingestor.watermark is None
+    assert len(list(ingestor.ingest(plays(entries)))) == 4
+    assert not IncrementalIngestor(str(tmp_path)).state_lost
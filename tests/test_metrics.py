@@ -0,0 +1,80 @@
+import logging
+import os
+
+import pytest
+
+from spotify_history_reader import PlayFilter, SpotifyHistoryReader
+from spotify_history_reader import reader as reader_module
+from spotify_history_reader.metrics import ReadMetrics
+
+
+@pytest.fixture
+def messy_history(entries, write_history):
+    invalid = dict(entries[0], spotify_track_uri=None)
+    return write_history(entries + [invalid, invalid])
+
+
+@pytest.mark.parametrize("streaming", [False, True])
+def test_records_source_metrics(messy_history, streaming):
+    recorded = []
+    metrics = ReadMetrics(recorded.append)
+    with SpotifyHistoryReader(metrics=metrics) as reader:
+        reader.add_source(messy_history)
+        plays = list(
+            reader.read(streaming=streaming, play_filter=PlayFilter(songs_only=True))
+        )
+
+    assert recorded == metrics.sources and len(recorded) == 1
+    source = recorded[0]
+    assert source.source == os.path.basename(messy_history)
+    assert source.bytes_read == os.path.getsize(messy_history)
+    assert (source.entries, source.filtered, source.rejected) == (6, 1, 2)
+    assert source.plays == len(plays) == 3
+    assert source.seconds["total"] >= source.seconds["build"] > 0
+    assert source.seconds["filter"] > 0
+
+
+def test_read_parallel_records_source_metrics(messy_history):
+    metrics = ReadMetrics()
+    with SpotifyHistoryReader(metrics=metrics) as reader:
+        reader.add_source(messy_history)
+        reader.add_source(messy_history)
+        list(reader.read_parallel(workers=2))
+
+    totals = metrics.totals()
+    assert len(metrics.sources) == 2
+    assert (totals.entries, totals.rejected, totals.plays) == (12, 4, 8)
+
+
+def test_invalid_entries_are_logged_up_to_a_limit(messy_history, caplog, monkeypatch):
+    monkeypatch.setattr(reader_module, "MAX_LOGGED_ENTRIES", 1)
+    with SpotifyHistoryReader() as reader, caplog.at_level(logging.WARNING):
+        reader.add_source(messy_history)
+        assert len(list(reader.read())) == 4
+
+    messages = [record.getMessage() for record in caplog.records]
+    assert len(messages) == 2
+    assert messages[0].startswith("Skipping invalid entry 4 of")
+    assert messages[1].startswith("Skipped 2 invalid entries of")
+
+
+def test_logged_entry_numbers_count_filtered_entries(messy_history, caplog):
+    with SpotifyHistoryReader() as reader, caplog.at_level(logging.WARNING):
+        reader.add_source(messy_history)
+        list(reader.read(play_filter=PlayFilter(songs_only=True)))
+
+    assert caplog.records[0].getMessage().startswith("Skipping invalid entry 4 of")
+
+
+def test_cached_reads_time_loading_the_plays(messy_history, tmp_path):
+    with SpotifyHistoryReader(cache_directory=str(tmp_path / "cache")) as reader:
+        reader.add_source(messy_history)
+        list(reader.read())
+
+        reader.metrics = metrics = ReadMetrics()
+        assert len(list(reader.read())) == 4
+
+    source = metrics.sources[0]
+    assert source.cached
+    assert source.entries == 4
+    assert source.seconds["cache"] > 0
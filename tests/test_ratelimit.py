@@ -0,0 +1,101 @@
+import random
+
+import pytest
+
+from spotify_history_reader.ratelimit import RateLimiter
+
+
+class Throttled(Exception):
+    def __init__(self, retry_after=None):
+        self.http_status = 429
+        self.headers = {"Retry-After": retry_after} if retry_after else {}
+
+
+class FakeClient:
+    """Fails with the given errors before succeeding."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def tracks(self, uris):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"tracks": uris}
+
+
+class FakeTime:
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def clock(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def fake_time():
+    return FakeTime()
+
+
+def limiter(fake_time, **kwargs):
+    return RateLimiter(clock=fake_time.clock, sleep=fake_time.sleep, **kwargs)
+
+
+def test_honors_retry_after(fake_time):
+    client = FakeClient(Throttled("3"), Throttled("5"))
+    rate_limiter = limiter(fake_time, rate=10)
+
+    assert rate_limiter.call(client.tracks, ["a"]) == {"tracks": ["a"]}
+    assert fake_time.sleeps == [3, 5]
+    assert (rate_limiter.throttled, rate_limiter.retried, rate_limiter.failed) == (
+        2,
+        2,
+        0,
+    )
+    assert rate_limiter.rate < 10
+
+
+def test_backs_off_exponentially_with_jitter(fake_time, monkeypatch):
+    monkeypatch.setattr(random, "random", lambda: 0.5)
+    client = FakeClient(*(Throttled() for _ in range(3)))
+    rate_limiter = limiter(fake_time, base_delay=1, max_delay=3)
+
+    rate_limiter.call(client.tracks, ["a"])
+    assert fake_time.sleeps == [0.5, 1.0, 1.5]
+
+
+def test_gives_up_after_max_retries(fake_time):
+    client = FakeClient(*(Throttled("1") for _ in range(5)))
+    rate_limiter = limiter(fake_time, max_retries=2)
+
+    with pytest.raises(Throttled):
+        rate_limiter.call(client.tracks, ["a"])
+    assert client.calls == 3
+    assert (rate_limiter.throttled, rate_limiter.retried, rate_limiter.failed) == (
+        3,
+        2,
+        1,
+    )
+
+
+def test_other_errors_are_raised(fake_time):
+    rate_limiter = limiter(fake_time)
+
+    with pytest.raises(KeyError):
+        rate_limiter.call(FakeClient(KeyError("a")).tracks, ["a"])
+    assert (rate_limiter.retried, rate_limiter.failed) == (0, 1)
+
+
+def test_spreads_calls_out(fake_time):
+    rate_limiter = limiter(fake_time, rate=4, burst=1)
+    for _ in range(3):
+        rate_limiter.call(FakeClient().tracks, [])
+
+    assert fake_time.sleeps == [0.25, 0.25]
+    assert rate_limiter.calls == 3
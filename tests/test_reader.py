@@ -1,6 +1,98 @@
+import zipfile
+
+import pytest
+
 from spotify_history_reader.reader import SpotifyHistoryReader
 
 
 def test_can_instantiate():
     with SpotifyHistoryReader() as reader:
         assert True
+
+
+def test_streaming_read_matches_json_load(entries, write_history):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(write_history(entries))
+        loaded = [(p.id, p.timestamp) for p in reader.read()]
+        streamed = [(p.id, p.timestamp) for p in reader.read(streaming=True)]
+
+    assert len(loaded) == len(entries)
+    assert streamed == loaded
+
+
+def test_reads_json_members_straight_from_zip(entries, write_history, tmp_path):
+    zip_path = tmp_path / "Spotify.zip"
+    with zipfile.ZipFile(zip_path, "w") as archive:
+        archive.write(
+            write_history(entries),
+            "Spotify Extended Streaming History/Streaming_History_Audio_2019-2021_0.json",
+        )
+        archive.writestr("Spotify Extended Streaming History/ReadMeFirst.pdf", b"%PDF")
+
+    with SpotifyHistoryReader() as reader:
+        reader.add_source_zip(str(zip_path))
+        assert [source.name for source in reader.sources] == [
+            "Streaming_History_Audio_2019-2021_0.json"
+        ]
+        assert [p.id for p in reader.read()] == [
+            p.id for p in reader.read(streaming=True)
+        ]
+        assert len(list(reader.read())) == len(entries)
+
+
+def test_read_parallel_matches_read(entries, write_history):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(
+            write_history(entries[:2], "Streaming_History_Audio_2019_0.json")
+        )
+        reader.add_source(
+            write_history(entries[2:], "Streaming_History_Audio_2020_1.json")
+        )
+        expected = [p.id for p in reader.read()]
+
+        assert [p.id for p in reader.read_parallel(workers=2)] == expected
+        assert sorted(p.id for p in reader.read_parallel(2, ordered=False)) == sorted(
+            expected
+        )
+
+
+def test_plays_of_one_read_share_values(entries, write_history):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(
+            write_history(entries[:2], "Streaming_History_Audio_2019_0.json")
+        )
+        reader.add_source(
+            write_history(entries[:2], "Streaming_History_Audio_2020_1.json")
+        )
+
+        first, _, again, _ = reader.read(share_values=True)
+        assert first.track is again.track
+
+        first, _, again, _ = reader.read()
+        assert first.track is not again.track and first.id == again.id
+
+        # streaming reads stay flat in memory
+        first, _, again, _ = reader.read(streaming=True, share_values=True)
+        assert first.track is not again.track
+
+
+def test_parallel_reads_share_values_within_a_source(entries, write_history):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(write_history(entries[:1] * 2))
+
+        # only the raw fields are pickled, so the Plays share their strings
+        first, again = reader.read_parallel(workers=1, share_values=True)
+        assert first.song is again.song
+
+        first, again = reader.read_parallel(workers=1)
+        assert first.song is not again.song and first.song == again.song
+
+
+def test_entries_with_invalid_timestamps_are_skipped(entries, write_history):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(write_history([dict(entries[0], ts="garbage"), entries[1]]))
+
+        assert [play.epoch for play in reader.read()] == [1572964272]
+        assert len(reader.read_table()) == 1
+        with pytest.raises(ValueError):
+            list(reader.read(strict=True))
@@ -0,0 +1,50 @@
+import pytest
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.rollup import RollupCube
+
+
+@pytest.fixture
+def plays(entries):
+    return [Play.from_entry(entry) for entry in entries]
+
+
+def test_rollups_answer_group_bys(plays, tmp_path):
+    with RollupCube(str(tmp_path / "rollup.sqlite")) as cube:
+        assert cube.update(plays) == 4
+
+        assert cube.totals("all", "year") == {
+            "2019": 17556,
+            "2020": 1200000,
+            "2021": 8778,
+        }
+        assert cube.totals("artist", "month", "plays") == {
+            ("2019-11", "Gorillaz"): 2,
+            ("2021-06", "Björk"): 1,
+        }
+        assert cube.totals("show", "day", key="The Show") == {"2020-01-02": 1200000}
+        assert cube.top("artist", "year", n=1) == {
+            "2019": [("Gorillaz", 17556)],
+            "2021": [("Björk", 8778)],
+        }
+        # 2019-11-05 was a Tuesday
+        assert cube.by_hour_of_week("plays")[(1, 14)] == 2
+
+
+def test_updates_are_incremental(plays, tmp_path):
+    path = str(tmp_path / "rollup.sqlite")
+    with RollupCube(path, {"artist": ["year"]}) as cube:
+        cube.update(plays[:1])
+    with RollupCube(path, {"artist": ["year"]}) as cube:
+        cube.update(plays[1:], batch_size=1)
+
+        assert cube.totals("artist", "year") == {
+            ("2019", "Gorillaz"): 17556,
+            ("2021", "Björk"): 8778,
+        }
+
+
+def test_unknown_measure(tmp_path):
+    with RollupCube(str(tmp_path / "rollup.sqlite")) as cube:
+        with pytest.raises(ValueError):
+            cube.totals(measure="ms_played; DROP TABLE rollup")
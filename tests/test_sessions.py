@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from spotify_history_reader import SpotifyHistoryReader
+from spotify_history_reader.core import Play
+from spotify_history_reader.sessions import reorder, sessionize
+
+
+def play(entries, ts, ms_played=60000, skipped=False, reason_start="trackdone"):
+    entry = dict(entries[0], ts=ts, ms_played=ms_played, skipped=skipped)
+    return Play.from_entry(dict(entry, reason_start=reason_start))
+
+
+def test_reorder_sorts_within_the_window(entries):
+    plays = [play(entries, f"2020-01-01T00:00:0{i}Z") for i in (2, 1, 4, 3, 5)]
+
+    assert [p.timestamp.second for p in reorder(plays, 2)] == [1, 2, 3, 4, 5]
+
+
+def test_read_by_time_merges_sources(entries, write_history):
+    first = [dict(entries[0], ts=f"2020-01-01T00:00:0{i}Z") for i in (0, 3, 2, 6)]
+    second = [dict(entries[1], ts=f"2020-01-01T00:00:0{i}Z") for i in (1, 4, 5)]
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(write_history(first, "Streaming_History_Audio_2020_0.json"))
+        reader.add_source(write_history(second, "Streaming_History_Audio_2020_1.json"))
+
+        seconds = [p.timestamp.second for p in reader.read_by_time(reorder_window=2)]
+
+    assert seconds == list(range(7))
+
+
+def test_sessionize_splits_on_gaps(entries):
+    plays = [
+        play(entries, "2020-01-01T10:00:00Z"),
+        play(entries, "2020-01-01T10:01:00Z", skipped=True, reason_start="fwdbtn"),
+        play(entries, "2020-01-01T10:05:00Z", ms_played=180000),
+        # starts 31 minutes after the previous play stopped
+        play(entries, "2020-01-01T10:37:00Z"),
+    ]
+
+    first, second = sessionize(plays, gap=timedelta(minutes=30))
+
+    assert (first.tracks, second.tracks) == (3, 1)
+    assert first.start.isoformat() == "2020-01-01T09:59:00+00:00"
+    assert first.duration == timedelta(minutes=6)
+    assert first.skip_rate == 1 / 3
+    assert first.transitions == {("endplay", "fwdbtn"): 1, ("endplay", "trackdone"): 1}
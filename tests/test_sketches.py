@@ -0,0 +1,99 @@
+import pickle
+import random
+
+from spotify_history_reader.aggregate import aggregate
+from spotify_history_reader.core import Play
+from spotify_history_reader.sketches import (
+    ApproximateDistinct,
+    ApproximateQuantiles,
+    ApproximateTop,
+    CountMinSketch,
+    HyperLogLog,
+    SpaceSaving,
+    TDigest,
+)
+
+
+def _skewed_stream(n, seed):
+    generator = random.Random(seed)
+    return [f"key{int(generator.paretovariate(1.2))}" for _ in range(n)]
+
+
+def test_count_min_sketch_bounds_its_estimates():
+    stream = _skewed_stream(20000, 1)
+    first, second = CountMinSketch(256, 4), CountMinSketch(256, 4)
+    for index, key in enumerate(stream):
+        (first if index % 2 else second).add(key)
+    first.merge(second)
+
+    counts = {key: stream.count(key) for key in set(stream)}
+    assert first.total == len(stream)
+    for key, count in counts.items():
+        assert count <= first.estimate(key) <= count + first.error
+
+
+def test_space_saving_finds_heavy_hitters():
+    stream = _skewed_stream(20000, 2)
+    first, second = SpaceSaving(50), SpaceSaving(50)
+    for index, key in enumerate(stream):
+        (first if index % 2 else second).add(key)
+    first.merge(second)
+
+    counts = sorted(((stream.count(key), key) for key in set(stream)), reverse=True)
+    top = first.top(3)
+    assert [key for key, _ in top] == [key for _, key in counts[:3]]
+    for key, count in top:
+        assert count - first.error(key) <= stream.count(key) <= count
+
+
+def test_hyperloglog_counts_distinct_keys():
+    first, second = HyperLogLog(12), HyperLogLog(12)
+    for index in range(20000):
+        first.add(index)
+        second.add(index + 10000)
+    first.merge(second)
+    assert abs(first.count() - 30000) <= 3 * first.error * 30000
+
+    small = HyperLogLog()
+    for key in ["a", "b", "c", "a"]:
+        small.add(key)
+    assert small.count() == 3
+
+
+def test_tdigest_estimates_quantiles():
+    values = list(range(10001))
+    random.Random(3).shuffle(values)
+    first, second = TDigest(100), TDigest(100)
+    for index, value in enumerate(values):
+        (first if index % 2 else second).add(value)
+    first.merge(second)
+
+    assert first.count == 10001
+    assert abs(first.quantile(0.5) - 5000) <= 100
+    assert abs(first.quantile(0.99) - 9900) <= 20
+    assert first.quantile(0) == 0 and first.quantile(1) == 10000
+
+
+def test_approximate_aggregates(entries):
+    plays = [Play.from_entry(entry) for entry in entries]
+    results = aggregate(
+        plays,
+        top_artists=ApproximateTop("artist", n=1),
+        tracks_by_year=ApproximateDistinct("id", by="year"),
+        ms_played=ApproximateQuantiles(quantiles=(0, 1)),
+    )
+    assert results == {
+        "top_artists": [("The Show", 1200000)],
+        "tracks_by_year": {2019: 2, 2020: 1, 2021: 1},
+        "ms_played": {0: 8778, 1: 1200000},
+    }
+
+    first = ApproximateTop("artist")
+    second = ApproximateTop("artist")
+    for play in plays[:2]:
+        first.add(play)
+    for play in plays[2:]:
+        second.add(play)
+    first = pickle.loads(pickle.dumps(first))
+    first.merge(second)
+    assert first.estimate("Gorillaz") == 17556
@@ -0,0 +1,73 @@
+import os
+
+from datetime import datetime, timezone
+
+import pytest
+
+from spotify_history_reader.core import Play
+from spotify_history_reader.store import HistoryStore
+
+
+def test_between(entries, tmp_path):
+    plays = [Play.from_entry(entry) for entry in reversed(entries)]
+
+    with HistoryStore.build(str(tmp_path / "history.store"), plays) as store:
+        assert len(store) == len(entries)
+        assert [p.timestamp for p in store] == sorted(p.timestamp for p in plays)
+
+        in_2019 = list(store.between(datetime(2019, 1, 1), datetime(2020, 1, 1)))
+        assert [p.id for p in in_2019] == [e["spotify_track_uri"] for e in entries[:2]]
+
+        (episode,) = store.between(
+            datetime(2020, 1, 2, 8, tzinfo=timezone.utc),
+            datetime(2020, 1, 2, 8, 0, 1, tzinfo=timezone.utc),
+        )
+        assert (episode.is_song, episode.artist, episode.song) == (
+            False,
+            "The Show",
+            "Episode 1",
+        )
+        assert episode.playback.ms_played == 1200000
+        assert episode.connection.platform == "OS X 10.15.1 [x86 8]"
+
+        assert list(store.between(datetime(2022, 1, 1), datetime(2023, 1, 1))) == []
+
+
+def test_reopen(entries, tmp_path):
+    path = str(tmp_path / "history.store")
+    HistoryStore.build(path, [Play.from_entry(entry) for entry in entries]).close()
+
+    with HistoryStore(path) as store:
+        assert [p.artist for p in store][-1] == "Björk"
+
+
+def test_build_in_sorted_runs(entries, tmp_path):
+    plays = [Play.from_entry(entry) for entry in reversed(entries)] * 3
+    plays.append(Play.from_entry(dict(entries[0], ms_played=None)))
+
+    with HistoryStore.build(
+        str(tmp_path / "history.store"), plays, run_size=2
+    ) as store:
+        assert os.listdir(tmp_path) == ["history.store"]
+        assert [p.epoch for p in store] == sorted(p.epoch for p in plays)
+        assert [p.playback.ms_played for p in store][:4] == [8778, 8778, 8778, None]
+
+    with pytest.raises(ValueError):
+        HistoryStore.build(
+            str(tmp_path / "invalid.store"),
+            [Play.from_entry(dict(entries[0], ms_played="8778"))],
+        )
+
+
+def test_decoded_strings_are_capped(entries, tmp_path):
+    path = str(tmp_path / "history.store")
+    HistoryStore.build(path, [Play.from_entry(entry) for entry in entries]).close()
+
+    with HistoryStore(path, string_cache_size=2) as store:
+        assert [p.artist for p in store] == [
+            "Gorillaz",
+            "Gorillaz",
+            "The Show",
+            "Björk",
+        ]
+        assert len(store._strings) == 2
@@ -0,0 +1,22 @@
+import io
+import json
+
+import pytest
+
+from spotify_history_reader.streaming import iter_json_array
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 4096])
+def test_elements_split_across_chunks(entries, chunk_size):
+    text = json.dumps(entries, indent=2, ensure_ascii=False)
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == entries
+
+
+@pytest.mark.parametrize("text", ["[]", " [ 1 , 22 ,333 ] ", "[123456]"])
+def test_scalars_and_empty_arrays(text):
+    assert list(iter_json_array(io.StringIO(text), 2)) == json.loads(text)
+
+
+def test_rejects_non_array():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('{"ts": 1}')))
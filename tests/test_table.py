@@ -0,0 +1,86 @@
+import pytest
+
+from spotify_history_reader import table as table_module
+from spotify_history_reader.core import Play
+from spotify_history_reader.table import PlayTable
+from spotify_history_reader.reader import SpotifyHistoryReader
+
+
+@pytest.fixture(params=["python", "numpy"])
+def grouping(request, monkeypatch):
+    """Runs a test with each implementation of grouping."""
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(table_module, "np", None)
+    return request.param
+
+
+def read_table(entries, write_history):
+    with SpotifyHistoryReader() as reader:
+        reader.add_source(write_history(entries))
+        return reader.read_table()
+
+
+def test_columns(entries, write_history):
+    table = read_table(entries, write_history)
+
+    assert len(table) == len(entries)
+    assert list(table.column("ms_played")) == [e["ms_played"] for e in entries]
+    assert table.column("artist") == ["Gorillaz", "Gorillaz", "The Show", "Björk"]
+    assert [t.isoformat() for t in table.timestamps()][0] == "2019-11-05T14:28:00+00:00"
+    assert table.sum() == sum(e["ms_played"] for e in entries)
+
+
+def test_filter_and_group(entries, write_history, grouping):
+    table = read_table(entries, write_history)
+    songs = table.filter(table.column("is_song"))
+
+    assert len(songs) == 3
+    assert songs.group_sum("artist") == {"Gorillaz": 2 * 8778, "Björk": 8778}
+    assert songs.group_count("id") == {
+        "spotify:track:2C0KFbb4v9CNWR5c9jWcKC": 1,
+        "spotify:track:0d28khcov6AiegSCpG5TuT": 1,
+        "spotify:track:1mea3bSkSGXuIRvnydlB5b": 1,
+    }
+    assert table.group_sum(("year", "artist")) == {
+        (2019, "Gorillaz"): 2 * 8778,
+        (2020, "The Show"): 1200000,
+        (2021, "Björk"): 8778,
+    }
+    assert table.group_count(("month", "hour", "is_song")) == {
+        (11, 14, True): 2,
+        (1, 8, False): 1,
+        (6, 23, True): 1,
+    }
+    assert table.group_count("weekday") == {1: 2, 3: 1, 2: 1}
+
+
+def test_empty_table(write_history):
+    table = read_table([], write_history)
+
+    assert len(table) == 0
+    assert table.sum() == 0
+    assert table.group_sum("artist") == {}
+
+
+def test_group_by_wide_keys(entries, write_history, grouping):
+    # the ranges of the timestamps and ms_played multiply past what fits an int64
+    entries[0]["ms_played"] = 0
+    entries[3]["ms_played"] = 10**9
+    table = read_table(entries, write_history)
+
+    groups = table.group_count(("timestamp", "ms_played", "artist"))
+    assert len(groups) == 4
+    assert groups[(1625097599000, 10**9, "Björk")] == 1
+
+
+def test_sums_stay_exact_past_float_precision(entries, grouping):
+    # the timestamps of a song add up past 2**56, where float64 drops even multiples
+    # of 1000
+    plays = [Play.from_entry(entry) for entry in entries] * 16000
+    table = PlayTable.from_plays(plays)
+
+    expected = sum(play.epoch * 1000 for play in plays if play.is_song)
+    assert expected > 2**56
+    assert table.group_sum("is_song", "timestamp")[True] == expected
@@ -0,0 +1,30 @@
+import random
+
+import pytest
+
+from spotify_history_reader.timestamps import fields, parse_epoch, to_datetime
+
+
+def test_parse_epoch_matches_datetime():
+    generator = random.Random(0)
+    for _ in range(10000):
+        epoch = generator.randrange(0, 2**31)
+        timestamp = to_datetime(epoch)
+        assert parse_epoch(timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")) == epoch
+        assert fields(epoch) == (
+            timestamp.year,
+            timestamp.month,
+            timestamp.day,
+            timestamp.weekday(),
+            timestamp.hour,
+            timestamp.isoformat()[:13],
+        )
+
+
+def test_parse_epoch_falls_back_to_iso_8601():
+    assert parse_epoch("2019-11-05T14:28:00Z") == 1572964080
+    assert parse_epoch("2019-11-05T14:28:00") == 1572964080
+    assert parse_epoch("2019-11-05T15:28:00.250+01:00") == 1572964080
+    for invalid in ("2019-13-05T14:28:00Z", "2019-11-05T14:60:00Z", "yesterday"):
+        with pytest.raises(ValueError):
+            parse_epoch(invalid)